@@ -0,0 +1,26 @@
+# api/asgi.py - Module-level ASGI app for gunicorn/uvicorn worker deployments
+#
+#   gunicorn -k uvicorn.workers.UvicornWorker --workers $((2 * $(nproc) + 1)) --preload api.asgi:app
+#
+# Models load at import time so that --preload loads them once in the master and
+# workers share the weights copy-on-write. On GPU hosts, where CUDA state cannot
+# survive fork, run a single worker and rely on the agent's local generation batching instead.
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from main import AIAgentOrchestrator
+from core.multimodal_agent import MultimodalAIAgent
+from core.web_tools import WebTools, parse_file
+from api.fastapi_server import create_app
+
+orchestrator = AIAgentOrchestrator(os.getenv("AGENT_CONFIG", "config/agent_config.json"))
+orchestrator.agent = asyncio.run(MultimodalAIAgent.create(orchestrator.config_path))
+orchestrator.web_tools = WebTools()
+
+app = create_app(orchestrator.process_agent_request, document_parser=parse_file)
@@ -1,15 +1,47 @@
 # api/fastapi_server.py
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any, Callable
 import asyncio
+import hmac
+import inspect
+import itertools
 import json
 import logging
+import multiprocessing
+import os
+import tempfile
 import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    uvloop = None
+
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
+
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+UPLOAD_CHUNK_SIZE = 1 << 20
+BLOCKING_THRESHOLD_MS = float(os.getenv("BLOCKING_THRESHOLD_MS", "10"))
+LOOP_MONITOR_INTERVAL = 0.1
+MAX_GPU_CONCURRENCY = int(os.getenv("MAX_GPU_CONCURRENCY", "4"))
+SLOW_ACQUIRE_MS = 100
+UPLOAD_PARSE_WORKERS = int(os.getenv("UPLOAD_PARSE_WORKERS", "2"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = "default"
@@ -21,13 +53,79 @@ class ChatResponse(BaseModel):
     model_used: str
     execution_time: float
 
-def create_app(agent_callback: Callable) -> FastAPI:
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+
+@dataclass(slots=True, frozen=True)
+class AgentInput:
+    """Chat payload for the agent callback, readable like the dict payloads it replaces"""
+    text: str
+    type: str
+    user_context: Dict[str, Any]
+    
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+def to_agent_input(request: ChatRequest) -> AgentInput:
+    """Build the agent callback payload for a chat request"""
+    return AgentInput(
+        text=request.message,
+        type="text",
+        user_context={"session_id": request.session_id, "language": request.language}
+    )
+
+async def spool_upload(file: UploadFile, path: str):
+    """Copy an upload to disk in chunks without blocking the event loop on writes"""
+    if aiofiles:
+        async with aiofiles.open(path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await out.write(chunk)
+    else:
+        with open(path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(out.write, chunk)
+
+def ensure_async(callback: Callable) -> Callable:
+    """Run sync callbacks in the default executor so they never block the event loop"""
+    if inspect.iscoroutinefunction(callback):
+        return callback
+    
+    async def run_in_executor(agent_input):
+        return await asyncio.get_running_loop().run_in_executor(None, callback, agent_input)
+    
+    return run_in_executor
+
+async def monitor_event_loop(on_blocking_call: Callable[[float], None],
+                             threshold_ms: float = BLOCKING_THRESHOLD_MS):
+    """Report event loop stalls longer than threshold_ms"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_MONITOR_INTERVAL)
+        lag_ms = (loop.time() - start - LOOP_MONITOR_INTERVAL) * 1000
+        if lag_ms > threshold_ms:
+            on_blocking_call(lag_ms)
+
+def create_app(agent_callback: Callable,
+               document_parser: Optional[Callable[[str], Dict]] = None) -> FastAPI:
     """Create and configure FastAPI application"""
     
+    agent_callback = ensure_async(agent_callback)
+    
     app = FastAPI(
         title="Multimodal AI Agent API",
         description="Advanced AI Agent with multi-LLM routing",
-        version="1.0.0"
+        version="1.0.0",
+        default_response_class=ORJSONResponse
     )
     
     app.add_middleware(
@@ -39,8 +137,75 @@ def create_app(agent_callback: Callable) -> FastAPI:
     )
     
     logger = logging.getLogger("FastAPI")
-    app.state.start_time = time.time()
+    app.state.start_time = time.perf_counter()
     app.state.request_count = 0
+    request_counter = itertools.count(1)
+    app.state.blocking_calls = 0
+    app.state.pool = None
+    app.state.gpu_sem = asyncio.Semaphore(MAX_GPU_CONCURRENCY)
+    app.state.slow_acquires = 0
+    
+    def bounded(callback: Callable) -> Callable:
+        """Cap concurrent agent invocations so excess load queues instead of exhausting the GPU"""
+        async def run_bounded(payload):
+            start = time.perf_counter()
+            async with app.state.gpu_sem:
+                wait_ms = (time.perf_counter() - start) * 1000
+                if wait_ms > SLOW_ACQUIRE_MS:
+                    app.state.slow_acquires += 1
+                    logger.warning(f"Waited {wait_ms:.0f} ms for an agent slot")
+                return await callback(payload)
+        
+        return run_bounded
+    
+    # Calls go straight to the agent, whose local model batches generate() itself
+    agent_callback = bounded(agent_callback)
+    
+    def on_blocking_call(lag_ms: float):
+        app.state.blocking_calls += 1
+        logger.warning(f"Event loop blocked for {lag_ms:.1f} ms")
+    
+    @app.on_event("startup")
+    async def start_parse_pool():
+        if document_parser:
+            # Forking a process that holds threads and loaded models is unsafe; start parsers clean
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            app.state.pool = ProcessPoolExecutor(
+                max_workers=UPLOAD_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context(method)
+            )
+    
+    @app.on_event("shutdown")
+    async def stop_parse_pool():
+        if app.state.pool:
+            app.state.pool.shutdown(wait=False, cancel_futures=True)
+    
+    @app.on_event("startup")
+    async def start_loop_monitor():
+        app.state.monitor_task = asyncio.create_task(monitor_event_loop(on_blocking_call))
+    
+    @app.on_event("shutdown")
+    async def stop_loop_monitor():
+        app.state.monitor_task.cancel()
+    
+    @app.middleware("http")
+    async def time_request(request: Request, call_next):
+        request.state.start_ns = time.perf_counter_ns()
+        response = await call_next(request)
+        response.headers["X-Exec-Time-Us"] = str((time.perf_counter_ns() - request.state.start_ns) // 1000)
+        return response
+    
+    if Profiler and PROFILE_TOKEN:
+        @app.middleware("http")
+        async def profile_request(request: Request, call_next):
+            # Opt-in per request: ?profile=1 plus a matching X-Debug-Token header
+            token = request.headers.get("X-Debug-Token", "")
+            if request.query_params.get("profile") != "1" or not hmac.compare_digest(token, PROFILE_TOKEN):
+                return await call_next(request)
+            
+            with Profiler(async_mode="enabled") as profiler:
+                await call_next(request)
+            return HTMLResponse(profiler.output_html())
     
     @app.get("/")
     async def root():
@@ -48,27 +213,24 @@ def create_app(agent_callback: Callable) -> FastAPI:
     
     @app.get("/health")
     async def health_check():
-        uptime = time.time() - app.state.start_time
+        uptime = time.perf_counter() - app.state.start_time
         return {
             "status": "healthy",
             "uptime": uptime,
-            "requests_processed": app.state.request_count
+            "requests_processed": app.state.request_count,
+            "blocking_calls": app.state.blocking_calls,
+            "slow_acquires": app.state.slow_acquires
         }
     
-    @app.post("/chat", response_model=ChatResponse)
-    async def chat_endpoint(request: ChatRequest):
+    # Handlers build validated ChatResponse models themselves, so skip FastAPI's
+    # response_model revalidation and only keep the schema for the OpenAPI docs
+    @app.post("/chat", response_model=None, responses={200: {"model": ChatResponse}})
+    async def chat_endpoint(request: ChatRequest, http_request: Request) -> ChatResponse:
         try:
-            start_time = time.time()
-            app.state.request_count += 1
-            
-            agent_input = {
-                "text": request.message,
-                "type": "text",
-                "user_context": {"session_id": request.session_id, "language": request.language}
-            }
+            app.state.request_count = next(request_counter)
             
-            response_text = await agent_callback(agent_input)
-            execution_time = time.time() - start_time
+            response_text = await agent_callback(to_agent_input(request))
+            execution_time = (time.perf_counter_ns() - http_request.state.start_ns) / 1e9
             
             return ChatResponse(
                 response=response_text,
@@ -81,21 +243,58 @@ def create_app(agent_callback: Callable) -> FastAPI:
             logger.error(f"Chat endpoint error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
+    @app.post("/batch", response_model=None, responses={200: {"model": List[ChatResponse]}})
+    async def batch_endpoint(body: BatchChatRequest, http_request: Request) -> List[ChatResponse]:
+        try:
+            app.state.request_count = next(request_counter)
+            
+            responses = await asyncio.gather(
+                *(agent_callback(to_agent_input(request)) for request in body.requests)
+            )
+            execution_time = (time.perf_counter_ns() - http_request.state.start_ns) / 1e9
+            
+            return [
+                ChatResponse(
+                    response=response_text,
+                    session_id=request.session_id,
+                    model_used="auto-selected",
+                    execution_time=execution_time
+                )
+                for request, response_text in zip(body.requests, responses)
+            ]
+            
+        except Exception as e:
+            logger.error(f"Batch endpoint error: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+    
     @app.post("/upload")
     async def upload_file(file: UploadFile = File(...), session_id: str = Form("default")):
         try:
-            file_content = await file.read()
+            # Stream the upload to disk in chunks instead of buffering it in memory
+            suffix = os.path.splitext(file.filename or "")[1]
+            fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+            os.close(fd)
             
             agent_input = {
-                "data": file_content,
+                "path": tmp_path,
                 "type": "document",
                 "filename": file.filename,
                 "user_context": {"session_id": session_id}
             }
             
-            response_text = await agent_callback(agent_input)
+            try:
+                await spool_upload(file, tmp_path)
+                
+                if app.state.pool:
+                    # Parse in a worker process; only the spooled path crosses the process boundary
+                    loop = asyncio.get_running_loop()
+                    agent_input["document"] = await loop.run_in_executor(app.state.pool, document_parser, tmp_path)
+                
+                response_text = await agent_callback(agent_input)
+            finally:
+                os.unlink(tmp_path)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "success": True,
                 "filename": file.filename,
                 "analysis": response_text,
@@ -2,19 +2,52 @@
 import os
 import sys
 import subprocess
+import importlib.util
+import shutil
+import tempfile
 import torch
 from pathlib import Path
 import json
 import logging
 from typing import Dict, List, Any
 
+# LoRA target modules per model architecture
+ARCH_LORA_TARGETS = {
+    "LlamaForCausalLM": ["q_proj", "v_proj", "k_proj", "o_proj"],
+    "MistralForCausalLM": ["q_proj", "v_proj", "k_proj", "o_proj"],
+    "MixtralForCausalLM": ["q_proj", "v_proj", "k_proj", "o_proj"],
+    "Qwen2ForCausalLM": ["q_proj", "v_proj", "k_proj", "o_proj"],
+    "GemmaForCausalLM": ["q_proj", "v_proj", "k_proj", "o_proj"],
+    "PhiForCausalLM": ["q_proj", "v_proj", "k_proj", "dense"],
+    "FalconForCausalLM": ["query_key_value", "dense"],
+    "GPTNeoXForCausalLM": ["query_key_value", "dense"],
+    "GPT2LMHeadModel": ["c_attn", "c_proj"],
+    "BloomForCausalLM": ["query_key_value", "dense"],
+}
+DEFAULT_LORA_TARGETS = ["q_proj", "v_proj"]
+
+def get_lora_settings(model, tokenizer_extended: bool = False) -> Dict[str, Any]:
+    """Pick LoRA targets and rank for the loaded architecture"""
+    architecture = (model.config.architectures or [""])[0]
+    rank = min(64, max(8, getattr(model.config, "hidden_size", 1024) // 128))
+    
+    settings = {
+        "target_modules": ARCH_LORA_TARGETS.get(architecture, DEFAULT_LORA_TARGETS),
+        "r": rank,
+        "lora_alpha": rank * 2
+    }
+    if tokenizer_extended:
+        settings["modules_to_save"] = ["embed_tokens", "lm_head"]
+    
+    return settings
+
 def install_requirements():
     """Install required packages in Colab"""
     print("🔧 Installing requirements...")
     
     requirements = [
         "torch>=2.0.0",
-        "transformers>=4.35.0",
+        "transformers>=4.36.0",
         "accelerate>=0.24.0",
         "peft>=0.6.0",
         "bitsandbytes>=0.41.0",
@@ -37,12 +70,23 @@ def install_requirements():
         "python-telegram-bot>=20.7"
     ]
     
-    for req in requirements:
-        try:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", req])
-            print(f"✅ Installed {req}")
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Failed to install {req}: {e}")
+    # Resolve everything in one installer run instead of one process per package
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as tmp_file:
+        tmp_file.write("\n".join(requirements))
+        requirements_path = tmp_file.name
+    
+    if shutil.which("uv"):
+        command = ["uv", "pip", "install", "--system", "-r", requirements_path]
+    else:
+        command = [sys.executable, "-m", "pip", "install", "--no-input", "-r", requirements_path]
+    
+    try:
+        subprocess.check_call(command)
+        print(f"✅ Installed {len(requirements)} packages")
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Failed to install requirements: {e}")
+    finally:
+        os.unlink(requirements_path)
 
 def setup_colab_environment():
     """Setup Colab environment"""
@@ -114,13 +158,25 @@ def fine_tune_model_colab(
     
     try:
         from transformers import (
-            AutoTokenizer, AutoModelForCausalLM, 
+            AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig,
             TrainingArguments, Trainer, DataCollatorForLanguageModeling
         )
-        from peft import LoraConfig, get_peft_model, TaskType
+        from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training, TaskType
         from datasets import Dataset
         import torch
         
+        use_cuda = torch.cuda.is_available()
+        # bf16 needs Ampere or newer; fall back to fp16 compute on older GPUs
+        use_bf16 = use_cuda and torch.cuda.is_bf16_supported()
+        compute_dtype = torch.bfloat16 if use_bf16 else torch.float16
+        # Flash-Attention 2 also needs Ampere+ and the flash-attn package; otherwise the
+        # kwarg is omitted so transformers picks its own default
+        attention_kwargs = (
+            {"attn_implementation": "flash_attention_2"}
+            if use_bf16 and importlib.util.find_spec("flash_attn")
+            else {}
+        )
+        
         # Load tokenizer and model
         print("📥 Loading model and tokenizer...")
         tokenizer = AutoTokenizer.from_pretrained(model_name)
@@ -129,24 +185,41 @@ def fine_tune_model_colab(
         if tokenizer.pad_token is None:
             tokenizer.pad_token = tokenizer.eos_token
         
+        # 4-bit NF4 quantization with double quant (QLoRA)
+        quantization_config = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_compute_dtype=compute_dtype,
+            bnb_4bit_use_double_quant=True
+        ) if use_cuda else None
+        
         model = AutoModelForCausalLM.from_pretrained(
             model_name,
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            device_map="auto" if torch.cuda.is_available() else None,
-            load_in_8bit=True if torch.cuda.is_available() else False
+            torch_dtype=compute_dtype if use_cuda else torch.float32,
+            device_map="auto" if use_cuda else None,
+            quantization_config=quantization_config,
+            **attention_kwargs
         )
         
-        # Configure LoRA
+        if use_cuda:
+            model = prepare_model_for_kbit_training(model)
+        
+        # Configure LoRA for the loaded architecture
+        lora_settings = get_lora_settings(
+            model,
+            tokenizer_extended=len(tokenizer) > model.config.vocab_size
+        )
+        print(f"🎯 LoRA targets: {lora_settings['target_modules']} (r={lora_settings['r']})")
+        
         lora_config = LoraConfig(
             task_type=TaskType.CAUSAL_LM,
-            r=8,
-            lora_alpha=16,
-            target_modules=["q_proj", "v_proj", "k_proj", "o_proj"],
             lora_dropout=0.1,
-            bias="none"
+            bias="none",
+            **lora_settings
         )
         
         model = get_peft_model(model, lora_config)
+        model.gradient_checkpointing_enable(gradient_checkpointing_kwargs={"use_reentrant": False})
         model.print_trainable_parameters()
         
         # Prepare dataset
@@ -162,28 +235,37 @@ def fine_tune_model_colab(
                 {"text": "I can help with various tasks including coding, writing, and analysis."}
             ]
         
-        # Tokenize dataset
+        # Tokenize dataset (padding is left to the data collator, per batch)
         def tokenize_function(examples):
             return tokenizer(
                 examples["text"],
                 truncation=True,
-                padding=True,
-                max_length=512,
-                return_tensors="pt"
+                padding=False,
+                max_length=512
             )
         
         dataset = Dataset.from_list(data)
-        tokenized_dataset = dataset.map(tokenize_function, batched=True)
+        tokenized_dataset = dataset.map(
+            tokenize_function,
+            batched=True,
+            batch_size=1000,
+            num_proc=os.cpu_count(),
+            remove_columns=["text"]
+        )
         
         # Training arguments
         training_args = TrainingArguments(
             output_dir=output_dir,
             num_train_epochs=1,
-            per_device_train_batch_size=2,
-            gradient_accumulation_steps=4,
+            per_device_train_batch_size=8,
+            gradient_accumulation_steps=1,
+            gradient_checkpointing=True,
+            gradient_checkpointing_kwargs={"use_reentrant": False},
+            optim="paged_adamw_8bit" if use_cuda else "adamw_torch",
             warmup_steps=10,
             learning_rate=2e-4,
-            fp16=torch.cuda.is_available(),
+            bf16=use_bf16,
+            fp16=use_cuda and not use_bf16,
             logging_steps=10,
             save_steps=100,
             evaluation_strategy="no",
@@ -193,10 +275,11 @@ def fine_tune_model_colab(
             report_to=None
         )
         
-        # Data collator
+        # Data collator (pad lengths to multiples of 8 for tensor-core GEMMs)
         data_collator = DataCollatorForLanguageModeling(
             tokenizer=tokenizer,
-            mlm=False
+            mlm=False,
+            pad_to_multiple_of=8
         )
         
         # Trainer
@@ -224,36 +307,36 @@ def fine_tune_model_colab(
         print(f"❌ Fine-tuning failed: {e}")
         return None
 
-def create_gradio_interface():
+class ColabAgent:
+    """Mock agent for demo, shared by the Gradio UI and the API"""
+    
+    def __init__(self):
+        self.conversation_history = []
+    
+    async def respond(self, message: str) -> str:
+        # Simple echo for demo - replace with actual agent
+        return f"Echo: {message}"
+    
+    async def process_input(self, message, history):
+        response = await self.respond(message)
+        history.append([message, response])
+        return history, ""
+
+def create_gradio_interface(agent: ColabAgent = None):
     """Create Gradio interface for Colab"""
     print("🎨 Creating Gradio interface...")
     
     try:
         import gradio as gr
-        import asyncio
         
         # Import our agent (simplified for Colab)
         sys.path.append('/content')
         
-        # Mock agent for demo
-        class ColabAgent:
-            def __init__(self):
-                self.conversation_history = []
-            
-            async def process_input(self, message, history):
-                # Simple echo for demo - replace with actual agent
-                response = f"Echo: {message}"
-                history.append([message, response])
-                return history, ""
-        
-        agent = ColabAgent()
+        agent = agent or ColabAgent()
         
-        def chat_fn(message, history):
-            # Convert to async
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(agent.process_input(message, history))
-            return result
+        # Gradio awaits async handlers on its own event loop
+        async def chat_fn(message, history):
+            return await agent.process_input(message, history)
         
         # Create interface
         with gr.Blocks(title="Multimodal AI Agent") as demo:
@@ -299,6 +382,61 @@ def create_gradio_interface():
         print(f"❌ Failed to create Gradio interface: {e}")
         return None
 
+def create_combined_app(agent: ColabAgent, demo):
+    """Mount the Gradio UI on the FastAPI app so both share one process and event loop"""
+    print("🔗 Mounting Gradio interface on the API server...")
+    
+    try:
+        import gradio as gr
+        
+        sys.path.insert(0, str(Path(__file__).parent))
+        from api.fastapi_server import create_app
+        
+        async def agent_callback(agent_input):
+            return await agent.respond(agent_input.get("text", ""))
+        
+        app = create_app(agent_callback)
+        if demo:
+            app = gr.mount_gradio_app(app, demo, path="/ui")
+        
+        print("✅ API and UI mounted (UI at /ui)")
+        return app
+        
+    except Exception as e:
+        print(f"❌ Failed to create combined app: {e}")
+        return None
+
+def launch_combined_app(app, host: str = "0.0.0.0", port: int = 7860, share: bool = True):
+    """Serve the combined API + UI app from a single uvicorn worker
+    
+    Inside Colab/Jupyter the cell already runs an event loop, so the server runs in a
+    background thread and the returned uvicorn.Server can be stopped with should_exit = True.
+    With share=True the public URL is printed, through the Colab port proxy when available.
+    """
+    import asyncio
+    import threading
+    import uvicorn
+    
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "auto"
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, loop=loop, workers=1))
+    
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Plain script: no loop yet, so uvicorn can own the main thread
+        server.run()
+        return server
+    
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    if share:
+        try:
+            from google.colab.output import eval_js
+            url = eval_js(f"google.colab.kernel.proxyPort({port})")
+            print(f"🌍 Public URL: {url} (UI at {url.rstrip('/')}/ui)")
+        except ImportError:
+            print(f"⚠️ No Colab proxy here; the app is only reachable at http://{host}:{port}")
+    return server
+
 def deploy_to_huggingface_spaces():
     """Deploy to Hugging Face Spaces"""
     print("🚀 Preparing for Hugging Face Spaces deployment...")
@@ -363,19 +501,43 @@ if __name__ == "__main__":
     # Create requirements.txt for Spaces
     spaces_requirements = [
         "gradio>=4.8.0",
-        "transformers>=4.35.0",
+        "transformers>=4.36.0",
         "torch>=2.0.0",
         "accelerate>=0.24.0",
         "peft>=0.6.0",
         "langchain>=0.1.0",
         "openai>=1.3.0",
         "requests>=2.31.0",
-        "Pillow>=10.0.0"
+        "Pillow>=10.0.0",
+        "uvloop>=0.19.0",
+        "httptools>=0.6.0",
+        "orjson>=3.9.0"
     ]
     
     with open("requirements.txt", "w") as f:
         f.write("\n".join(spaces_requirements))
     
+    # api.asgi imports main and with it every integration, so the API image needs far more
+    # than the Gradio Space above; headless OpenCV avoids libGL on the slim base image.
+    # The committed requirements-api.txt is the single source; copy it into the build context
+    api_requirements = Path(__file__).parent / "requirements-api.txt"
+    if not Path("requirements-api.txt").exists() or not api_requirements.samefile("requirements-api.txt"):
+        shutil.copyfile(api_requirements, "requirements-api.txt")
+    
+    # Create Dockerfile for self-hosted API deployment
+    dockerfile_content = '''FROM python:3.11-slim
+COPY . /app
+WORKDIR /app
+RUN pip install --no-cache-dir -r requirements-api.txt
+# 2n+1 uvicorn workers; --preload loads the models once and shares them across workers.
+# On GPU hosts set WEB_CONCURRENCY=1, since CUDA state cannot be shared across fork.
+CMD gunicorn -k uvicorn.workers.UvicornWorker --workers ${WEB_CONCURRENCY:-$((2 * $(nproc) + 1))} \\
+    --preload --backlog 2048 --bind 0.0.0.0:8000 api.asgi:app
+'''
+    
+    with open("Dockerfile", "w") as f:
+        f.write(dockerfile_content)
+    
     # Create README for Spaces
     readme_content = '''---
 title: Multimodal AI Agent
@@ -426,6 +588,7 @@ The system automatically selects the best model for each task, but you can speci
     print("   - app.py (main application)")
     print("   - requirements.txt (dependencies)")
     print("   - README.md (documentation)")
+    print("   - Dockerfile + requirements-api.txt (self-hosted API with gunicorn + uvicorn workers)")
     print("\n🚀 To deploy:")
     print("1. Create a new Space on Hugging Face")
     print("2. Upload these files to your Space repository")
@@ -445,8 +608,10 @@ def main():
     # Create config
     create_colab_config()
     
-    # Create Gradio interface
-    demo = create_gradio_interface()
+    # Create the API and Gradio interface around one shared agent
+    agent = ColabAgent()
+    demo = create_gradio_interface(agent)
+    app = create_combined_app(agent, demo)
     
     # Prepare for deployment
     deploy_to_huggingface_spaces()
@@ -455,10 +620,11 @@ def main():
     print("\n🎯 Next steps:")
     print("1. Add your API keys to the environment")
     print("2. Run fine-tuning if needed: fine_tune_model_colab()")
-    print("3. Launch Gradio interface: demo.launch()")
+    print("3. Launch API + Gradio UI in one process: launch_combined_app(app)")
     print("4. Deploy to Hugging Face Spaces using the generated files")
+    print("5. Serve the API: uvicorn api.asgi:app --loop uvloop --http httptools --workers $((2*$(nproc)+1))")
     
-    return demo
+    return demo, app
 
 # Colab-specific functions
 def set_api_keys():
@@ -501,7 +667,7 @@ def quick_test():
 
 if __name__ == "__main__":
     # Run setup
-    demo = main()
+    demo, app = main()
     
     # Show API key setup
     set_api_keys()
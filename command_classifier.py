@@ -0,0 +1,85 @@
+# command_classifier.py - One keyword pass that answers every routing question about an input
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import FrozenSet
+
+# Phrases RealExecutor.execute_command branches on
+COMMAND_KEYWORDS = (
+    "open chrome", "open firefox", "open browser",
+    "search", "linkedin", "google", "youtube",
+    "create file", "open file",
+    "open calculator", "open notepad", "take screenshot",
+    "close", "chrome", "firefox"
+)
+
+# Phrases that mark input as a command for WorkingAgent's executor
+EXECUTABLE_KEYWORDS = (
+    "open", "launch", "start", "run",
+    "close", "kill", "stop",
+    "create file", "make file", "new file",
+    "search", "find", "look up",
+    "screenshot", "capture",
+    "calculator", "notepad", "browser"
+)
+
+# Phrases that hand SimpleAIAgent's request to the action agent
+ACTION_KEYWORDS = (
+    "search", "find", "look up", "google",
+    "create", "write", "generate", "make",
+    "run", "execute", "command",
+    "calculate", "compute", "solve",
+    "translate", "convert",
+    "file", "save", "read", "open",
+    "analyze", "check", "review"
+)
+
+# Keyword -> task type, listed in priority order; the first type in this order wins
+TASK_KEYWORDS = {
+    "code": "coding", "program": "coding", "function": "coding", "script": "coding", "debug": "coding",
+    "story": "creative", "creative": "creative", "poem": "creative", "imagine": "creative",
+    "analyze": "analysis", "compare": "analysis", "evaluate": "analysis", "pros": "analysis", "cons": "analysis",
+    "translate": "multilingual", "language": "multilingual", "spanish": "multilingual", "french": "multilingual"
+}
+
+CLASSIFY_CACHE_SIZE = 1024
+
+@dataclass(slots=True, frozen=True)
+class Classification:
+    command_keywords: FrozenSet[str]
+    is_executable: bool
+    needs_action: bool
+    task_type: str
+
+class CommandClassifier:
+    """Matches the union of all keyword tables in one regex pass over the lowered input"""
+
+    def __init__(self):
+        self._command = frozenset(COMMAND_KEYWORDS)
+        self._executable = frozenset(EXECUTABLE_KEYWORDS)
+        self._action = frozenset(ACTION_KEYWORDS)
+        self._task_priority = {task_type: rank for rank, task_type in enumerate(dict.fromkeys(TASK_KEYWORDS.values()))}
+
+        keywords = sorted(self._command | self._executable | self._action | TASK_KEYWORDS.keys(), key=len, reverse=True)
+        # The lookahead reports one keyword per position, the longest; each hit also
+        # implies every keyword inside it, e.g. "open chrome" implies "open" and "chrome"
+        self._keyword_re = re.compile("(?=(%s))" % "|".join(map(re.escape, keywords)))
+        self._implied = {keyword: frozenset(other for other in keywords if other in keyword) for keyword in keywords}
+
+        self._classify_lower = lru_cache(maxsize=CLASSIFY_CACHE_SIZE)(self._classify_lower)
+
+    def classify(self, user_input: str) -> Classification:
+        return self._classify_lower(user_input.lower())
+
+    def _classify_lower(self, input_lower: str) -> Classification:
+        found = set()
+        for match in self._keyword_re.finditer(input_lower):
+            found |= self._implied[match.group(1)]
+
+        task_types = {TASK_KEYWORDS[keyword] for keyword in found if keyword in TASK_KEYWORDS}
+        return Classification(
+            command_keywords=frozenset(found & self._command),
+            is_executable=not found.isdisjoint(self._executable),
+            needs_action=not found.isdisjoint(self._action),
+            task_type=min(task_types, key=self._task_priority.__getitem__) if task_types else "general"
+        )
@@ -1,19 +1,228 @@
 # core/action_agent.py - Task-executing AI agent
+import ast
 import asyncio
+import hashlib
+import itertools
 import json
+import operator
 import subprocess
 import os
-import requests
-from typing import Dict, Any, List
-import openai
-import anthropic
-from datetime import datetime
+import re
+import shlex
+import shutil
+import signal
+import sqlite3
+import time
+import uuid
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Any, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Heavy dependencies are imported on first use to keep CLI startup fast
+if TYPE_CHECKING:
+    import aiohttp
+    import numpy as np
+
+def _json_loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def _cache_key(model: str, messages: List[Dict], temperature: float, response_format: Optional[Dict] = None) -> tuple:
+    """Build a response cache key from the canonical JSON of the request"""
+    request = [messages, response_format] if response_format else messages
+    if orjson is not None:
+        payload = orjson.dumps(request, option=orjson.OPT_SORT_KEYS)
+    else:
+        payload = json.dumps(request, sort_keys=True)
+    return (model, temperature, payload)
+
+@cache
+def _lazy_openai():
+    import openai
+    return openai
+
+@cache
+def _lazy_numpy():
+    import numpy
+    return numpy
+
+@cache
+def _lazy_html_parser():
+    """Return selectolax's HTMLParser, or None when it is not installed"""
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        return None
+    return HTMLParser
+
+@cache
+def _lazy_bs4():
+    from bs4 import BeautifulSoup
+    return BeautifulSoup
+
+RESPONSE_CACHE_SIZE = 1024
+# Completions at or below this temperature are treated as deterministic and cached
+CACHEABLE_TEMPERATURE = 0.3
+# Cached responses also persist to disk so they survive restarts
+RESPONSE_CACHE_TTL = 7 * 86400
+
+# Semantic intent cache, stored as an fp16 memmap
+INTENT_EMBEDDING_MODEL = "text-embedding-3-small"
+INTENT_EMBEDDING_DIM = 1536
+INTENT_CACHE_SIZE = 4096
+INTENT_SIMILARITY_THRESHOLD = 0.92
+INTENT_FLUSH_EVERY = 32
+# A similar request shares the action, never the arguments, so semantic hits are limited
+# to actions whose handlers fall back to the current input when parameters are empty
+SEMANTIC_INTENT_ACTIONS = frozenset({"chat", "search_web", "summarize"})
+
+CACHE_DIR = os.path.expanduser("~/.action_agent_cache")
+
+# Upper bound on in-flight OpenAI requests to stay under rate limits
+MAX_CONCURRENT_REQUESTS = 8
+
+# Suffix for generated filenames so calls within the same second never collide
+_filename_counter = itertools.count()
+
+# read_file only displays the start of a file
+READ_PREVIEW_CHARS = 1000
+
+# Unambiguous requests are routed by their leading verb without an LLM call.
+# Each rule is (verbs, action, pattern matched against the rest of the input).
+_FAST_INTENT_RULES = [
+    (("search", "google"), "search_web", r"(?:for\s+)?(?P<query>.+)"),
+    # "run"/"execute" often start ordinary requests, so only explicit command shapes qualify
+    (("run", "execute"), "run_command", r"(?:the\s+)?(?:command\s+)?`(?P<command>[^`]+)`"),
+    (("run", "execute"), "run_command", r"(?:the\s+)?command\s+(?P<command>[^`]+)"),
+    (("create", "make"), "create_file",
+     r"(?:a\s+)?(?:new\s+)?file\s+(?:called\s+|named\s+)?(?P<filename>\S+)(?:\s+with\s+(?P<content>.+))?"),
+    (("read", "cat", "show"), "read_file", r"(?:the\s+)?(?:file\s+)?(?P<filename>[\w./-]+\.\w+)"),
+    (("calculate", "compute", "calc"), "calculate", r"(?P<expression>[\d\s.+\-*/()]+)"),
+    (("translate",), "translate", r"(?P<text>.+?)\s+(?:to|into)\s+(?P<target>[A-Za-z]+)"),
+    (("summarize", "tldr"), "summarize", r"(?P<content>.+)"),
+]
+_FAST_INTENTS: Dict[str, List] = {}
+for _verbs, _action, _pattern in _FAST_INTENT_RULES:
+    for _verb in _verbs:
+        _FAST_INTENTS.setdefault(_verb, []).append((_action, re.compile(_pattern, re.IGNORECASE | re.DOTALL)))
+
+def _fast_intent(user_input: str) -> Optional[Dict[str, Any]]:
+    """Match an unambiguous request to an action plan, or return None"""
+    words = user_input.strip().split(maxsplit=1)
+    if len(words) < 2:
+        return None
+    
+    for action, pattern in _FAST_INTENTS.get(words[0].lower().rstrip(":"), ()):
+        match = pattern.fullmatch(words[1].strip())
+        if match:
+            parameters = {k: v for k, v in match.groupdict().items() if v is not None}
+            # Outside backticks, "run command X" must name an installed program
+            if (action == "run_command" and not words[1].rstrip().endswith("`")
+                    and shutil.which(parameters["command"].split()[0]) is None):
+                continue
+            return {"action": action, "parameters": parameters, "reasoning": "fast"}
+    return None
+
+# Commands blocked by run_command, matched in a single case-insensitive pass
+_DANGER_RE = re.compile(r"rm\s+-rf|del\s+/f|format|shutdown|reboot", re.IGNORECASE)
+
+# Warm shell workers reused by run_command
+SHELL_POOL_SIZE = 4
+COMMAND_TIMEOUT = 30
+
+HTTP_TIMEOUT = 10
+HTTP_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+
+# Static instructions stay in the system message so provider prompt caching can reuse the prefix
+INTENT_SYSTEM_PROMPT = """
+Analyze the user's request and determine the specific action needed.
+
+Return JSON with:
+{
+    "action": "search_web|write_code|run_command|create_file|read_file|analyze_data|send_request|calculate|translate|summarize|chat",
+    "parameters": {"key": "value"},
+    "reasoning": "why this action"
+}
+
+Examples:
+- "search for python tutorials" → {"action": "search_web", "parameters": {"query": "python tutorials"}}
+- "create a sorting function" → {"action": "write_code", "parameters": {"task": "sorting function", "language": "python"}}
+- "run ls command" → {"action": "run_command", "parameters": {"command": "ls"}}
+- "create file test.txt" → {"action": "create_file", "parameters": {"filename": "test.txt", "content": ""}}
+"""
+
+# Calculator: expressions compile once to a flat postfix program of (arity, value) steps
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+def _compile_constant(node, program):
+    if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+        raise TypeError(node)
+    program.append((0, node.value))
+
+def _compile_binop(node, program):
+    _compile_node(node.left, program)
+    _compile_node(node.right, program)
+    program.append((2, _BINARY_OPS[type(node.op)]))
+
+def _compile_unaryop(node, program):
+    _compile_node(node.operand, program)
+    program.append((1, _UNARY_OPS[type(node.op)]))
+
+_NODE_DISPATCH = {
+    ast.Constant: _compile_constant,
+    ast.BinOp: _compile_binop,
+    ast.UnaryOp: _compile_unaryop,
+}
+
+def _compile_node(node, program):
+    compile_fn = _NODE_DISPATCH.get(type(node))
+    if compile_fn is None:
+        raise TypeError(node)
+    compile_fn(node, program)
+
+@lru_cache(maxsize=256)
+def _compile_expression(expression: str) -> tuple:
+    """Compile an arithmetic expression into a postfix program"""
+    program = []
+    _compile_node(ast.parse(expression, mode='eval').body, program)
+    return tuple(program)
+
+def _evaluate(program: tuple):
+    """Run a compiled postfix program on a value stack"""
+    stack = []
+    for arity, value in program:
+        if arity == 0:
+            stack.append(value)
+        elif arity == 1:
+            stack.append(value(stack.pop()))
+        else:
+            right = stack.pop()
+            stack.append(value(stack.pop(), right))
+    return stack[0]
 
 class ActionAgent:
     def __init__(self):
         # Initialize API clients
-        self.openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.claude_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY")) if os.getenv("ANTHROPIC_API_KEY") else None
+        self.openai_client = _lazy_openai().AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.claude_client = None
+        if os.getenv("ANTHROPIC_API_KEY"):
+            import anthropic
+            self.claude_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
         
         # Action registry
         self.actions = {
@@ -28,6 +237,390 @@ class ActionAgent:
             "translate": self.translate,
             "summarize": self.summarize
         }
+        # Structured output schema that constrains analyze_intent to valid plans
+        self.intent_response_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "intent",
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "action": {"enum": list(self.actions) + ["chat"]},
+                        "parameters": {"type": "object"},
+                        "reasoning": {"type": "string"}
+                    },
+                    "required": ["action", "parameters"]
+                }
+            }
+        }
+        
+        # Actions that can stream their output as it is generated
+        self.stream_actions = {
+            "write_code": self.stream_write_code,
+            "analyze_data": self.stream_analyze_data,
+            "translate": self.stream_translate,
+            "summarize": self.stream_summarize
+        }
+        
+        # Exact-match LLM response cache
+        self._response_cache: OrderedDict = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._disk_cache: Optional[sqlite3.Connection] = None
+        # sqlite3 connections are single-threaded, so every disk cache call goes through one worker
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+        
+        # Semantic intent cache, allocated on first use
+        self._intent_embs: Optional["np.ndarray"] = None
+        self._intent_plans: List[Dict] = []
+        self._intent_next = 0
+        self._intent_saved = 0
+        # Plans for exact repeats, checked before paying for an embedding
+        self._intent_exact: "OrderedDict[str, Dict]" = OrderedDict()
+        self._intent_tasks = set()
+        
+        self._llm_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        
+        # Keep-alive HTTP session, created on first use inside the running loop
+        self._http: Optional["aiohttp.ClientSession"] = None
+        
+        # Idle bash workers for run_command, started on first use
+        self._shell_pool: Optional[asyncio.Queue] = None
+        self._bash: Optional[str] = None
+
+    def _get_http(self) -> "aiohttp.ClientSession":
+        """Return the shared HTTP session, opening it if needed"""
+        if self._http is None or self._http.closed:
+            import aiohttp
+            self._http = aiohttp.ClientSession(
+                headers=HTTP_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+            )
+        return self._http
+
+    async def aclose(self):
+        """Close the shared HTTP session and the on-disk response cache"""
+        # Let background intent embeddings land in the cache, then persist it
+        if self._intent_tasks:
+            await asyncio.gather(*self._intent_tasks, return_exceptions=True)
+        if self._intent_next != self._intent_saved:
+            self._save_intent_cache()
+        
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+        
+        # Let queued cache writes finish, then close the database on its own thread
+        await asyncio.get_running_loop().run_in_executor(self._db_executor, self._close_disk_cache)
+        self._db_executor.shutdown(wait=True)
+        
+        if self._shell_pool is not None:
+            while not self._shell_pool.empty():
+                await self._kill_worker(self._shell_pool.get_nowait())
+            self._shell_pool = None
+
+    async def _astart(self):
+        """Start the pool of warm shell workers; it stays empty where bash is unavailable"""
+        self._shell_pool = asyncio.Queue()
+        # Without bash (e.g. Windows) every command takes the subprocess.run fallback
+        self._bash = shutil.which("bash") if os.name != "nt" else None
+        if self._bash is None:
+            return
+        try:
+            for _ in range(SHELL_POOL_SIZE):
+                self._shell_pool.put_nowait(await self._spawn_worker())
+        except OSError:
+            self._bash = None
+
+    async def _spawn_worker(self):
+        return await asyncio.create_subprocess_exec(
+            self._bash,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            # Own process group, so a kill also reaches the command running in the subshell
+            start_new_session=True
+        )
+
+    @staticmethod
+    async def _kill_worker(worker):
+        """Kill a shell worker together with any command it is still running"""
+        if worker.returncode is None:
+            try:
+                os.killpg(worker.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await worker.wait()
+
+    async def _run_in_worker(self, worker, command: str) -> str:
+        """Run a command in a warm shell and read its output up to a sentinel line"""
+        sentinel = f"__DONE_{uuid.uuid4().hex}__"
+        # eval of the quoted command confines syntax errors (e.g. an unbalanced quote) to this
+        # one command, and the subshell keeps cd/exit from leaking into the worker
+        worker.stdin.write(f"( eval {shlex.quote(command)} ) </dev/null 2>&1; printf '\\n{sentinel}\\n'\n".encode())
+        await worker.stdin.drain()
+        
+        lines = []
+        while True:
+            line = await worker.stdout.readline()
+            if not line:
+                raise ConnectionResetError("shell worker exited")
+            if line.rstrip(b"\n") == sentinel.encode():
+                break
+            lines.append(line)
+        
+        # Drop the newline printed ahead of the sentinel
+        return b"".join(lines).decode(errors="replace")[:-1]
+
+    async def _shell(self, command: str) -> str:
+        """Run a command on a warm worker, falling back to a fresh shell when none is idle"""
+        if self._shell_pool is None:
+            await self._astart()
+        
+        try:
+            worker = self._shell_pool.get_nowait()
+        except asyncio.QueueEmpty:
+            worker = None
+        
+        if worker is None or worker.returncode is not None:
+            result = await asyncio.to_thread(
+                subprocess.run, command, shell=True, capture_output=True, text=True, timeout=COMMAND_TIMEOUT
+            )
+            return result.stdout if result.stdout else result.stderr
+        
+        try:
+            output = await asyncio.wait_for(self._run_in_worker(worker, command), COMMAND_TIMEOUT)
+        except BaseException:
+            # A worker left mid-command cannot be reused; replace it so the pool keeps its size
+            await self._kill_worker(worker)
+            if self._shell_pool is not None and self._bash is not None:
+                try:
+                    self._shell_pool.put_nowait(await self._spawn_worker())
+                except OSError:
+                    pass
+            raise
+        
+        self._shell_pool.put_nowait(worker)
+        return output
+
+    async def chat(self, model: str, messages: List[Dict], temperature: float,
+                   response_format: Optional[Dict] = None) -> str:
+        """Run a chat completion, serving repeated low-temperature prompts from the cache"""
+        if temperature > CACHEABLE_TEMPERATURE:
+            return await self._complete(model, messages, temperature, response_format)
+        
+        key = _cache_key(model, messages, temperature, response_format)
+        content = await self._cache_get(key)
+        if content is None:
+            self.cache_misses += 1
+            content = await self._complete(model, messages, temperature, response_format)
+            self._cache_put(key, content)
+        return content
+
+    async def stream_chat(self, model: str, messages: List[Dict], temperature: float) -> AsyncIterator[str]:
+        """Stream a chat completion token by token, sharing the response cache with chat"""
+        key = None
+        if temperature <= CACHEABLE_TEMPERATURE:
+            key = _cache_key(model, messages, temperature)
+            content = await self._cache_get(key)
+            if content is not None:
+                yield content
+                return
+            self.cache_misses += 1
+        
+        pieces = []
+        async with self._llm_semaphore:
+            stream = await self.openai_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                piece = chunk.choices[0].delta.content
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+        
+        if key is not None:
+            self._cache_put(key, "".join(pieces))
+
+    async def _cache_get(self, key: tuple) -> Optional[str]:
+        """Look up a response in the in-memory LRU, then on disk"""
+        if key in self._response_cache:
+            self._response_cache.move_to_end(key)
+            self.cache_hits += 1
+            return self._response_cache[key]
+        
+        content = await asyncio.get_running_loop().run_in_executor(
+            self._db_executor, self._disk_get, hashlib.blake2b(repr(key).encode()).hexdigest()
+        )
+        if content is not None:
+            self.cache_hits += 1
+            self._remember_response(key, content)
+        return content
+
+    def _cache_put(self, key: tuple, content: str):
+        """Store a response in memory, and on disk in the background"""
+        self._remember_response(key, content)
+        # The reply doesn't wait on the disk; _disk_set swallows its own errors
+        self._db_executor.submit(self._disk_set, hashlib.blake2b(repr(key).encode()).hexdigest(), content)
+
+    def _remember_response(self, key: tuple, content: str):
+        self._response_cache[key] = content
+        if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+
+    def _open_disk_cache(self) -> Optional[sqlite3.Connection]:
+        """Open the on-disk response cache on the DB thread, or return None if it is unavailable"""
+        if self._disk_cache is None:
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                self._disk_cache = sqlite3.connect(os.path.join(CACHE_DIR, "responses.db"), check_same_thread=False)
+                # WAL appends instead of rewriting pages; NORMAL skips the fsync per commit
+                self._disk_cache.execute("PRAGMA journal_mode=WAL")
+                self._disk_cache.execute("PRAGMA synchronous=NORMAL")
+                self._disk_cache.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT, expires REAL)"
+                )
+                self._disk_cache.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+                self._disk_cache.commit()
+            except (OSError, sqlite3.Error):
+                self._disk_cache = None
+        return self._disk_cache
+
+    def _close_disk_cache(self):
+        if self._disk_cache is not None:
+            self._disk_cache.close()
+            self._disk_cache = None
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        """Look up an unexpired response in the on-disk cache"""
+        db = self._open_disk_cache()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT content FROM responses WHERE key = ? AND expires >= ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def _disk_set(self, key: str, content: str):
+        """Store a response in the on-disk cache"""
+        db = self._open_disk_cache()
+        if db is None:
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, content, expires) VALUES (?, ?, ?)",
+                (key, content, time.time() + RESPONSE_CACHE_TTL)
+            )
+            db.commit()
+        except sqlite3.Error:
+            pass
+
+    async def _complete(self, model: str, messages: List[Dict], temperature: float,
+                        response_format: Optional[Dict] = None) -> str:
+        """Call the OpenAI chat completions API"""
+        extra = {"response_format": response_format} if response_format else {}
+        async with self._llm_semaphore:
+            response = await self.openai_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                **extra
+            )
+        return response.choices[0].message.content
+
+    async def _embed(self, text: str) -> "np.ndarray":
+        """Embed text and L2-normalize it for cosine similarity"""
+        async with self._llm_semaphore:
+            response = await self.openai_client.embeddings.create(model=INTENT_EMBEDDING_MODEL, input=text)
+        np = _lazy_numpy()
+        embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+        return embedding / np.linalg.norm(embedding)
+
+    def _load_intent_cache(self):
+        """Map the fp16 intent cache from disk, restoring any saved entries"""
+        np = _lazy_numpy()
+        shape = (INTENT_CACHE_SIZE, INTENT_EMBEDDING_DIM)
+        path = os.path.join(CACHE_DIR, "intent_embs.f16")
+        
+        # Copy-on-write: rows change only in memory until _save_intent_cache writes them out
+        # together with the plans, so the two files never disagree
+        try:
+            if os.path.getsize(path) != INTENT_CACHE_SIZE * INTENT_EMBEDDING_DIM * 2:
+                raise OSError("intent cache size mismatch")
+            self._intent_embs = np.memmap(path, dtype=np.float16, mode="c", shape=shape)
+        except OSError:
+            self._intent_embs = np.zeros(shape, dtype=np.float16)
+            return
+        
+        try:
+            with open(os.path.join(CACHE_DIR, "intent_plans.json"), 'r') as f:
+                plans = json.load(f)
+            count = min(len(plans), INTENT_CACHE_SIZE)
+            self._intent_plans = plans[:count]
+            self._intent_next = self._intent_saved = count
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def _save_intent_cache(self):
+        """Persist the intent embeddings and plans to disk as one snapshot"""
+        if self._intent_embs is None:
+            return
+        embs_path = os.path.join(CACHE_DIR, "intent_embs.f16")
+        plans_path = os.path.join(CACHE_DIR, "intent_plans.json")
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Write both to temp files first, then swap them in back to back
+            self._intent_embs.tofile(embs_path + ".tmp")
+            with open(plans_path + ".tmp", 'w') as f:
+                json.dump(self._intent_plans, f)
+            os.replace(embs_path + ".tmp", embs_path)
+            os.replace(plans_path + ".tmp", plans_path)
+            self._intent_saved = self._intent_next
+        except OSError:
+            pass
+
+    def _lookup_intent(self, embedding: "np.ndarray") -> Optional[Dict]:
+        """Return a cached plan for a semantically similar request"""
+        if self._intent_embs is None:
+            self._load_intent_cache()
+        
+        if not self._intent_plans:
+            return None
+        
+        scores = self._intent_embs[:len(self._intent_plans)] @ embedding.astype("float16")
+        best = int(scores.argmax())
+        if scores[best] >= INTENT_SIMILARITY_THRESHOLD:
+            action = self._intent_plans[best].get("action")
+            if action in SEMANTIC_INTENT_ACTIONS:
+                return {"action": action, "parameters": {}, "reasoning": "semantic cache"}
+        return None
+
+    def _remember_intent(self, embedding: "np.ndarray", plan: Dict):
+        """Add a plan to the intent cache, evicting the oldest entry when full"""
+        slot = self._intent_next % INTENT_CACHE_SIZE
+        self._intent_embs[slot] = embedding
+        if slot < len(self._intent_plans):
+            self._intent_plans[slot] = plan
+        else:
+            self._intent_plans.append(plan)
+        
+        self._intent_next += 1
+        if self._intent_next % INTENT_FLUSH_EVERY == 0:
+            self._save_intent_cache()
+
+    async def _embed_and_remember(self, user_input: str, plan: Dict):
+        try:
+            self._remember_intent(await self._embed(user_input), plan)
+        except Exception:
+            pass
 
     async def process_request(self, user_input: str) -> str:
         """Process user request and execute actions"""
@@ -36,44 +629,89 @@ class ActionAgent:
         action_plan = await self.analyze_intent(user_input)
         
         # Execute the action
-        if action_plan["action"] in self.actions:
-            result = await self.actions[action_plan["action"]](action_plan["parameters"], user_input)
-            return result
-        else:
-            # Fallback to conversational response
-            return await self.get_ai_response(user_input)
-
-    async def analyze_intent(self, user_input: str) -> Dict[str, Any]:
-        """Analyze user intent and determine action"""
+        handler = self.actions.get(action_plan["action"])
+        if handler is not None:
+            return await handler(action_plan["parameters"], user_input)
         
-        prompt = f"""
-Analyze this request and determine the specific action needed:
-"{user_input}"
+        # Fallback to conversational response
+        return await self.get_ai_response(user_input)
 
-Return JSON with:
-{{
-    "action": "search_web|write_code|run_command|create_file|read_file|analyze_data|send_request|calculate|translate|summarize|chat",
-    "parameters": {{"key": "value"}},
-    "reasoning": "why this action"
-}}
+    async def stream_request(self, user_input: str) -> AsyncIterator[str]:
+        """Process a request, yielding output as it is generated"""
+        action_plan = await self.analyze_intent(user_input)
+        action = action_plan["action"]
+        
+        stream_handler = self.stream_actions.get(action)
+        if stream_handler is not None:
+            async for piece in stream_handler(action_plan["parameters"], user_input):
+                yield piece
+            return
+        
+        handler = self.actions.get(action)
+        if handler is not None:
+            yield await handler(action_plan["parameters"], user_input)
+            return
+        
+        async for piece in self.stream_ai_response(user_input):
+            yield piece
 
-Examples:
-- "search for python tutorials" → {{"action": "search_web", "parameters": {{"query": "python tutorials"}}}}
-- "create a sorting function" → {{"action": "write_code", "parameters": {{"task": "sorting function", "language": "python"}}}}
-- "run ls command" → {{"action": "run_command", "parameters": {{"command": "ls"}}}}
-- "create file test.txt" → {{"action": "create_file", "parameters": {{"filename": "test.txt", "content": ""}}}}
-"""
+    async def batch_process(self, inputs: List[str]) -> List[str]:
+        """Process independent requests concurrently"""
+        return await asyncio.gather(*(self.process_request(user_input) for user_input in inputs))
 
+    async def analyze_intent(self, user_input: str) -> Dict[str, Any]:
+        """Analyze user intent and determine action"""
+        
+        fast_plan = _fast_intent(user_input)
+        if fast_plan:
+            return fast_plan
+        
+        exact_plan = self._intent_exact.get(user_input)
+        if exact_plan is not None:
+            self._intent_exact.move_to_end(user_input)
+            return exact_plan
+        
+        # The embedding is an extra round-trip, so only pay it when there are plans to match
+        if self._intent_embs is None:
+            self._load_intent_cache()
+        embedding = None
+        if self._intent_plans:
+            try:
+                embedding = await self._embed(user_input)
+                cached_plan = self._lookup_intent(embedding)
+                if cached_plan:
+                    return cached_plan
+            except Exception:
+                embedding = None
+        
         try:
-            response = self.openai_client.chat.completions.create(
+            content = await self.chat(
                 model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1
+                messages=[
+                    {"role": "system", "content": INTENT_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_input}
+                ],
+                temperature=0.1,
+                response_format=self.intent_response_format
             )
             
-            result = json.loads(response.choices[0].message.content)
+            # A refusal comes back with content None, which _json_loads rejects with TypeError
+            result = _json_loads(content)
+            if not isinstance(result, dict) or "action" not in result or not isinstance(result.get("parameters"), dict):
+                raise ValueError(f"unexpected intent reply: {content!r}")
+            self._intent_exact[user_input] = result
+            if len(self._intent_exact) > INTENT_CACHE_SIZE:
+                self._intent_exact.popitem(last=False)
+            if result["action"] in SEMANTIC_INTENT_ACTIONS:
+                if embedding is not None:
+                    self._remember_intent(embedding, result)
+                else:
+                    # Embed after replying; only these actions can be served by a similar request
+                    task = asyncio.create_task(self._embed_and_remember(user_input, result))
+                    self._intent_tasks.add(task)
+                    task.add_done_callback(self._intent_tasks.discard)
             return result
-        except:
+        except (ValueError, TypeError, _lazy_openai().OpenAIError):
             return {"action": "chat", "parameters": {}, "reasoning": "fallback"}
 
     async def search_web(self, params: Dict, original_query: str) -> str:
@@ -82,20 +720,20 @@ Examples:
         
         try:
             # Use DuckDuckGo search
-            import requests
-            from bs4 import BeautifulSoup
+            url = "https://html.duckduckgo.com/html/"
             
-            url = f"https://html.duckduckgo.com/html/?q={query}"
-            headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-            
-            response = requests.get(url, headers=headers)
-            soup = BeautifulSoup(response.content, 'html.parser')
+            async with self._get_http().get(url, params={"q": query}) as response:
+                html = await response.read()
             
             results = []
-            for result in soup.find_all('a', class_='result__a')[:5]:
-                title = result.get_text()
-                link = result.get('href')
-                results.append(f"• {title}: {link}")
+            HTMLParser = _lazy_html_parser()
+            if HTMLParser is not None:
+                for result in HTMLParser(html).css("a.result__a")[:5]:
+                    results.append(f"• {result.text()}: {result.attributes.get('href')}")
+            else:
+                soup = _lazy_bs4()(html, 'html.parser')
+                for result in soup.find_all('a', class_='result__a')[:5]:
+                    results.append(f"• {result.get_text()}: {result.get('href')}")
             
             return f"🔍 Search results for '{query}':\n\n" + "\n".join(results)
             
@@ -104,29 +742,37 @@ Examples:
 
     async def write_code(self, params: Dict, original_query: str) -> str:
         """Generate and return code"""
+        return await self._collect(self.stream_write_code(params, original_query))
+
+    async def stream_write_code(self, params: Dict, original_query: str) -> AsyncIterator[str]:
+        """Stream generated code, saving it to a file once complete"""
         task = params.get("task", original_query)
         language = params.get("language", "python")
         
-        prompt = f"Write {language} code for: {task}\n\nProvide only the code with brief comments."
-        
         try:
-            response = self.openai_client.chat.completions.create(
+            yield f"💻 Generated {language} code:\n\n```{language}\n"
+            pieces = []
+            async for piece in self.stream_chat(
                 model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
+                messages=[
+                    {"role": "system", "content": f"Write {language} code for the user's task. Provide only the code with brief comments."},
+                    {"role": "user", "content": task}
+                ],
                 temperature=0.2
-            )
-            
-            code = response.choices[0].message.content
+            ):
+                pieces.append(piece)
+                yield piece
             
             # Save code to file
-            filename = f"generated_code_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{language}"
-            with open(filename, 'w') as f:
-                f.write(code)
+            filename = f"generated_code_{time.strftime('%Y%m%d_%H%M%S')}_{next(_filename_counter)}.{language}"
+            import aiofiles
+            async with aiofiles.open(filename, 'w') as f:
+                await f.write("".join(pieces))
             
-            return f"💻 Generated {language} code:\n\n```{language}\n{code}\n```\n\n✅ Saved to: {filename}"
+            yield f"\n```\n\n✅ Saved to: {filename}"
             
         except Exception as e:
-            return f"❌ Code generation failed: {str(e)}"
+            yield f"❌ Code generation failed: {str(e)}"
 
     async def run_command(self, params: Dict, original_query: str) -> str:
         """Execute system command"""
@@ -136,17 +782,14 @@ Examples:
             return "❌ No command specified"
         
         # Safety check
-        dangerous_commands = ["rm -rf", "del /f", "format", "shutdown", "reboot"]
-        if any(danger in command.lower() for danger in dangerous_commands):
+        if _DANGER_RE.search(command):
             return "❌ Dangerous command blocked for safety"
         
         try:
-            result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=30)
-            
-            output = result.stdout if result.stdout else result.stderr
+            output = await self._shell(command)
             return f"💻 Command: `{command}`\n\n```\n{output}\n```"
             
-        except subprocess.TimeoutExpired:
+        except (subprocess.TimeoutExpired, asyncio.TimeoutError):
             return f"⏰ Command timed out: {command}"
         except Exception as e:
             return f"❌ Command failed: {str(e)}"
@@ -157,8 +800,9 @@ Examples:
         content = params.get("content", "")
         
         try:
-            with open(filename, 'w') as f:
-                f.write(content)
+            import aiofiles
+            async with aiofiles.open(filename, 'w') as f:
+                await f.write(content)
             
             return f"✅ Created file: {filename}\n📄 Content: {content[:100]}{'...' if len(content) > 100 else ''}"
             
@@ -178,31 +822,38 @@ Examples:
                     break
         
         try:
-            with open(filename, 'r') as f:
-                content = f.read()
+            import aiofiles
+            # Read one character past the preview to know whether the file was truncated
+            async with aiofiles.open(filename, 'r') as f:
+                content = await f.read(READ_PREVIEW_CHARS + 1)
             
-            return f"📄 File: {filename}\n\n```\n{content[:1000]}{'...' if len(content) > 1000 else ''}\n```"
+            return f"📄 File: {filename}\n\n```\n{content[:READ_PREVIEW_CHARS]}{'...' if len(content) > READ_PREVIEW_CHARS else ''}\n```"
             
         except Exception as e:
             return f"❌ File read failed: {str(e)}"
 
     async def analyze_data(self, params: Dict, original_query: str) -> str:
         """Analyze data or files"""
+        return await self._collect(self.stream_analyze_data(params, original_query))
+
+    async def stream_analyze_data(self, params: Dict, original_query: str) -> AsyncIterator[str]:
+        """Stream a data analysis"""
         data_source = params.get("source", "")
         
-        prompt = f"Analyze this data request: {original_query}\n\nProvide specific analysis steps and insights."
-        
         try:
-            response = self.openai_client.chat.completions.create(
+            yield "📊 Data Analysis:\n\n"
+            async for piece in self.stream_chat(
                 model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
+                messages=[
+                    {"role": "system", "content": "Analyze the user's data request. Provide specific analysis steps and insights."},
+                    {"role": "user", "content": original_query}
+                ],
                 temperature=0.3
-            )
-            
-            return f"📊 Data Analysis:\n\n{response.choices[0].message.content}"
+            ):
+                yield piece
             
         except Exception as e:
-            return f"❌ Analysis failed: {str(e)}"
+            yield f"❌ Analysis failed: {str(e)}"
 
     async def send_request(self, params: Dict, original_query: str) -> str:
         """Send HTTP request"""
@@ -210,12 +861,12 @@ Examples:
         method = params.get("method", "GET")
         
         try:
-            if method.upper() == "GET":
-                response = requests.get(url, timeout=10)
-            elif method.upper() == "POST":
-                response = requests.post(url, json=params.get("data", {}), timeout=10)
+            data = params.get("data", {}) if method.upper() == "POST" else None
+            async with self._get_http().request(method.upper(), url, json=data) as response:
+                status = response.status
+                text = await response.text()
             
-            return f"🌐 HTTP {method} to {url}\n📊 Status: {response.status_code}\n📄 Response: {response.text[:500]}..."
+            return f"🌐 HTTP {method} to {url}\n📊 Status: {status}\n📄 Response: {text[:500]}..."
             
         except Exception as e:
             return f"❌ Request failed: {str(e)}"
@@ -225,32 +876,7 @@ Examples:
         expression = params.get("expression", original_query)
         
         try:
-            # Safe evaluation
-            import ast
-            import operator
-            
-            # Allowed operations
-            ops = {
-                ast.Add: operator.add,
-                ast.Sub: operator.sub,
-                ast.Mult: operator.mul,
-                ast.Div: operator.truediv,
-                ast.Pow: operator.pow,
-                ast.USub: operator.neg,
-            }
-            
-            def eval_expr(node):
-                if isinstance(node, ast.Num):
-                    return node.n
-                elif isinstance(node, ast.BinOp):
-                    return ops[type(node.op)](eval_expr(node.left), eval_expr(node.right))
-                elif isinstance(node, ast.UnaryOp):
-                    return ops[type(node.op)](eval_expr(node.operand))
-                else:
-                    raise TypeError(node)
-            
-            # Parse and evaluate
-            result = eval_expr(ast.parse(expression, mode='eval').body)
+            result = _evaluate(_compile_expression(expression))
             return f"🧮 Calculation: {expression} = {result}"
             
         except Exception as e:
@@ -258,57 +884,74 @@ Examples:
 
     async def translate(self, params: Dict, original_query: str) -> str:
         """Translate text"""
+        return await self._collect(self.stream_translate(params, original_query))
+
+    async def stream_translate(self, params: Dict, original_query: str) -> AsyncIterator[str]:
+        """Stream a translation"""
         text = params.get("text", "")
         target_lang = params.get("target", "English")
         
-        prompt = f"Translate this to {target_lang}: {text}"
-        
         try:
-            response = self.openai_client.chat.completions.create(
+            yield f"🌐 Translation to {target_lang}:\n\n"
+            async for piece in self.stream_chat(
                 model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
+                messages=[
+                    {"role": "system", "content": f"Translate the user's text to {target_lang}."},
+                    {"role": "user", "content": text}
+                ],
                 temperature=0.1
-            )
-            
-            return f"🌐 Translation to {target_lang}:\n\n{response.choices[0].message.content}"
+            ):
+                yield piece
             
         except Exception as e:
-            return f"❌ Translation failed: {str(e)}"
+            yield f"❌ Translation failed: {str(e)}"
 
     async def summarize(self, params: Dict, original_query: str) -> str:
         """Summarize text or content"""
+        return await self._collect(self.stream_summarize(params, original_query))
+
+    async def stream_summarize(self, params: Dict, original_query: str) -> AsyncIterator[str]:
+        """Stream a summary"""
         content = params.get("content", original_query)
         
-        prompt = f"Summarize this concisely:\n\n{content}"
-        
         try:
-            response = self.openai_client.chat.completions.create(
+            yield "📝 Summary:\n\n"
+            async for piece in self.stream_chat(
                 model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
+                messages=[
+                    {"role": "system", "content": "Summarize the user's content concisely."},
+                    {"role": "user", "content": content}
+                ],
                 temperature=0.2
-            )
-            
-            return f"📝 Summary:\n\n{response.choices[0].message.content}"
+            ):
+                yield piece
             
         except Exception as e:
-            return f"❌ Summarization failed: {str(e)}"
+            yield f"❌ Summarization failed: {str(e)}"
 
     async def get_ai_response(self, user_input: str) -> str:
         """Get conversational AI response"""
+        return await self._collect(self.stream_ai_response(user_input))
+
+    async def stream_ai_response(self, user_input: str) -> AsyncIterator[str]:
+        """Stream a conversational AI response"""
         try:
-            response = self.openai_client.chat.completions.create(
+            async for piece in self.stream_chat(
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": "You are a helpful AI assistant that takes action. Be concise and actionable."},
                     {"role": "user", "content": user_input}
                 ],
                 temperature=0.7
-            )
-            
-            return response.choices[0].message.content
+            ):
+                yield piece
             
         except Exception as e:
-            return f"❌ AI response failed: {str(e)}"
+            yield f"❌ AI response failed: {str(e)}"
+
+    @staticmethod
+    async def _collect(stream: AsyncIterator[str]) -> str:
+        return "".join([piece async for piece in stream])
 
 # Simple CLI interface
 async def main():
@@ -332,14 +975,17 @@ async def main():
                 continue
             
             print("🔄 Processing...")
-            response = await agent.process_request(user_input)
-            print(f"\n🤖 Agent: {response}")
+            print("\n🤖 Agent: ", end="", flush=True)
+            async for piece in agent.stream_request(user_input):
+                print(piece, end="", flush=True)
+            print()
             
         except KeyboardInterrupt:
             break
         except Exception as e:
             print(f"❌ Error: {e}")
     
+    await agent.aclose()
     print("\n👋 Goodbye!")
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+# core/log_listener.py - One background thread that writes every queued log record
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Tuple
+
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_listener: Optional[QueueListener] = None
+_hooks_registered = False
+_lock = threading.Lock()
+
+class _TargetQueueHandler(QueueHandler):
+    """Enqueue records tagged with the handlers the listener should write them to"""
+
+    def __init__(self, targets: Tuple[logging.Handler, ...]):
+        super().__init__(_log_queue)
+        self.targets = targets
+
+    def enqueue(self, record: logging.LogRecord):
+        # record is prepare()'s copy, so the tag never reaches other handlers of the original
+        record.log_targets = self.targets
+        super().enqueue(record)
+
+class _Dispatcher(logging.Handler):
+    """Runs on the listener thread and hands each record to its own targets"""
+
+    def handle(self, record: logging.LogRecord):
+        for handler in record.log_targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+def _start():
+    global _listener
+    _listener = QueueListener(_log_queue, _Dispatcher())
+    _listener.start()
+
+def _restart_in_child():
+    # Threads don't survive fork, so gunicorn --preload workers each start their own listener.
+    # Records copied from the parent's queue are the parent's to write
+    while not _log_queue.empty():
+        _log_queue.get_nowait()
+    if _listener is not None:
+        _start()
+
+def queue_handler(*handlers: logging.Handler) -> QueueHandler:
+    """Return a handler that only enqueues; the shared listener thread writes to handlers"""
+    global _hooks_registered
+    with _lock:
+        if _listener is None:
+            _start()
+        if not _hooks_registered:
+            _hooks_registered = True
+            atexit.register(stop)
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=_restart_in_child)
+    return _TargetQueueHandler(handlers)
+
+def stop():
+    """Write out everything still queued and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -1,12 +1,17 @@
 # core/multimodal_agent.py
 import asyncio
+import hashlib
+import importlib.util
+import io
 import json
 import logging
 import os
+import re
 import time
 from datetime import datetime
-from typing import Dict, List, Optional, Union, Any
-from dataclasses import dataclass, asdict
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union, Any
+from collections import OrderedDict, deque, namedtuple
+from dataclasses import dataclass
 from enum import Enum
 
 import torch
@@ -15,20 +20,22 @@ from transformers import (
     AutoTokenizer, AutoModelForCausalLM, 
     WhisperProcessor, WhisperForConditionalGeneration,
     BlipProcessor, BlipForConditionalGeneration,
-    pipeline
+    BitsAndBytesConfig, pipeline
 )
-from peft import LoraConfig, get_peft_model, TaskType
+from peft import LoraConfig, get_peft_model
+from peft import TaskType as PeftTaskType
 import speech_recognition as sr
 from gtts import gTTS
 import cv2
 import numpy as np
 from PIL import Image
 import requests
+import httpx
 from langdetect import detect
 import openai
 import anthropic
 import google.generativeai as genai
-from huggingface_hub import InferenceClient
+from huggingface_hub import AsyncInferenceClient
 
 # LangGraph imports
 from langgraph.graph import StateGraph, END
@@ -36,6 +43,23 @@ from langgraph.prebuilt import ToolExecutor
 from langchain.tools import BaseTool
 from langchain.schema import BaseMessage, HumanMessage, AIMessage, SystemMessage
 
+from core import log_listener
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
 class TaskType(Enum):
     TEXT_GENERATION = "text_generation"
     IMAGE_ANALYSIS = "image_analysis"
@@ -56,6 +80,139 @@ class ModelProvider(Enum):
     LOCAL = "local"
     MISTRAL = "mistral"
 
+# Task keywords in priority order, compiled into one case-insensitive regex with a named group per task
+_TASK_KEYWORDS = [
+    (("image", "picture"), TaskType.IMAGE_ANALYSIS),
+    (("translate",), TaskType.TRANSLATION),
+    (("summarize",), TaskType.SUMMARIZATION),
+    (("code", "program"), TaskType.CODE_GENERATION),
+]
+_TASK_PRIORITY = {task.name: rank for rank, (_, task) in enumerate(_TASK_KEYWORDS)}
+_TASK_RE = re.compile(
+    "|".join(f"(?P<{task.name}>{'|'.join(map(re.escape, keywords))})" for keywords, task in _TASK_KEYWORDS),
+    re.IGNORECASE
+)
+
+CLASSIFY_CACHE_SIZE = 4096
+
+# Semantic response cache for process_text_input
+SEMANTIC_CACHE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SEMANTIC_CACHE_THRESHOLD = 0.87
+SEMANTIC_CACHE_SIZE = 1024
+
+# Interaction logs: in-memory history is bounded, JSON lines are written by a background task
+SESSION_LOG_LIMIT = 10_000
+LOG_FLUSH_EVERY = 64
+LOG_FLUSH_INTERVAL = 0.1
+
+# Whisper/BLIP encoder outputs cached by media content hash
+MM_CACHE_ENTRIES = 256
+
+# Micro-batching for local generation: requests arriving within the window share one generate()
+LOCAL_BATCH_SIZE = 16
+LOCAL_BATCH_WAIT_MS = 10
+LOCAL_MAX_NEW_TOKENS = 512
+# Prompts are left-padded to one of these lengths so the compiled graph cache stays small
+LOCAL_LENGTH_BUCKETS = [128, 256, 512, 1024, 2048]
+
+# Connection pool shared by the OpenAI and Anthropic clients
+API_TIMEOUT = 30
+API_MAX_KEEPALIVE = 32
+API_MAX_CONNECTIONS = 64
+
+# Provider model ids for the routing names used by intelligent_model_routing
+API_MODEL_IDS = {
+    "gpt-4": "gpt-4",
+    "gpt-4-vision": "gpt-4o",
+    "claude-3-opus": "claude-3-opus-20240229",
+    "gemini-pro": "gemini-pro",
+    "gemini-pro-vision": "gemini-pro",
+    "codellama": "codellama/CodeLlama-7b-Instruct-hf",
+}
+# Routing candidates; gpt-4 comes first so that ties resolve to it, as they did with dict insertion order
+_MODEL_NAMES = ["gpt-4", "claude-3-opus", "gemini-pro", "mistral-7b-instruct", "codellama",
+                "opus-mt", "gpt-4-vision", "gemini-pro-vision", "blip"]
+_PROVIDER_MAP: Dict[str, ModelProvider] = {
+    "gpt-4": ModelProvider.OPENAI,
+    "gpt-4-vision": ModelProvider.OPENAI,
+    "claude-3-opus": ModelProvider.ANTHROPIC,
+    "gemini-pro": ModelProvider.GOOGLE,
+    "gemini-pro-vision": ModelProvider.GOOGLE,
+    "mistral-7b-instruct": ModelProvider.LOCAL,
+    "codellama": ModelProvider.HUGGINGFACE,
+    "blip": ModelProvider.LOCAL,
+    "opus-mt": ModelProvider.LOCAL
+}
+_PROVIDER_LUT = [_PROVIDER_MAP[name] for name in _MODEL_NAMES]
+
+def _score_vector(scores: Dict[str, float]) -> np.ndarray:
+    """Lay out per-model scores as an array indexed like _MODEL_NAMES"""
+    array = np.zeros(len(_MODEL_NAMES))
+    for name, score in scores.items():
+        array[_MODEL_NAMES.index(name)] = score
+    return array
+
+_TASK_SCORE_TABLE: Dict[Optional[TaskType], np.ndarray] = {
+    TaskType.CODE_GENERATION: _score_vector({"gpt-4": 0.9, "claude-3-opus": 0.85, "mistral-7b-instruct": 0.7, "codellama": 0.95}),
+    TaskType.TRANSLATION: _score_vector({"gpt-4": 0.8, "gemini-pro": 0.85, "opus-mt": 0.9}),
+    TaskType.IMAGE_ANALYSIS: _score_vector({"gpt-4-vision": 0.95, "gemini-pro-vision": 0.9, "blip": 0.7}),
+    None: _score_vector({"gpt-4": 0.9, "claude-3-opus": 0.85, "gemini-pro": 0.8, "mistral-7b-instruct": 0.75}),
+}
+_LANGUAGE_BONUS = _score_vector({"gemini-pro": 0.1, "gpt-4": 0.05})
+_COMPLEXITY_BONUS = _score_vector({"gpt-4": 0.1, "claude-3-opus": 0.1})
+_classify_cache: "OrderedDict[int, Tuple[TaskType, str]]" = OrderedDict()
+
+def _dumps_log(record: Dict) -> bytes:
+    """Serialize a log record as one JSON line"""
+    if orjson is not None:
+        return orjson.dumps(record, default=str, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, default=str) + "\n").encode()
+
+def _inference_precision() -> Tuple[torch.dtype, Dict[str, str]]:
+    """Pick the model dtype and the extra from_pretrained kwargs for the attention kernel"""
+    if torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 8:
+        # Ampere+ has native bf16; FlashAttention-2 needs the flash_attn package. Otherwise the
+        # kwarg is left out and transformers picks its own default (SDPA where supported)
+        if importlib.util.find_spec("flash_attn"):
+            return torch.bfloat16, {"attn_implementation": "flash_attention_2"}
+        return torch.bfloat16, {}
+    if torch.cuda.is_available():
+        return torch.float16, {}
+    return torch.float32, {}
+
+def _media_key(media: Union[bytes, str]) -> str:
+    """Cache key for raw media bytes, or the URL itself when media is referenced by URL"""
+    if isinstance(media, str):
+        return media
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(media)
+    return hashlib.blake2b(media, digest_size=16).hexdigest()
+
+def _content_hash(text: str) -> int:
+    return xxhash.xxh3_64_intdigest(text) if xxhash is not None else hash(text)
+
+def _classify(text: str) -> Tuple[TaskType, str]:
+    """Return (task type, language) for a message, cached by content hash"""
+    key = _content_hash(text)
+    cached = _classify_cache.get(key)
+    if cached is not None:
+        _classify_cache.move_to_end(key)
+        return cached
+    
+    try:
+        language = detect(text)
+    except Exception:
+        language = "en"
+    
+    # One scan over the message; the highest-priority task found wins
+    matched = {match.lastgroup for match in _TASK_RE.finditer(text)}
+    task = TaskType[min(matched, key=_TASK_PRIORITY.__getitem__)] if matched else TaskType.TEXT_GENERATION
+    
+    _classify_cache[key] = (task, language)
+    if len(_classify_cache) > CLASSIFY_CACHE_SIZE:
+        _classify_cache.popitem(last=False)
+    return task, language
+
 @dataclass
 class AgentState:
     messages: List[BaseMessage]
@@ -72,6 +229,17 @@ class AgentState:
     tokens_used: int = 0
     cost: float = 0.0
 
+# One conversation turn; the timestamp is time.time_ns() and is only formatted on export
+ConvTurn = namedtuple("ConvTurn", "user assistant ts_ns model")
+
+CONVERSATION_WINDOW = 100
+
+def _with_history(text: str, history: Optional[str]) -> str:
+    """Prefix a prompt with the caller's summary of earlier turns"""
+    if not history:
+        return text
+    return f"Earlier in this conversation:\n{history}\nCurrent message: {text}"
+
 @dataclass
 class LogEntry:
     timestamp: datetime
@@ -88,34 +256,64 @@ class LogEntry:
     success: bool
     error: Optional[str] = None
 
+_LOG_FORMATTER = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
 class MultimodalAIAgent:
+    # Shared by all instances so log handlers are only attached once
+    _log_handlers_attached = False
+    
     def __init__(self, config_path: str = "config/agent_config.json"):
         self.config = self.load_config(config_path)
         self.logger = self.setup_logging()
-        self.session_logs: List[LogEntry] = []
+        self.session_logs: "deque[LogEntry]" = deque(maxlen=SESSION_LOG_LIMIT)
+        self._log_q: Optional[asyncio.Queue] = None
+        self._log_task: Optional[asyncio.Task] = None
         
         # Initialize models
         self.models = {}
         self.tokenizers = {}
         self.processors = {}
+        # Whisper, BLIP and the translator are loaded on first use by get_multimodal_model
+        self._model_locks = {name: asyncio.Lock() for name in ("whisper", "blip", "translator")}
         
         # Initialize API clients
         self.openai_client = None
         self.anthropic_client = None
         self.gemini_client = None
         self.hf_client = None
+        self._http: Optional[httpx.AsyncClient] = None
         
         # Initialize multimodal components
         self.speech_recognizer = sr.Recognizer()
         self.microphone = sr.Microphone()
         
+        # Semantic response cache: LRU of embedding-matrix row -> response
+        self.sem_cache_size = self.config.get("performance", {}).get("caching", {}).get(
+            "semantic_cache_size", SEMANTIC_CACHE_SIZE
+        )
+        self.sem_encoder = None
+        self._sem_embs: Optional[np.ndarray] = None
+        self._sem_cache: "OrderedDict[int, str]" = OrderedDict()
+        
+        # Encoder outputs for repeated images/audio, kept on the model's device
+        self.mm_cache_size = self.config.get("performance", {}).get("caching", {}).get(
+            "mm_cache_entries", MM_CACHE_ENTRIES
+        )
+        self._mm_embed_cache: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+        
+        # Local generation batch queue of (prompt, future), worker started on first use
+        self._batch_q: Optional[asyncio.Queue] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        
         # Memory and context
-        self.conversation_memory = []
+        self.conversation_memory: "deque[ConvTurn]" = deque(
+            maxlen=self.config.get("memory", {}).get("conversation_history_limit", CONVERSATION_WINDOW)
+        )
         self.user_preferences = {}
         self.custom_instructions = ""
         
-        # Initialize everything
-        asyncio.run(self.initialize_all_components())
+        
+        # Models load in initialize_all_components; use MultimodalAIAgent.create()
 
     def load_config(self, config_path: str) -> Dict:
         """Load configuration from JSON file"""
@@ -153,7 +351,7 @@ class MultimodalAIAgent:
                 "lora_config": {
                     "r": 16,
                     "lora_alpha": 32,
-                    "target_modules": ["q_proj", "v_proj"],
+                    "target_modules": ["q_proj", "v_proj", "k_proj", "o_proj"],
                     "lora_dropout": 0.1
                 }
             },
@@ -171,38 +369,40 @@ class MultimodalAIAgent:
         logger = logging.getLogger("MultimodalAgent")
         logger.setLevel(getattr(logging, self.config["logging"]["level"]))
         
-        # File handler
-        fh = logging.FileHandler(self.config["logging"]["file"])
-        fh.setLevel(logging.INFO)
-        
-        # Console handler
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.INFO)
-        
-        # Formatter
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        fh.setFormatter(formatter)
-        ch.setFormatter(formatter)
-        
-        logger.addHandler(fh)
-        logger.addHandler(ch)
+        # Handlers run on a listener thread; the request path only enqueues records
+        if not MultimodalAIAgent._log_handlers_attached:
+            # File handler
+            fh = logging.FileHandler(self.config["logging"]["file"])
+            fh.setLevel(logging.INFO)
+            
+            # Console handler
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.INFO)
+            
+            fh.setFormatter(_LOG_FORMATTER)
+            ch.setFormatter(_LOG_FORMATTER)
+            
+            logger.addHandler(log_listener.queue_handler(fh, ch))
+            MultimodalAIAgent._log_handlers_attached = True
         
         return logger
 
+    @classmethod
+    async def create(cls, config_path: str = "config/agent_config.json") -> "MultimodalAIAgent":
+        """Construct an agent and initialize it on the caller's event loop"""
+        agent = cls(config_path)
+        await agent.initialize_all_components()
+        return agent
+
     async def initialize_all_components(self):
         """Initialize all AI models and components"""
         self.logger.info("Initializing MultimodalAIAgent...")
         
-        # Initialize API clients
-        await self.initialize_api_clients()
-        
-        # Initialize local models
-        await self.initialize_local_models()
-        
-        # Initialize multimodal processors
-        await self.initialize_multimodal_processors()
+        # API clients and model loads are independent, so run them concurrently
+        await asyncio.gather(
+            self.initialize_api_clients(),
+            self.initialize_local_models()
+        )
         
         # Setup LangGraph workflow
         self.setup_langgraph_workflow()
@@ -212,13 +412,23 @@ class MultimodalAIAgent:
     async def initialize_api_clients(self):
         """Initialize API clients for external models"""
         try:
+            # One HTTP/2 pool so concurrent provider calls reuse connections instead of new TLS handshakes
+            self._http = httpx.AsyncClient(
+                http2=True,
+                timeout=API_TIMEOUT,
+                limits=httpx.Limits(max_keepalive_connections=API_MAX_KEEPALIVE, max_connections=API_MAX_CONNECTIONS)
+            )
+            
             if os.getenv("OPENAI_API_KEY"):
-                openai.api_key = os.getenv("OPENAI_API_KEY")
-                self.openai_client = openai
+                self.openai_client = openai.AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    http_client=self._http
+                )
                 
             if os.getenv("ANTHROPIC_API_KEY"):
-                self.anthropic_client = anthropic.Anthropic(
-                    api_key=os.getenv("ANTHROPIC_API_KEY")
+                self.anthropic_client = anthropic.AsyncAnthropic(
+                    api_key=os.getenv("ANTHROPIC_API_KEY"),
+                    http_client=self._http
                 )
                 
             if os.getenv("GOOGLE_API_KEY"):
@@ -226,52 +436,129 @@ class MultimodalAIAgent:
                 self.gemini_client = genai
                 
             if os.getenv("HUGGINGFACE_API_KEY"):
-                self.hf_client = InferenceClient(
+                self.hf_client = AsyncInferenceClient(
                     token=os.getenv("HUGGINGFACE_API_KEY")
                 )
                 
         except Exception as e:
-            self.logger.error(f"Error initializing API clients: {e}")
+            self.logger.error("Error initializing API clients: %s", e)
 
     async def initialize_local_models(self):
         """Initialize local Hugging Face models"""
+        # from_pretrained blocks on download and disk I/O, so each load runs in its own thread
+        await asyncio.gather(
+            asyncio.to_thread(self.load_semantic_encoder),
+            asyncio.to_thread(self.load_text_model)
+        )
+
+    def load_semantic_encoder(self):
+        """Load the sentence encoder for the semantic response cache"""
+        if SentenceTransformer is None:
+            return
+        try:
+            self.sem_encoder = SentenceTransformer(SEMANTIC_CACHE_MODEL)
+        except Exception as e:
+            self.logger.error("Error loading semantic cache encoder: %s", e)
+
+    def load_text_model(self):
+        """Load the local text generation model"""
         try:
             # Text generation model (Mistral/Falcon)
             model_name = "mistralai/Mistral-7B-Instruct-v0.1"
             self.tokenizers["text"] = AutoTokenizer.from_pretrained(model_name)
+            
+            # 4-bit NF4 weights (QLoRA) on GPU; bitsandbytes has no CPU kernels
+            dtype, attention = _inference_precision()
+            quantize = torch.cuda.is_available()
+            quantization_config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=dtype,
+                bnb_4bit_use_double_quant=True
+            ) if quantize else None
+            
             self.models["text"] = AutoModelForCausalLM.from_pretrained(
                 model_name,
-                torch_dtype=torch.float16,
-                device_map="auto" if torch.cuda.is_available() else None
+                torch_dtype=dtype,
+                quantization_config=quantization_config,
+                device_map="auto" if quantize else None,
+                **attention
             )
             
             # Apply LoRA if fine-tuning is enabled
             if self.config["fine_tuning"]["enabled"]:
-                lora_config = LoraConfig(
-                    task_type=TaskType.CAUSAL_LM,
-                    **self.config["fine_tuning"]["lora_config"]
-                )
+                lora_options = dict(self.config["fine_tuning"]["lora_config"])
+                # agent_config.json names the PEFT task type as a string
+                peft_task = PeftTaskType[lora_options.pop("task_type", "CAUSAL_LM")]
+                lora_config = LoraConfig(task_type=peft_task, **lora_options)
                 self.models["text"] = get_peft_model(self.models["text"], lora_config)
+            
+            if torch.cuda.is_available():
+                self.compile_text_model()
                 
         except Exception as e:
-            self.logger.error(f"Error initializing local models: {e}")
+            self.logger.error("Error initializing local models: %s", e)
+
+    def compile_text_model(self):
+        """Compile the text model's forward pass and warm it up for each length bucket"""
+        model = self.models["text"]
+        eager_forward = model.forward
+        
+        # Compile forward rather than the module so generate() and PEFT methods keep working.
+        # Default mode, not reduce-overhead: generate() grows a dynamic KV cache, and CUDA graphs
+        # would record a new graph for every decode length
+        model.forward = torch.compile(eager_forward, fullgraph=False, dynamic=True)
+        
+        try:
+            pad_id = self.tokenizers["text"].pad_token_id or self.tokenizers["text"].eos_token_id
+            with torch.inference_mode():
+                for bucket in LOCAL_LENGTH_BUCKETS:
+                    model(input_ids=torch.full((1, bucket), pad_id, dtype=torch.long, device=model.device))
+        except Exception as e:
+            self.logger.warning("torch.compile warmup failed, using eager mode: %s", e)
+            model.forward = eager_forward
 
-    async def initialize_multimodal_processors(self):
-        """Initialize multimodal processors"""
+    async def get_multimodal_model(self, name: str):
+        """Return the whisper/blip/translator model, loading it on first use"""
+        if name not in self.models:
+            # Concurrent first calls wait for a single load instead of each starting one
+            async with self._model_locks[name]:
+                if name not in self.models:
+                    await asyncio.to_thread(getattr(self, f"load_{name}"))
+        return self.models.get(name)
+
+    def load_whisper(self):
+        """Load the Whisper speech-to-text model"""
         try:
-            # Speech-to-text (Whisper)
+            dtype, attention = _inference_precision()
             self.processors["whisper"] = WhisperProcessor.from_pretrained("openai/whisper-large-v2")
-            self.models["whisper"] = WhisperForConditionalGeneration.from_pretrained("openai/whisper-large-v2")
-            
-            # Image analysis (BLIP)
+            self.models["whisper"] = WhisperForConditionalGeneration.from_pretrained(
+                "openai/whisper-large-v2",
+                torch_dtype=dtype,
+                **attention
+            ).to("cuda" if torch.cuda.is_available() else "cpu")
+        except Exception as e:
+            self.logger.error("Error loading Whisper: %s", e)
+
+    def load_blip(self):
+        """Load the BLIP image captioning model"""
+        try:
+            # BLIP has no FlashAttention/SDPA integration, so only the dtype changes
+            dtype, _ = _inference_precision()
             self.processors["blip"] = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-            self.models["blip"] = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-            
-            # Translation pipeline
+            self.models["blip"] = BlipForConditionalGeneration.from_pretrained(
+                "Salesforce/blip-image-captioning-base",
+                torch_dtype=dtype
+            ).to("cuda" if torch.cuda.is_available() else "cpu")
+        except Exception as e:
+            self.logger.error("Error loading BLIP: %s", e)
+
+    def load_translator(self):
+        """Load the translation pipeline"""
+        try:
             self.models["translator"] = pipeline("translation", model="Helsinki-NLP/opus-mt-en-mul")
-            
         except Exception as e:
-            self.logger.error(f"Error initializing multimodal processors: {e}")
+            self.logger.error("Error loading translator: %s", e)
 
     def setup_langgraph_workflow(self):
         """Setup LangGraph workflow for intelligent routing"""
@@ -281,23 +568,8 @@ class MultimodalAIAgent:
             if state.messages:
                 last_message = state.messages[-1].content
                 
-                # Detect language
-                try:
-                    state.detected_language = detect(last_message)
-                except:
-                    state.detected_language = "en"
-                
-                # Determine task type based on content
-                if "image" in last_message.lower() or "picture" in last_message.lower():
-                    state.current_task = TaskType.IMAGE_ANALYSIS
-                elif "translate" in last_message.lower():
-                    state.current_task = TaskType.TRANSLATION
-                elif "summarize" in last_message.lower():
-                    state.current_task = TaskType.SUMMARIZATION
-                elif "code" in last_message.lower() or "program" in last_message.lower():
-                    state.current_task = TaskType.CODE_GENERATION
-                else:
-                    state.current_task = TaskType.TEXT_GENERATION
+                # Detect language and task type, reusing results for repeated messages
+                state.current_task, state.detected_language = _classify(last_message)
                     
             return state
 
@@ -311,15 +583,19 @@ class MultimodalAIAgent:
             state.routing_decision = routing_decision
             return state
 
-        def execute_task(state: AgentState) -> AgentState:
+        async def execute_task(state: AgentState) -> AgentState:
             """Execute the task using selected model"""
             try:
-                result = asyncio.run(self.execute_with_model(
+                # Async node: runs on the caller's loop instead of a fresh loop per turn
+                result = await self.execute_with_model(
                     state.routing_decision["model"],
                     state.routing_decision["provider"],
-                    state.messages[-1].content if state.messages else "",
+                    _with_history(
+                        state.messages[-1].content if state.messages else "",
+                        (state.context or {}).get("history")
+                    ),
                     state.current_task
-                ))
+                )
                 
                 state.final_response = result["response"]
                 state.confidence_score = result["confidence"]
@@ -355,83 +631,366 @@ class MultimodalAIAgent:
     def intelligent_model_routing(self, task_type: TaskType, language: str, content: str) -> Dict:
         """Intelligent model routing based on task, language, and content"""
         
-        routing_scores = {}
-        
         # Score models based on task type
-        if task_type == TaskType.CODE_GENERATION:
-            routing_scores = {
-                "gpt-4": 0.9,
-                "claude-3-opus": 0.85,
-                "mistral-7b-instruct": 0.7,
-                "codellama": 0.95
-            }
-        elif task_type == TaskType.TRANSLATION:
-            routing_scores = {
-                "gpt-4": 0.8,
-                "gemini-pro": 0.85,
-                "opus-mt": 0.9
-            }
-        elif task_type == TaskType.IMAGE_ANALYSIS:
-            routing_scores = {
-                "gpt-4-vision": 0.95,
-                "gemini-pro-vision": 0.9,
-                "blip": 0.7
-            }
-        else:
-            routing_scores = {
-                "gpt-4": 0.9,
-                "claude-3-opus": 0.85,
-                "gemini-pro": 0.8,
-                "mistral-7b-instruct": 0.75
-            }
+        scores = _TASK_SCORE_TABLE.get(task_type, _TASK_SCORE_TABLE[None])
         
         # Adjust scores based on language
         if language != "en":
-            routing_scores["gemini-pro"] = routing_scores.get("gemini-pro", 0) + 0.1
-            routing_scores["gpt-4"] = routing_scores.get("gpt-4", 0) + 0.05
+            scores = scores + _LANGUAGE_BONUS
         
         # Adjust scores based on content complexity
         complexity_score = len(content.split()) / 100  # Simple complexity measure
         if complexity_score > 1:
-            routing_scores["gpt-4"] = routing_scores.get("gpt-4", 0) + 0.1
-            routing_scores["claude-3-opus"] = routing_scores.get("claude-3-opus", 0) + 0.1
+            scores = scores + _COMPLEXITY_BONUS
         
         # Select best model
-        best_model = max(routing_scores.items(), key=lambda x: x[1])
-        
-        # Determine provider
-        provider_map = {
-            "gpt-4": ModelProvider.OPENAI,
-            "gpt-4-vision": ModelProvider.OPENAI,
-            "claude-3-opus": ModelProvider.ANTHROPIC,
-            "gemini-pro": ModelProvider.GOOGLE,
-            "gemini-pro-vision": ModelProvider.GOOGLE,
-            "mistral-7b-instruct": ModelProvider.LOCAL,
-            "codellama": ModelProvider.HUGGINGFACE,
-            "blip": ModelProvider.LOCAL,
-            "opus-mt": ModelProvider.LOCAL
+        idx = int(scores.argmax())
+        model = _MODEL_NAMES[idx]
+        confidence = float(scores[idx])
+        
+        return {
+            "model": model,
+            "provider": _PROVIDER_LUT[idx],
+            "confidence": confidence,
+            "reasoning": f"Selected {model} for {task_type.value} with confidence {confidence}"
         }
+
+    async def execute_with_model(self, model: str, provider: ModelProvider, content: str,
+                                 task_type: Optional[TaskType]) -> Dict:
+        """Run content on the routed model and return the response with usage metadata"""
+        start_time = time.time()
+        usage = {"tokens_used": 0}
+        parts = [piece async for piece in self.stream_with_model(model, provider, content, usage)]
         
         return {
-            "model": best_model[0],
-            "provider": provider_map.get(best_model[0], ModelProvider.LOCAL),
-            "confidence": best_model[1],
-            "reasoning": f"Selected {best_model[0]} for {task_type.value} with confidence {best_model[1]}"
+            "response": "".join(parts),
+            "confidence": 1.0,
+            "execution_time": time.time() - start_time,
+            "tokens_used": usage["tokens_used"],
+            "cost": 0.0
         }
 
-    async def process_text_input(self, text: str) -> str:
-        """Process text input through the LangGraph workflow"""
+    async def stream_with_model(self, model: str, provider: ModelProvider, content: str,
+                                usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Yield response text from the routed model as the provider streams it"""
+        if usage is None:
+            usage = {}
+        usage["tokens_used"] = 0
+        
+        if provider == ModelProvider.LOCAL:
+            if model == "opus-mt" and await self.get_multimodal_model("translator") is not None:
+                output = await asyncio.to_thread(self.models["translator"], content)
+                yield output[0]["translation_text"]
+            else:
+                response, usage["tokens_used"] = await self.generate_local(content)
+                yield response
+        
+        elif provider == ModelProvider.OPENAI and self.openai_client:
+            stream = await self.openai_client.chat.completions.create(
+                model=API_MODEL_IDS[model],
+                messages=[{"role": "user", "content": content}],
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                if chunk.usage:
+                    usage["tokens_used"] = chunk.usage.total_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        
+        elif provider == ModelProvider.ANTHROPIC and self.anthropic_client:
+            stream = await self.anthropic_client.messages.create(
+                model=API_MODEL_IDS[model],
+                max_tokens=1024,
+                messages=[{"role": "user", "content": content}],
+                stream=True
+            )
+            async for event in stream:
+                if event.type == "content_block_delta" and event.delta.type == "text_delta":
+                    yield event.delta.text
+                elif event.type == "message_start":
+                    usage["tokens_used"] += event.message.usage.input_tokens
+                elif event.type == "message_delta":
+                    usage["tokens_used"] += event.usage.output_tokens
+        
+        elif provider == ModelProvider.GOOGLE and self.gemini_client:
+            gemini_model = self.gemini_client.GenerativeModel(API_MODEL_IDS[model])
+            stream = await gemini_model.generate_content_async(content, stream=True)
+            async for chunk in stream:
+                yield chunk.text
+        
+        elif provider == ModelProvider.HUGGINGFACE and self.hf_client:
+            stream = await self.hf_client.text_generation(
+                content,
+                model=API_MODEL_IDS[model],
+                max_new_tokens=LOCAL_MAX_NEW_TOKENS,
+                stream=True
+            )
+            async for token in stream:
+                usage["tokens_used"] += 1
+                yield token
+        
+        else:
+            raise RuntimeError(f"No client configured for {provider.value} model {model}")
+
+    async def stream_text_input(self, text: str, history: Optional[str] = None) -> AsyncIterator[str]:
+        """Route text like process_text_input but yield the response as it streams"""
+        task_type, language = _classify(text)
+        routing_decision = self.intelligent_model_routing(task_type, language, text)
+        
+        parts = []
+        prompt = _with_history(text, history)
+        async for piece in self.stream_with_model(routing_decision["model"], routing_decision["provider"], prompt):
+            parts.append(piece)
+            yield piece
+        
+        self.conversation_memory.append(ConvTurn(text, "".join(parts), time.time_ns(), routing_decision["model"]))
+
+    async def generate_local(self, prompt: str) -> Tuple[str, int]:
+        """Queue a prompt for the local model and wait for its batched result"""
+        if "text" not in self.models:
+            raise RuntimeError("Local text model is not loaded")
+        
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_q = asyncio.Queue()
+            self._batch_task = asyncio.create_task(self._batch_worker())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._batch_q.put((prompt, future))
+        return await future
+
+    async def _batch_worker(self):
+        """Drain queued prompts into batches and run one generate() per batch"""
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self._batch_q.get()]
+                deadline = loop.time() + LOCAL_BATCH_WAIT_MS / 1000
+                
+                while len(batch) < LOCAL_BATCH_SIZE:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._batch_q.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                
+                try:
+                    results = await asyncio.to_thread(self._generate_batch, [prompt for prompt, _ in batch])
+                except Exception as e:
+                    self.logger.error("Local batch generation failed: %s", e)
+                    results = [e] * len(batch)
+                
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                batch = []
+        except asyncio.CancelledError:
+            # Don't leave callers of a batch already taken off the queue waiting forever
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Agent is shutting down"))
+            raise
+
+    def _generate_batch(self, prompts: List[str]) -> List[Tuple[str, int]]:
+        """Generate completions for a padded batch of prompts in one forward pass"""
+        tokenizer = self.tokenizers["text"]
+        model = self.models["text"]
+        
+        # Decoder-only models need left padding so every prompt ends where generation starts
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        
+        texts = [
+            tokenizer.apply_chat_template([{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True)
+            for prompt in prompts
+        ]
+        encodings = tokenizer(texts)
+        longest = max(len(ids) for ids in encodings["input_ids"])
+        bucket = next((size for size in LOCAL_LENGTH_BUCKETS if size >= longest), None)
+        if bucket is None:
+            inputs = tokenizer.pad(encodings, padding=True, return_tensors="pt")
+        else:
+            inputs = tokenizer.pad(encodings, padding="max_length", max_length=bucket, return_tensors="pt")
+        inputs = inputs.to(model.device)
+        
+        with torch.inference_mode():
+            output_ids = model.generate(
+                **inputs,
+                max_new_tokens=LOCAL_MAX_NEW_TOKENS,
+                num_return_sequences=1,
+                pad_token_id=tokenizer.pad_token_id
+            )
+        
+        new_tokens = output_ids[:, inputs["input_ids"].shape[1]:]
+        responses = tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        counts = (new_tokens != tokenizer.pad_token_id).sum(dim=1).tolist()
+        return list(zip(responses, counts))
+
+    def cached_encoding(self, key: str, encode) -> torch.Tensor:
+        """Return a cached encoder output, computing and storing it on a miss"""
+        if key in self._mm_embed_cache:
+            self._mm_embed_cache.move_to_end(key)
+            return self._mm_embed_cache[key]
+        
+        embeds = encode().detach()
+        self._mm_embed_cache[key] = embeds
+        if len(self._mm_embed_cache) > self.mm_cache_size:
+            self._mm_embed_cache.popitem(last=False)
+        return embeds
+
+    def encode_image(self, image_bytes: bytes) -> torch.Tensor:
+        """BLIP vision embeddings for an image, cached by content hash"""
+        def encode():
+            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            pixel_values = self.processors["blip"](images=image, return_tensors="pt").pixel_values
+            pixel_values = pixel_values.to(self.models["blip"].device, self.models["blip"].dtype)
+            with torch.inference_mode():
+                return self.models["blip"].vision_model(pixel_values=pixel_values)[0]
+        
+        return self.cached_encoding("blip:" + _media_key(image_bytes), encode)
+
+    def encode_audio(self, audio_bytes: bytes) -> torch.Tensor:
+        """Whisper encoder states for an audio clip, cached by content hash"""
+        def encode():
+            import librosa
+            waveform, _ = librosa.load(io.BytesIO(audio_bytes), sr=16000)
+            features = self.processors["whisper"](waveform, sampling_rate=16000, return_tensors="pt").input_features
+            features = features.to(self.models["whisper"].device, self.models["whisper"].dtype)
+            with torch.inference_mode():
+                return self.models["whisper"].get_encoder()(features).last_hidden_state
+        
+        return self.cached_encoding("whisper:" + _media_key(audio_bytes), encode)
+
+    async def caption_image(self, image_bytes: bytes, prompt: Optional[str] = None) -> str:
+        """Caption an image with BLIP, reusing cached vision embeddings for repeated images"""
+        def caption():
+            model = self.models["blip"]
+            processor = self.processors["blip"]
+            image_embeds = self.encode_image(image_bytes)
+            
+            # Mirrors BlipForConditionalGeneration.generate, starting from precomputed embeddings
+            if prompt:
+                input_ids = processor(text=prompt, return_tensors="pt").input_ids.to(model.device)
+            else:
+                input_ids = torch.LongTensor([[model.decoder_input_ids, model.config.text_config.eos_token_id]]).to(model.device)
+            input_ids[:, 0] = model.config.text_config.bos_token_id
+            image_attention_mask = torch.ones(image_embeds.shape[:-1], dtype=torch.long, device=model.device)
+            
+            with torch.inference_mode():
+                output_ids = model.text_decoder.generate(
+                    input_ids=input_ids[:, :-1],
+                    eos_token_id=model.config.text_config.sep_token_id,
+                    pad_token_id=model.config.text_config.pad_token_id,
+                    encoder_hidden_states=image_embeds,
+                    encoder_attention_mask=image_attention_mask
+                )
+            return processor.decode(output_ids[0], skip_special_tokens=True)
+        
+        await self.get_multimodal_model("blip")
+        return await asyncio.to_thread(caption)
+
+    async def transcribe_audio(self, audio_bytes: bytes) -> str:
+        """Transcribe audio with Whisper, reusing cached encoder states for repeated clips"""
+        from transformers.modeling_outputs import BaseModelOutput
+        
+        def transcribe():
+            encoder_states = self.encode_audio(audio_bytes)
+            with torch.inference_mode():
+                output_ids = self.models["whisper"].generate(
+                    encoder_outputs=BaseModelOutput(last_hidden_state=encoder_states)
+                )
+            return self.processors["whisper"].batch_decode(output_ids, skip_special_tokens=True)[0]
+        
+        await self.get_multimodal_model("whisper")
+        return await asyncio.to_thread(transcribe)
+
+    async def process_multimodal_input(self, input_data: Dict) -> str:
+        """Handle a speech or image request: transcribe or caption the media in
+        input_data["data"], then answer through the text workflow"""
+        input_type = input_data.get("type")
+        media = input_data.get("data")
+        if not media:
+            return f"Error: no {input_type} data provided"
+        
+        model_name = "whisper" if input_type == "speech" else "blip"
+        if await self.get_multimodal_model(model_name) is None:
+            return f"Error: {model_name} model is not available"
+        
+        if input_type == "speech":
+            return await self.process_text_input(await self.transcribe_audio(media))
+        
+        caption = await self.caption_image(media)
+        question = input_data.get("text")
+        if not question:
+            return caption
+        return await self.process_text_input(f"Image description: {caption}\n\n{question}")
+
+    async def embed_for_cache(self, text: str) -> Optional[np.ndarray]:
+        """Embed text for the semantic cache, or return None when no encoder is loaded"""
+        if self.sem_encoder is None:
+            return None
+        return await asyncio.to_thread(self.sem_encoder.encode, text, normalize_embeddings=True)
+
+    def lookup_semantic_cache(self, embedding: np.ndarray) -> Optional[str]:
+        """Return a cached response for a semantically similar prompt"""
+        if not self._sem_cache:
+            return None
+        
+        # Rows are filled in order and reused on eviction, so the first len(cache) rows are live
+        scores = self._sem_embs[:len(self._sem_cache)] @ embedding
+        best = int(scores.argmax())
+        if scores[best] < SEMANTIC_CACHE_THRESHOLD:
+            return None
+        
+        self._sem_cache.move_to_end(best)
+        return self._sem_cache[best]
+
+    def store_semantic_cache(self, embedding: np.ndarray, response: str):
+        """Cache a response, evicting the least recently used entry when full"""
+        if self._sem_embs is None:
+            self._sem_embs = np.zeros((self.sem_cache_size, embedding.shape[0]), dtype=np.float32)
+        
+        if len(self._sem_cache) < self.sem_cache_size:
+            row = len(self._sem_cache)
+        else:
+            row, _ = self._sem_cache.popitem(last=False)
+        
+        self._sem_embs[row] = embedding
+        self._sem_cache[row] = response
+
+    async def process_text_input(self, text: str, use_cache: bool = True, history: Optional[str] = None) -> str:
+        """Process text input through the LangGraph workflow, with an optional summary of earlier turns"""
+        
+        # A reply that depends on earlier turns can't be reused for the bare prompt
+        embedding = await self.embed_for_cache(text) if use_cache and not history else None
+        if embedding is not None:
+            cached_response = self.lookup_semantic_cache(embedding)
+            if cached_response is not None:
+                self.logger.debug("Semantic cache hit")
+                self.conversation_memory.append(ConvTurn(text, cached_response, time.time_ns(), "semantic_cache"))
+                return cached_response
         
         # Create initial state
         initial_state = AgentState(
             messages=[HumanMessage(content=text)],
             user_preferences=self.user_preferences,
-            context={"custom_instructions": self.custom_instructions}
+            context={"custom_instructions": self.custom_instructions, "history": history}
         )
         
         # Execute workflow
         result = await self.workflow.ainvoke(initial_state)
         
+        if embedding is not None and result.final_response and not result.final_response.startswith("Error"):
+            self.store_semantic_cache(embedding, result.final_response)
+        
         # Log the interaction
         self.log_interaction(
             input_data={"text": text, "type": "text"},
@@ -439,12 +998,12 @@ class MultimodalAIAgent:
         )
         
         # Update conversation memory
-        self.conversation_memory.append({
-            "user": text,
-            "assistant": result.final_response,
-            "timestamp": datetime.now().isoformat(),
-            "model_used": result.routing_decision.get("model", "unknown") if result.routing_decision else "unknown"
-        })
+        self.conversation_memory.append(ConvTurn(
+            text,
+            result.final_response,
+            time.time_ns(),
+            result.routing_decision.get("model", "unknown") if result.routing_decision else "unknown"
+        ))
         
         return result.final_response
 
@@ -467,12 +1026,93 @@ class MultimodalAIAgent:
         
         self.session_logs.append(log_entry)
         
-        # Save to JSON file
+        # Build the record by hand; asdict() deep-copies every field
+        record = {
+            "timestamp": log_entry.timestamp.isoformat(),
+            "session_id": log_entry.session_id,
+            "task_type": log_entry.task_type.value,
+            "input_data": log_entry.input_data,
+            "routing_decision": log_entry.routing_decision,
+            "model_used": log_entry.model_used,
+            "output": log_entry.output,
+            "confidence": log_entry.confidence,
+            "execution_time": log_entry.execution_time,
+            "tokens_used": log_entry.tokens_used,
+            "cost": log_entry.cost,
+            "success": log_entry.success,
+            "error": log_entry.error
+        }
+        
+        # Hand the record to the background writer
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.write_log_records([record])
+            return
+        
+        if self._log_task is None or self._log_task.done():
+            self._log_q = asyncio.Queue()
+            self._log_task = asyncio.create_task(self._log_writer())
+        self._log_q.put_nowait(record)
+
+    def write_log_records(self, records: List[Dict]):
+        """Append records to the JSON log synchronously"""
         try:
-            with open(self.config["logging"]["json_logs"], "a") as f:
-                f.write(json.dumps(asdict(log_entry), default=str) + "\n")
+            with open(self.config["logging"]["json_logs"], "ab") as f:
+                for record in records:
+                    f.write(_dumps_log(record))
         except Exception as e:
-            self.logger.error(f"Error saving log: {e}")
+            self.logger.error("Error saving log: %s", e)
+
+    async def _log_writer(self):
+        """Write queued log records through one buffered file, flushing every 64 records or 100ms"""
+        loop = asyncio.get_running_loop()
+        try:
+            log_file = open(self.config["logging"]["json_logs"], "ab", buffering=1 << 20)
+        except OSError as e:
+            self.logger.error("Error opening JSON log: %s", e)
+            return
+        
+        records = []
+        with log_file:
+            try:
+                while True:
+                    records = [await self._log_q.get()]
+                    deadline = loop.time() + LOG_FLUSH_INTERVAL
+                    
+                    while len(records) < LOG_FLUSH_EVERY:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            records.append(await asyncio.wait_for(self._log_q.get(), timeout))
+                        except asyncio.TimeoutError:
+                            break
+                    
+                    try:
+                        for record in records:
+                            log_file.write(_dumps_log(record))
+                        log_file.flush()
+                    except Exception as e:
+                        self.logger.error("Error saving log: %s", e)
+                    records = []
+            except asyncio.CancelledError:
+                # Keep the records already taken off the queue when shut down mid-batch
+                for record in records:
+                    log_file.write(_dumps_log(record))
+                raise
+
+    def export_conversation(self) -> List[Dict]:
+        """Return the conversation window as JSON-ready dicts"""
+        return [
+            {
+                "user": turn.user,
+                "assistant": turn.assistant,
+                "timestamp": datetime.fromtimestamp(turn.ts_ns / 1e9).isoformat(),
+                "model_used": turn.model
+            }
+            for turn in self.conversation_memory
+        ]
 
     def get_session_stats(self) -> Dict:
         """Get session statistics"""
@@ -495,4 +1135,34 @@ class MultimodalAIAgent:
             "average_confidence": avg_confidence,
             "model_usage": model_usage,
             "conversation_length": len(self.conversation_memory)
-        }
\ No newline at end of file
+        }
+
+    async def aclose(self):
+        """Stop the background workers, flush pending log records and close the HTTP pool"""
+        for task in (self._batch_task, self._log_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._batch_task = self._log_task = None
+        
+        # Prompts still queued for the local model will never be generated now
+        if self._batch_q is not None:
+            while not self._batch_q.empty():
+                _, future = self._batch_q.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("Agent is shutting down"))
+        
+        if self._log_q is not None:
+            records = []
+            while not self._log_q.empty():
+                records.append(self._log_q.get_nowait())
+            if records:
+                self.write_log_records(records)
+            self._log_q = None
+        
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
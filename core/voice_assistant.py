@@ -3,126 +3,405 @@ import asyncio
 import speech_recognition as sr
 from gtts import gTTS
 import pygame
+import numpy as np
+import inspect
 import io
-import tempfile
+import json
 import os
 import logging
-from typing import Optional, Dict, Callable
+import re
+from typing import Awaitable, Optional, Dict, Callable, List, Union
 import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 import queue
 import time
+from collections import deque
 from datetime import datetime
 
+try:
+    from piper import PiperVoice
+except ImportError:
+    PiperVoice = None
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+# Internal helpers used only for batched decoding; without them each clip is transcribed alone
+try:
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+    from faster_whisper.transcribe import get_ctranslate2_storage
+except ImportError:
+    pad_or_trim = None
+
+try:
+    from openwakeword.model import Model as WakeWordModel
+except ImportError:
+    WakeWordModel = None
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+# Local neural TTS voice; speak() falls back to gTTS when piper or the voice file is missing
+PIPER_VOICE_PATH = os.getenv("PIPER_VOICE_PATH", "models/piper/en_US-lessac-medium.onnx")
+# Playback format; mono int16 at the voice's rate so Piper PCM plays without resampling or upmixing
+TTS_SAMPLE_RATE = 22050
+MIXER_BUFFER = 512
+
+# Local speech-to-text; INT8 weights keep CPU inference fast and small
+STT_MODEL = "base"
+STT_COMPUTE_TYPE = "int8"
+# Recognition requests arriving within this window share one decode
+STT_BATCH_WINDOW = 0.02
+STT_MAX_BATCH = 8
+
+# openWakeWord ONNX model for the wake word; without it wake words are found by transcribing each chunk
+WAKE_WORD_MODEL_PATH = os.getenv("WAKE_WORD_MODEL_PATH", "models/openwakeword/hey_assistant.onnx")
+WAKE_WORD_THRESHOLD = 0.5
+
+# Commands are streamed to the recognizer in 250 ms frames while the user is still speaking
+SAMPLE_RATE = 16000
+COMMAND_FRAME_SAMPLES = 4000
+COMMAND_TIMEOUT = 5
+COMMAND_PHRASE_LIMIT = 10
+PARTIAL_TRANSCRIPT_INTERVAL = 0.5
+# webrtcvad accepts 10/20/30 ms frames
+VAD_FRAME_SAMPLES = 480
+VAD_AGGRESSIVENESS = 2
+
+# Ambient noise calibration: speech must be this much louder than the room's RMS energy
+CALIBRATION_SECONDS = 2
+ENERGY_THRESHOLD_RATIO = 1.5
+
+# Voice conversation turns kept by VoiceCommandProcessor; older turns are dropped
+VOICE_HISTORY_LIMIT = 200
+
+# Poll interval for the tail of playback after the clip's duration has elapsed
+PLAYBACK_DRAIN_POLL = 0.005
+
+def _audio_to_pcm16(audio: sr.AudioData) -> np.ndarray:
+    """16 kHz int16 samples straight from the raw buffer, skipping the WAV/FLAC encoders"""
+    return np.frombuffer(audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2), np.int16)
+
+def _audio_to_np(audio: sr.AudioData) -> np.ndarray:
+    """16 kHz float32 samples in [-1, 1) as Whisper expects"""
+    return _audio_to_pcm16(audio).astype(np.float32) * (1.0 / 32768)
+
+class BatchedSTT:
+    """Shared faster-whisper model that decodes concurrent requests as one batch"""
+    
+    _instances: Dict[str, "BatchedSTT"] = {}
+    _instances_lock = threading.Lock()
+    
+    def __init__(self, model_name: str):
+        self.model = WhisperModel(model_name, device="cpu", compute_type=STT_COMPUTE_TYPE)
+        self._requests: queue.Queue = queue.Queue()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    @classmethod
+    def get(cls, model_name: str) -> "BatchedSTT":
+        """One instance per checkpoint, shared by every VoiceAssistant"""
+        with cls._instances_lock:
+            if model_name not in cls._instances:
+                cls._instances[model_name] = cls(model_name)
+            return cls._instances[model_name]
+
+    def transcribe(self, samples: np.ndarray, language: str) -> str:
+        """Transcribe 16 kHz float32 samples, blocking until the batch containing them is decoded"""
+        future = Future()
+        self._requests.put((samples, language, future))
+        return future.result()
+
+    def _worker(self):
+        """Collect requests for up to STT_BATCH_WINDOW and decode them together"""
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + STT_BATCH_WINDOW
+            while len(batch) < STT_MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            # The decoder prompt carries the language, so each language is its own batch
+            for language in {language for _, language, _ in batch}:
+                group = [item for item in batch if item[1] == language]
+                try:
+                    texts = self._transcribe_group([samples for samples, _, _ in group], language)
+                except Exception as e:
+                    for _, _, future in group:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), text in zip(group, texts):
+                    future.set_result(text)
+
+    def _transcribe_group(self, clips: List[np.ndarray], language: str) -> List[str]:
+        """Decode clips of the same language"""
+        if len(clips) == 1 or pad_or_trim is None:
+            # A lone request, or a faster-whisper without the batching helpers, takes the regular path
+            return [self._transcribe_one(clip, language) for clip in clips]
+        
+        # Whisper always decodes a padded 30 s window, so short commands stack into one batch
+        features = np.stack([pad_or_trim(self.model.feature_extractor(clip)) for clip in clips])
+        tokenizer = Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual,
+                              task="transcribe", language=language)
+        prompt = list(tokenizer.sot_sequence) + [tokenizer.no_timestamps]
+        results = self.model.model.generate(
+            get_ctranslate2_storage(features),
+            [prompt] * len(clips),
+            beam_size=1
+        )
+        return [
+            tokenizer.decode([token for token in result.sequences_ids[0] if token < tokenizer.eot]).strip()
+            for result in results
+        ]
+
+    def _transcribe_one(self, clip: np.ndarray, language: str) -> str:
+        segments, _ = self.model.transcribe(clip, language=language, beam_size=1, vad_filter=True)
+        return "".join(segment.text for segment in segments).strip()
+
 class VoiceAssistant:
     def __init__(self, 
                  wake_word: str = "hey assistant",
                  language: str = "en",
                  voice_speed: float = 1.0,
-                 voice_volume: float = 0.8):
+                 voice_volume: float = 0.8,
+                 tts_voice_path: str = PIPER_VOICE_PATH,
+                 wake_word_model_path: str = WAKE_WORD_MODEL_PATH):
         
         self.wake_word = wake_word.lower()
+        self._wake_re = re.compile(re.escape(self.wake_word))
         self.language = language
         self.voice_speed = voice_speed
         self.voice_volume = voice_volume
+        self.tts_voice_path = tts_voice_path
+        self._tts_voice = None
+        self._tts_loaded = False
         
         # Initialize speech recognition
         self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
+        self.microphone = sr.Microphone(sample_rate=SAMPLE_RATE)
+        self._vad = webrtcvad.Vad(VAD_AGGRESSIVENESS) if webrtcvad else None
         
-        # Initialize pygame for audio playback
+        # Initialize pygame for audio playback in the TTS voice's native format
+        pygame.mixer.pre_init(frequency=self._tts_sample_rate(), size=-16, channels=1, buffer=MIXER_BUFFER)
         pygame.mixer.init()
         
         # Voice assistant state
         self.is_listening = False
         self.is_active = False
-        self.audio_queue = queue.Queue()
+        self.audio_queue: asyncio.Queue = asyncio.Queue()
         self.response_callback: Optional[Callable] = None
+        self._speech_tasks = set()
+        self.transcript_callback: Optional[Callable[[str, str], None]] = None
+        self._command_pending = False
+        self._ack_task: Optional[asyncio.Task] = None
+        self._command_buffer = bytearray()
+        self._last_partial = 0.0
         
         # Logging
         self.logger = logging.getLogger("VoiceAssistant")
         
+        # Local speech-to-text and wake word models
+        self._stt = self._load_stt()
+        self._wake_model = self._load_wake_model(wake_word_model_path)
+        
+        # Stats fields that only change with the microphone
+        self._mic_desc = str(self.microphone)
+        self._static_stats = self._build_static_stats()
+        
         # Calibrate microphone
         self.calibrate_microphone()
 
+    def _load_stt(self):
+        """Load faster-whisper for local recognition; None falls back to Google STT"""
+        if WhisperModel is None:
+            return None
+        try:
+            # English-only checkpoints are smaller and more accurate for English
+            model_name = f"{STT_MODEL}.en" if self.language == "en" else STT_MODEL
+            return BatchedSTT.get(model_name)
+        except Exception as e:
+            self.logger.error("Failed to load faster-whisper: %s", e)
+            return None
+
+    def _load_wake_model(self, model_path: str):
+        """Load the openWakeWord classifier, or None to detect wake words through STT"""
+        if WakeWordModel is None or not os.path.exists(model_path):
+            return None
+        try:
+            return WakeWordModel(wakeword_models=[model_path], inference_framework="onnx")
+        except Exception as e:
+            self.logger.error("Failed to load wake word model: %s", e)
+            return None
+
+    def _recognize(self, audio: sr.AudioData) -> str:
+        """Transcribe audio locally, raising sr.UnknownValueError when nothing was said"""
+        if self._stt is None:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        
+        text = self._stt.transcribe(_audio_to_np(audio), self.language)
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+    @contextmanager
+    def _microphone_source(self):
+        """Yield the microphone, reusing the listening thread's open stream when there is one"""
+        if self.microphone.stream is not None:
+            yield self.microphone
+        else:
+            with self.microphone as source:
+                yield source
+
     def calibrate_microphone(self):
         """Calibrate microphone for ambient noise"""
         try:
-            with self.microphone as source:
+            with self._microphone_source() as source:
                 self.logger.info("Calibrating microphone for ambient noise...")
-                self.recognizer.adjust_for_ambient_noise(source, duration=2)
+                
+                # Capture the ambient audio first, then take its RMS in one vectorized pass
+                buffer = bytearray()
+                for _ in range(int(CALIBRATION_SECONDS * source.SAMPLE_RATE / source.CHUNK)):
+                    buffer.extend(source.stream.read(source.CHUNK))
+                samples = np.frombuffer(buffer, dtype=np.int16).astype(np.float32)
+                rms = float(np.sqrt(np.mean(samples * samples)))
+                self.recognizer.energy_threshold = rms * ENERGY_THRESHOLD_RATIO
+                
                 self.logger.info("Microphone calibrated successfully")
         except Exception as e:
-            self.logger.error(f"Microphone calibration failed: {e}")
+            self.logger.error("Microphone calibration failed: %s", e)
 
     def set_response_callback(self, callback: Callable[[str], str]):
         """Set callback function to handle voice commands"""
         self.response_callback = callback
 
+    def set_transcript_callback(self, callback: Callable[[str, str], None]):
+        """Set callback receiving ("partial" | "final", text) while a command is transcribed"""
+        self.transcript_callback = callback
+
     async def start_listening(self):
         """Start continuous listening for wake word and commands"""
         self.is_active = True
-        self.logger.info(f"Voice assistant started. Wake word: '{self.wake_word}'")
+        self.audio_queue = asyncio.Queue()
+        self.logger.info("Voice assistant started. Wake word: '%s'", self.wake_word)
         
-        # Start listening thread
-        listen_thread = threading.Thread(target=self._continuous_listen, daemon=True)
-        listen_thread.start()
+        # Producer reads the microphone, consumer runs wake word detection and STT
+        listen_task = asyncio.create_task(self._continuous_listen())
+        audio_task = asyncio.create_task(self._process_audio_queue())
         
-        # Start audio processing thread
-        audio_thread = threading.Thread(target=self._process_audio_queue, daemon=True)
-        audio_thread.start()
+        # Load and exercise the local models now so the first utterance doesn't pay for it
+        self._warmup_task = asyncio.create_task(asyncio.to_thread(self._warmup))
         
-        return listen_thread, audio_thread
+        return listen_task, audio_task
+
+    def _warmup(self):
+        """Run each local model once on a dummy input"""
+        silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        try:
+            if self._stt is not None:
+                # Straight to the model: the VAD filter would skip decoding pure silence
+                segments, _ = self._stt.model.transcribe(silence, language=self.language, beam_size=1)
+                list(segments)
+            if self._wake_model is not None:
+                self._wake_model.predict_clip(np.zeros(SAMPLE_RATE, dtype=np.int16))
+                self._wake_model.reset()
+            if self.tts_voice is not None:
+                self._synthesize_pcm("warmup")
+            self.logger.info("Voice models warmed up")
+        except Exception as e:
+            self.logger.warning("Voice model warmup failed: %s", e)
 
     def stop_listening(self):
         """Stop voice assistant"""
         self.is_active = False
         self.is_listening = False
+        # Wake the audio consumer now rather than leaving it parked in get()
+        self.audio_queue.put_nowait(None)
         self.logger.info("Voice assistant stopped")
 
-    def _continuous_listen(self):
+    async def _continuous_listen(self):
         """Continuously listen for wake word and commands"""
         while self.is_active:
+            microphone = self.microphone
             try:
-                with self.microphone as source:
-                    # Listen for audio
-                    self.logger.debug("Listening for wake word...")
-                    audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=5)
-                    
-                    # Add to processing queue
-                    self.audio_queue.put(("wake_word_check", audio))
+                # Keep one PyAudio stream open for the session; reopen only when set_microphone swaps devices
+                with microphone as source:
+                    while self.is_active and self.microphone is microphone:
+                        # After a wake word the same stream records the command
+                        if self._command_pending:
+                            self._command_pending = False
+                            await self._listen_for_command(source)
+                            continue
+                        
+                        try:
+                            # Listen for audio; the blocking read runs off the event loop
+                            self.logger.debug("Listening for wake word...")
+                            audio = await asyncio.to_thread(self.recognizer.listen, source, 1, 5)
+                        except sr.WaitTimeoutError:
+                            # Timeout is normal, continue listening
+                            continue
+                        
+                        # Add to processing queue
+                        await self.audio_queue.put(("wake_word_check", audio))
                     
-            except sr.WaitTimeoutError:
-                # Timeout is normal, continue listening
-                continue
             except Exception as e:
-                self.logger.error(f"Listening error: {e}")
-                time.sleep(1)
+                self.logger.error("Listening error: %s", e)
+                await asyncio.sleep(1)
 
-    def _process_audio_queue(self):
+    async def _process_audio_queue(self):
         """Process audio from the queue"""
         while self.is_active:
+            item = await self.audio_queue.get()
+            if item is None:
+                # Sentinel from stop_listening
+                break
+            audio_type, audio = item
+            
             try:
-                if not self.audio_queue.empty():
-                    audio_type, audio = self.audio_queue.get(timeout=1)
+                if audio_type == "wake_word_check":
+                    await self._check_wake_word(audio)
+                elif audio_type == "command_chunk":
+                    await self._add_command_chunk(audio)
+                elif audio_type == "command_end":
+                    audio = sr.AudioData(bytes(self._command_buffer), SAMPLE_RATE, 2)
+                    self._command_buffer.clear()
+                    await self._process_command(audio)
                     
-                    if audio_type == "wake_word_check":
-                        self._check_wake_word(audio)
-                    elif audio_type == "command":
-                        self._process_command(audio)
-                        
-            except queue.Empty:
-                continue
             except Exception as e:
-                self.logger.error(f"Audio processing error: {e}")
+                self.logger.error("Audio processing error: %s", e)
+
+    def _score_wake_word(self, audio) -> float:
+        """Highest wake word classifier score over the clip"""
+        predictions = self._wake_model.predict_clip(_audio_to_pcm16(audio))
+        self._wake_model.reset()
+        return max((max(frame.values()) for frame in predictions), default=0.0)
 
-    def _check_wake_word(self, audio):
+    async def _check_wake_word(self, audio):
         """Check if audio contains wake word"""
+        if self._wake_model is not None:
+            # Score the raw audio with the wake word classifier; non-wake audio never reaches STT
+            score = await asyncio.to_thread(self._score_wake_word, audio)
+            
+            if score > WAKE_WORD_THRESHOLD:
+                self.logger.info("Wake word detected!")
+                self._handle_wake_word_detected()
+            return
+        
         try:
             # Use faster recognition for wake word detection
-            text = self.recognizer.recognize_google(audio, language=self.language).lower()
-            self.logger.debug(f"Heard: {text}")
+            text = (await asyncio.to_thread(self._recognize, audio)).lower()
+            self.logger.debug("Heard: %s", text)
             
-            if self.wake_word in text:
+            if self._wake_re.search(text):
                 self.logger.info("Wake word detected!")
                 self._handle_wake_word_detected()
                 
@@ -130,97 +409,202 @@ class VoiceAssistant:
             # Could not understand audio
             pass
         except sr.RequestError as e:
-            self.logger.error(f"Speech recognition error: {e}")
+            self.logger.error("Speech recognition error: %s", e)
+
+    def _speak_soon(self, text: str) -> asyncio.Task:
+        """Start speaking without blocking the caller"""
+        task = asyncio.create_task(self.speak(text))
+        self._speech_tasks.add(task)
+        task.add_done_callback(self._speech_tasks.discard)
+        return task
 
     def _handle_wake_word_detected(self):
         """Handle wake word detection"""
+        # Barge-in: a new wake word cuts off whatever is still being spoken
+        if self._speech_tasks:
+            pygame.mixer.stop()
+            for task in self._speech_tasks:
+                task.cancel()
+        
         self.is_listening = True
+        self._command_pending = True
         
-        # Play acknowledgment sound
-        asyncio.create_task(self.speak("Yes, I'm listening"))
+        # Play acknowledgment sound; the listener waits for it before recording the command
+        self._ack_task = self._speak_soon("Yes, I'm listening")
+
+    def _is_speech(self, frame: bytes) -> bool:
+        """Voice activity for one command frame"""
+        if self._vad is None:
+            samples = np.frombuffer(frame, np.int16).astype(np.float32)
+            return float(np.sqrt(np.mean(samples * samples))) > self.recognizer.energy_threshold
         
-        # Listen for command
-        self._listen_for_command()
+        step = VAD_FRAME_SAMPLES * 2
+        voiced = sum(
+            self._vad.is_speech(frame[i:i + step], SAMPLE_RATE)
+            for i in range(0, len(frame) - step + 1, step)
+        )
+        return voiced * step * 2 > len(frame)
 
-    def _listen_for_command(self):
-        """Listen for user command after wake word"""
+    async def _listen_for_command(self, source):
+        """Stream the command after the wake word to the audio queue frame by frame"""
         try:
-            with self.microphone as source:
-                self.logger.info("Listening for command...")
+            # Recording over the acknowledgment would pick it up as the start of the command
+            if self._ack_task is not None:
+                await asyncio.wait({self._ack_task})
+                self._ack_task = None
+                # Drop what the open stream captured while the acknowledgment played
+                pending = source.stream.pyaudio_stream.get_read_available()
+                if pending:
+                    await asyncio.to_thread(source.stream.read, pending)
+            
+            self.logger.info("Listening for command...")
+            heard_speech = False
+            silence = 0.0
+            elapsed = 0.0
+            frame_seconds = COMMAND_FRAME_SAMPLES / SAMPLE_RATE
+            
+            while self.is_active:
+                frame = await asyncio.to_thread(source.stream.read, COMMAND_FRAME_SAMPLES)
+                elapsed += frame_seconds
+                
+                if self._is_speech(frame):
+                    heard_speech = True
+                    silence = 0.0
+                else:
+                    silence += frame_seconds
                 
-                # Give user time to speak
-                audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=10)
-                self.audio_queue.put(("command", audio))
+                if not heard_speech:
+                    # Give user time to speak
+                    if elapsed >= COMMAND_TIMEOUT:
+                        raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+                    continue
+                
+                await self.audio_queue.put(("command_chunk", frame))
+                if silence >= self.recognizer.pause_threshold or elapsed >= COMMAND_PHRASE_LIMIT:
+                    break
+            
+            await self.audio_queue.put(("command_end", None))
                 
         except sr.WaitTimeoutError:
-            asyncio.create_task(self.speak("I didn't hear anything. Try again."))
+            self._speak_soon("I didn't hear anything. Try again.")
             self.is_listening = False
         except Exception as e:
-            self.logger.error(f"Command listening error: {e}")
+            self.logger.error("Command listening error: %s", e)
             self.is_listening = False
 
-    def _process_command(self, audio):
+    async def _add_command_chunk(self, frame: bytes):
+        """Buffer a command frame and periodically emit a partial transcript"""
+        self._command_buffer.extend(frame)
+        
+        # Partials only make sense with the local model; the cloud fallback would be one request per interval
+        now = time.monotonic()
+        if self._stt is None or self.transcript_callback is None or now - self._last_partial < PARTIAL_TRANSCRIPT_INTERVAL:
+            return
+        self._last_partial = now
+        
+        try:
+            samples = np.frombuffer(self._command_buffer, np.int16).astype(np.float32) * (1.0 / 32768)
+            partial = await asyncio.to_thread(self._stt.transcribe, samples, self.language)
+            if partial:
+                self.transcript_callback("partial", partial)
+        except Exception as e:
+            self.logger.debug("Partial transcription failed: %s", e)
+
+    async def _process_command(self, audio):
         """Process voice command"""
         try:
             # Convert speech to text
-            command_text = self.recognizer.recognize_google(audio, language=self.language)
-            self.logger.info(f"Command received: {command_text}")
+            command_text = await asyncio.to_thread(self._recognize, audio)
+            self.logger.info("Command received: %s", command_text)
+            if self.transcript_callback:
+                self.transcript_callback("final", command_text)
             
-            # Process command through callback
+            # Process command through callback, which may be a coroutine function
             if self.response_callback:
                 response = self.response_callback(command_text)
-                asyncio.create_task(self.speak(response))
+                if inspect.isawaitable(response):
+                    response = await response
+                # Play in the background so wake words are checked (and can interrupt) during playback
+                self._speak_soon(response)
             else:
-                asyncio.create_task(self.speak("I heard you, but I don't know how to respond yet."))
+                self._speak_soon("I heard you, but I don't know how to respond yet.")
                 
         except sr.UnknownValueError:
-            asyncio.create_task(self.speak("Sorry, I couldn't understand what you said."))
+            self._speak_soon("Sorry, I couldn't understand what you said.")
         except sr.RequestError as e:
-            self.logger.error(f"Speech recognition error: {e}")
-            asyncio.create_task(self.speak("Sorry, there was an error processing your request."))
+            self.logger.error("Speech recognition error: %s", e)
+            self._speak_soon("Sorry, there was an error processing your request.")
         finally:
             self.is_listening = False
 
+    def _tts_sample_rate(self) -> int:
+        """Sample rate of the Piper voice, read from its config without loading the model"""
+        try:
+            with open(f"{self.tts_voice_path}.json") as f:
+                return json.load(f)["audio"]["sample_rate"]
+        except (OSError, ValueError, KeyError):
+            return TTS_SAMPLE_RATE
+
+    @property
+    def tts_voice(self):
+        """Piper voice, loaded on first use; None when local TTS is unavailable"""
+        if not self._tts_loaded:
+            self._tts_loaded = True
+            if PiperVoice is not None and os.path.exists(self.tts_voice_path):
+                try:
+                    self._tts_voice = PiperVoice.load(self.tts_voice_path)
+                except Exception as e:
+                    self.logger.error("Failed to load Piper voice: %s", e)
+        return self._tts_voice
+
+    def _synthesize_pcm(self, text: str) -> bytes:
+        """Synthesize int16 PCM with the local Piper voice"""
+        pcm = io.BytesIO()
+        for chunk in self.tts_voice.synthesize_stream_raw(text, length_scale=1.0 / self.voice_speed):
+            pcm.write(chunk)
+        return pcm.getvalue()
+
+    def _synthesize_sound(self, text: str, lang: str) -> pygame.mixer.Sound:
+        """Synthesize speech into an in-memory Sound, with no temp files"""
+        # Local voice only speaks English; other languages still go through gTTS
+        if lang.startswith("en") and self.tts_voice is not None:
+            return pygame.mixer.Sound(buffer=self._synthesize_pcm(text))
+        
+        # Create TTS and decode the MP3 straight from memory
+        mp3 = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=False).write_to_fp(mp3)
+        mp3.seek(0)
+        return pygame.mixer.Sound(file=mp3)
+
     async def speak(self, text: str, language: Optional[str] = None):
         """Convert text to speech and play it"""
         try:
             lang = language or self.language
             
-            # Create TTS
-            tts = gTTS(text=text, lang=lang, slow=False)
-            
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                tts.save(tmp_file.name)
-                tmp_filename = tmp_file.name
+            sound = await asyncio.to_thread(self._synthesize_sound, text, lang)
+            sound.set_volume(self.voice_volume)
+            channel = sound.play()
             
-            # Play audio
-            pygame.mixer.music.load(tmp_filename)
-            pygame.mixer.music.set_volume(self.voice_volume)
-            pygame.mixer.music.play()
+            # Sleep for the clip's known duration, then absorb the few ms of mixer buffer still draining
+            await asyncio.sleep(sound.get_length())
+            while channel.get_busy():
+                await asyncio.sleep(PLAYBACK_DRAIN_POLL)
             
-            # Wait for playback to finish
-            while pygame.mixer.music.get_busy():
-                await asyncio.sleep(0.1)
-            
-            # Clean up temporary file
-            os.unlink(tmp_filename)
-            
-            self.logger.info(f"Spoke: {text}")
+            self.logger.info("Spoke: %s", text)
             
         except Exception as e:
-            self.logger.error(f"Text-to-speech error: {e}")
+            self.logger.error("Text-to-speech error: %s", e)
 
     async def listen_once(self, timeout: int = 5) -> Optional[str]:
         """Listen for a single command (non-continuous mode)"""
         try:
-            with self.microphone as source:
+            with self._microphone_source() as source:
                 self.logger.info("Listening for single command...")
-                audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=10)
+                audio = await asyncio.to_thread(self.recognizer.listen, source, timeout, 10)
                 
                 # Convert to text
-                text = self.recognizer.recognize_google(audio, language=self.language)
-                self.logger.info(f"Heard: {text}")
+                text = await asyncio.to_thread(self._recognize, audio)
+                self.logger.info("Heard: %s", text)
                 return text
                 
         except sr.WaitTimeoutError:
@@ -230,7 +614,7 @@ class VoiceAssistant:
             self.logger.warning("Could not understand audio")
             return None
         except sr.RequestError as e:
-            self.logger.error(f"Speech recognition error: {e}")
+            self.logger.error("Speech recognition error: %s", e)
             return None
 
     def get_available_microphones(self) -> Dict[int, str]:
@@ -243,11 +627,13 @@ class VoiceAssistant:
     def set_microphone(self, device_index: int):
         """Set specific microphone device"""
         try:
-            self.microphone = sr.Microphone(device_index=device_index)
+            self.microphone = sr.Microphone(device_index=device_index, sample_rate=SAMPLE_RATE)
+            self._mic_desc = str(self.microphone)
+            self._static_stats = self._build_static_stats()
             self.calibrate_microphone()
-            self.logger.info(f"Microphone set to device {device_index}")
+            self.logger.info("Microphone set to device %s", device_index)
         except Exception as e:
-            self.logger.error(f"Failed to set microphone: {e}")
+            self.logger.error("Failed to set microphone: %s", e)
 
     def adjust_recognition_settings(self, 
                                   energy_threshold: Optional[int] = None,
@@ -283,23 +669,29 @@ class VoiceAssistant:
             await self.speak("I couldn't hear you clearly.")
             return False
 
-    def get_voice_stats(self) -> Dict:
-        """Get voice assistant statistics"""
+    def _build_static_stats(self) -> Dict:
+        """Stats fields that don't change between get_voice_stats calls"""
         return {
-            "is_active": self.is_active,
-            "is_listening": self.is_listening,
             "wake_word": self.wake_word,
             "language": self.language,
-            "voice_volume": self.voice_volume,
-            "microphone_info": str(self.microphone),
-            "energy_threshold": self.recognizer.energy_threshold,
-            "dynamic_energy_threshold": self.recognizer.dynamic_energy_threshold
+            "microphone_info": self._mic_desc,
+            "conversation_history_limit": VOICE_HISTORY_LIMIT
         }
 
+    def get_voice_stats(self) -> Dict:
+        """Get voice assistant statistics"""
+        stats = self._static_stats.copy()
+        stats["is_active"] = self.is_active
+        stats["is_listening"] = self.is_listening
+        stats["voice_volume"] = self.voice_volume
+        stats["energy_threshold"] = self.recognizer.energy_threshold
+        stats["dynamic_energy_threshold"] = self.recognizer.dynamic_energy_threshold
+        return stats
+
 class VoiceCommandProcessor:
     """Process and route voice commands"""
     
-    def __init__(self, agent_callback: Callable[[str], str]):
+    def __init__(self, agent_callback: Callable[[str], Union[str, Awaitable[str]]]):
         self.agent_callback = agent_callback
         self.logger = logging.getLogger("VoiceCommandProcessor")
         
@@ -314,21 +706,36 @@ class VoiceCommandProcessor:
             "clear conversation": self._clear_conversation
         }
         
+        self._build_command_matcher()
+        
+        # (minute, formatted) pairs so repeated time/date questions skip strftime
+        self._time_cache = (0, "")
+        self._date_cache = (0, "")
+        
         self.last_response = ""
-        self.conversation_history = []
+        self.conversation_history: deque = deque(maxlen=VOICE_HISTORY_LIMIT)
+
+    def _build_command_matcher(self):
+        """Compile all triggers into one regex; call again after changing voice_commands"""
+        self._command_priority = {trigger: rank for rank, trigger in enumerate(self.voice_commands)}
+        self._command_re = re.compile("|".join(map(re.escape, self.voice_commands)))
 
-    def process_command(self, command: str) -> str:
+    async def process_command(self, command: str) -> str:
         """Process voice command and return response"""
         command_lower = command.lower().strip()
         
-        # Check for built-in commands first
-        for trigger, handler in self.voice_commands.items():
-            if trigger in command_lower:
-                return handler(command)
+        # Check for built-in commands first, in voice_commands order when several match
+        matched = {match.group() for match in self._command_re.finditer(command_lower)}
+        if matched:
+            trigger = min(matched, key=self._command_priority.__getitem__)
+            return self.voice_commands[trigger](command)
         
         # Route to main agent
         try:
+            # The agent callback may be a coroutine function
             response = self.agent_callback(command)
+            if inspect.isawaitable(response):
+                response = await response
             self.last_response = response
             
             # Add to conversation history
@@ -341,7 +748,7 @@ class VoiceCommandProcessor:
             return response
             
         except Exception as e:
-            self.logger.error(f"Error processing command: {e}")
+            self.logger.error("Error processing command: %s", e)
             return "Sorry, I encountered an error processing your request."
 
     def _stop_listening(self, command: str) -> str:
@@ -350,13 +757,18 @@ class VoiceCommandProcessor:
 
     def _get_time(self, command: str) -> str:
         """Get current time"""
-        current_time = datetime.now().strftime("%I:%M %p")
-        return f"The current time is {current_time}"
+        minute = int(time.time() // 60)
+        if minute != self._time_cache[0]:
+            self._time_cache = (minute, datetime.now().strftime("%I:%M %p"))
+        return f"The current time is {self._time_cache[1]}"
 
     def _get_date(self, command: str) -> str:
         """Get current date"""
-        current_date = datetime.now().strftime("%A, %B %d, %Y")
-        return f"Today is {current_date}"
+        # Keyed by minute too: local midnight falls on a minute boundary, unlike a UTC day number
+        minute = int(time.time() // 60)
+        if minute != self._date_cache[0]:
+            self._date_cache = (minute, datetime.now().strftime("%A, %B %d, %Y"))
+        return f"Today is {self._date_cache[1]}"
 
     def _volume_up(self, command: str) -> str:
         """Increase volume"""
@@ -4,52 +4,252 @@ import aiohttp
 import requests
 from bs4 import BeautifulSoup
 import PyPDF2
+from concurrent.futures import ThreadPoolExecutor
 import docx
 from urllib.parse import urlparse, urljoin
 import json
+import re
 import os
-from typing import Dict, List, Optional
+import shutil
+import tempfile
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 import logging
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# PDFium is not thread-safe; every call into it, from any thread, holds this lock
+_PDFIUM_LOCK = threading.Lock()
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def _json_dumps(obj, indent: bool = False) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+    return json.dumps(obj, indent=2 if indent else None)
+
+# Pooled connections shared by every search and fetch
+HTTP_CONNECTION_LIMIT = 100
+HTTP_CONNECTIONS_PER_HOST = 10
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+HTTP_TIMEOUT = 10
+
+# LRU+TTL cache for search results and fetched pages
+WEB_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 600
+URL_CACHE_TTL = 300
+
+# Bytes read from a response; pages are truncated to 5000 chars after parsing, so more is wasted transfer
+MAX_HTML_BYTES = 256 * 1024
+# PDFs need their trailing xref table, so this only guards against huge downloads
+MAX_PDF_BYTES = 20 * 1024 * 1024
+
+# Summarizer; on CPU it runs as a dynamically int8-quantized ONNX export cached here
+SUMMARIZER_MODEL = "facebook/bart-large-cnn"
+SUMMARIZER_INT8_DIR = os.path.expanduser("~/.cache/ai-agent/bart-large-cnn-int8")
+_SUMMARIZER_ONNX_FILES = ("encoder_model", "decoder_model", "decoder_with_past_model")
+
+def load_int8_summarizer():
+    """BART summarization pipeline on ONNX Runtime with int8 weights, exporting on first use"""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer, pipeline
+    
+    encoder, decoder, decoder_with_past = quantized = [f"{name}_quantized.onnx" for name in _SUMMARIZER_ONNX_FILES]
+    
+    def export_complete() -> bool:
+        return all(os.path.isfile(os.path.join(SUMMARIZER_INT8_DIR, name)) for name in quantized)
+    
+    if not export_complete():
+        # Build in a scratch directory and move it into place only once every file is written,
+        # so an interrupted export is redone instead of being mistaken for a finished one
+        parent = os.path.dirname(SUMMARIZER_INT8_DIR)
+        os.makedirs(parent, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix=".summarizer-", dir=parent)
+        try:
+            export_dir = os.path.join(work_dir, "fp32")
+            int8_dir = os.path.join(work_dir, "int8")
+            ORTModelForSeq2SeqLM.from_pretrained(SUMMARIZER_MODEL, export=True, use_merged=False).save_pretrained(export_dir)
+            
+            # Dynamic quantization: int8 weights, activations quantized per batch, VNNI dot products where available
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            for name in _SUMMARIZER_ONNX_FILES:
+                quantizer = ORTQuantizer.from_pretrained(export_dir, file_name=f"{name}.onnx")
+                quantizer.quantize(save_dir=int8_dir, quantization_config=qconfig)
+            
+            # Clear a partial directory left by an older interrupted export
+            if os.path.isdir(SUMMARIZER_INT8_DIR) and not export_complete():
+                shutil.rmtree(SUMMARIZER_INT8_DIR)
+            try:
+                os.replace(int8_dir, SUMMARIZER_INT8_DIR)
+            except OSError:
+                # Another process finished its export first
+                if not export_complete():
+                    raise
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        SUMMARIZER_INT8_DIR,
+        encoder_file_name=encoder,
+        decoder_file_name=decoder,
+        decoder_with_past_file_name=decoder_with_past
+    )
+    return pipeline("summarization", model=model, tokenizer=AutoTokenizer.from_pretrained(SUMMARIZER_MODEL))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Threads for PDF text extraction so parsing never blocks the event loop; PDFium
+# itself runs one document at a time under _PDFIUM_LOCK, the PyPDF2 fallback in parallel
+PDF_WORKERS = 4
+
+# Uploaded documents are only ever analyzed from their opening text
+MAX_DOCUMENT_CHARS = 8000
+
+def _take_until(texts, max_chars: Optional[int]) -> List[str]:
+    """Collect texts in order, stopping once their combined length passes max_chars"""
+    parts = []
+    total = 0
+    for text in texts:
+        text = text or ""
+        parts.append(text)
+        total += len(text)
+        if max_chars is not None and total > max_chars:
+            break
+    return parts
+
+def _source_name(source: Union[str, BinaryIO]) -> str:
+    """Path of a file source, or the name attached to an in-memory upload"""
+    return source if isinstance(source, str) else getattr(source, "name", "")
+
+def _read_source(source: Union[str, BinaryIO]) -> bytes:
+    if isinstance(source, str):
+        with open(source, 'rb') as file:
+            return file.read()
+    return source.read()
+
+def extract_pdf_pages(source, max_chars: Optional[int] = None) -> Tuple[List[str], int]:
+    """Text of the leading PDF pages (up to about max_chars) and the total page count.
+
+    source is a path, bytes or a binary file object. Uses PDFium when installed and PyPDF2 otherwise; pages past the cap are never extracted.
+    """
+    if pdfium is not None:
+        with _PDFIUM_LOCK:
+            doc = pdfium.PdfDocument(source)
+            try:
+                pages = _take_until((page.get_textpage().get_text_range() for page in doc), max_chars)
+                return pages, len(doc)
+            finally:
+                doc.close()
+    
+    import io
+    reader = PyPDF2.PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+    pages = _take_until((page.extract_text() for page in reader.pages), max_chars)
+    return pages, len(reader.pages)
 
 class WebTools:
+    # Summarization pipeline, loaded once per process by _get_summarizer
+    _summarizer = None
+    _summarizer_lock = threading.Lock()
+    
     def __init__(self):
         self.logger = logging.getLogger("WebTools")
-        self.session = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._web_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # URL digest -> (ETag, Last-Modified, parsed content) for conditional re-fetches
+        self._http_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
         
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        await self._get_session()
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        await self.aclose()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use or after aclose()"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_CONNECTION_LIMIT,
+                limit_per_host=HTTP_CONNECTIONS_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                enable_cleanup_closed=True
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+                json_serialize=_json_dumps
+            )
+        return self.session
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Return the PDF worker pool, creating it on first use or after aclose()"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=PDF_WORKERS)
+        return self._executor
+
+    async def aclose(self):
+        """Close the shared session, its connection pool and the PDF workers"""
+        if self.session and not self.session.closed:
             await self.session.close()
+        self.session = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _cached(self, key: tuple, ttl: float, fetch, *args):
+        """Serve fetch(*args) from the LRU+TTL cache; failures and empty results aren't stored"""
+        entry = self._web_cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._web_cache.move_to_end(key)
+            # Callers annotate results in place, so hand out copies
+            return copy.deepcopy(entry[1])
+        
+        value = await fetch(*args)
+        if value and not (isinstance(value, dict) and value.get("type") == "error"):
+            self._web_cache[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+            self._web_cache.move_to_end(key)
+            if len(self._web_cache) > WEB_CACHE_SIZE:
+                self._web_cache.popitem(last=False)
+        return value
 
     async def web_search(self, query: str, num_results: int = 10) -> List[Dict]:
         """Perform web search using multiple search engines"""
-        results = []
-        
-        # Try DuckDuckGo first (no API key required)
-        try:
-            ddg_results = await self.duckduckgo_search(query, num_results)
-            results.extend(ddg_results)
-        except Exception as e:
-            self.logger.error(f"DuckDuckGo search failed: {e}")
-        
-        # Try Tavily if API key available
+        # DuckDuckGo needs no API key; the others join when their keys are set
+        searches = [self.duckduckgo_search(query, num_results)]
         if os.getenv("TAVILY_API_KEY"):
-            try:
-                tavily_results = await self.tavily_search(query, num_results)
-                results.extend(tavily_results)
-            except Exception as e:
-                self.logger.error(f"Tavily search failed: {e}")
-        
-        # Try SerpAPI if available
+            searches.append(self.tavily_search(query, num_results))
         if os.getenv("SERPAPI_API_KEY"):
-            try:
-                serp_results = await self.serpapi_search(query, num_results)
-                results.extend(serp_results)
-            except Exception as e:
-                self.logger.error(f"SerpAPI search failed: {e}")
+            searches.append(self.serpapi_search(query, num_results))
+        
+        # Query the engines concurrently; results keep engine order for deduplication
+        results = []
+        for engine_results in await asyncio.gather(*searches, return_exceptions=True):
+            if isinstance(engine_results, Exception):
+                self.logger.error(f"Search engine failed: {engine_results}")
+                continue
+            results.extend(engine_results)
         
         # Remove duplicates and return top results
         unique_results = []
@@ -64,18 +264,26 @@ class WebTools:
 
     async def duckduckgo_search(self, query: str, num_results: int = 10) -> List[Dict]:
         """Search using DuckDuckGo"""
+        return await self._cached(("duckduckgo", query, num_results), SEARCH_CACHE_TTL,
+                                  self._duckduckgo_search, query, num_results)
+
+    async def _duckduckgo_search(self, query: str, num_results: int) -> List[Dict]:
         try:
             from duckduckgo_search import DDGS
             
+            def search():
+                with DDGS() as ddgs:
+                    return list(ddgs.text(query, max_results=num_results))
+            
+            # DDGS is synchronous; run it off the loop so the other engines proceed in parallel
             results = []
-            with DDGS() as ddgs:
-                for r in ddgs.text(query, max_results=num_results):
-                    results.append({
-                        "title": r.get("title", ""),
-                        "url": r.get("href", ""),
-                        "snippet": r.get("body", ""),
-                        "source": "DuckDuckGo"
-                    })
+            for r in await asyncio.to_thread(search):
+                results.append({
+                    "title": r.get("title", ""),
+                    "url": r.get("href", ""),
+                    "snippet": r.get("body", ""),
+                    "source": "DuckDuckGo"
+                })
             return results
             
         except ImportError:
@@ -87,6 +295,10 @@ class WebTools:
 
     async def tavily_search(self, query: str, num_results: int = 10) -> List[Dict]:
         """Search using Tavily API"""
+        return await self._cached(("tavily", query, num_results), SEARCH_CACHE_TTL,
+                                  self._tavily_search, query, num_results)
+
+    async def _tavily_search(self, query: str, num_results: int) -> List[Dict]:
         try:
             url = "https://api.tavily.com/search"
             payload = {
@@ -99,8 +311,9 @@ class WebTools:
                 "include_raw_content": False
             }
             
-            async with self.session.post(url, json=payload) as response:
-                data = await response.json()
+            session = await self._get_session()
+            async with session.post(url, json=payload) as response:
+                data = _json_loads(await response.read())
                 
                 results = []
                 for item in data.get("results", []):
@@ -119,6 +332,10 @@ class WebTools:
 
     async def serpapi_search(self, query: str, num_results: int = 10) -> List[Dict]:
         """Search using SerpAPI (Google)"""
+        return await self._cached(("serpapi", query, num_results), SEARCH_CACHE_TTL,
+                                  self._serpapi_search, query, num_results)
+
+    async def _serpapi_search(self, query: str, num_results: int) -> List[Dict]:
         try:
             url = "https://serpapi.com/search"
             params = {
@@ -128,8 +345,9 @@ class WebTools:
                 "num": num_results
             }
             
-            async with self.session.get(url, params=params) as response:
-                data = await response.json()
+            session = await self._get_session()
+            async with session.get(url, params=params) as response:
+                data = _json_loads(await response.read())
                 
                 results = []
                 for item in data.get("organic_results", []):
@@ -148,34 +366,38 @@ class WebTools:
 
     async def fetch_url_content(self, url: str) -> Dict:
         """Fetch and parse content from URL"""
+        return await self._cached(("url", url), URL_CACHE_TTL, self._fetch_url_content, url)
+
+    async def _fetch_url_content(self, url: str) -> Dict:
         try:
-            async with self.session.get(url, timeout=10) as response:
-                content_type = response.headers.get('content-type', '').lower()
+            key = hashlib.blake2b(url.encode(), digest_size=16).digest()
+            validators = self._http_cache.get(key)
+            headers = {}
+            if validators is not None:
+                etag, last_modified, _ = validators
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+            
+            session = await self._get_session()
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and validators is not None:
+                    # Unchanged since the last fetch, so skip the body entirely
+                    self._http_cache.move_to_end(key)
+                    return copy.deepcopy(validators[2])
                 
-                if 'text/html' in content_type:
-                    html = await response.text()
-                    return self.parse_html_content(html, url)
-                    
-                elif 'application/pdf' in content_type:
-                    pdf_content = await response.read()
-                    return self.parse_pdf_content(pdf_content, url)
-                    
-                elif 'text/plain' in content_type:
-                    text = await response.text()
-                    return {
-                        "url": url,
-                        "title": urlparse(url).netloc,
-                        "content": text,
-                        "type": "text"
-                    }
-                    
-                else:
-                    return {
-                        "url": url,
-                        "title": urlparse(url).netloc,
-                        "content": "Unsupported content type",
-                        "type": "unknown"
-                    }
+                result = await self._parse_response(response, url)
+                
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if response.status == 200 and (etag or last_modified) and result["type"] not in ("error", "unknown"):
+                    self._http_cache[key] = (etag, last_modified, copy.deepcopy(result))
+                    self._http_cache.move_to_end(key)
+                    if len(self._http_cache) > WEB_CACHE_SIZE:
+                        self._http_cache.popitem(last=False)
+                
+                return result
                     
         except Exception as e:
             self.logger.error(f"Error fetching {url}: {e}")
@@ -186,32 +408,89 @@ class WebTools:
                 "type": "error"
             }
 
-    def parse_html_content(self, html: str, url: str) -> Dict:
-        """Parse HTML content and extract text"""
-        try:
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
+    async def _parse_response(self, response: aiohttp.ClientResponse, url: str) -> Dict:
+        """Parse a fetched body according to its content type"""
+        content_type = response.headers.get('content-type', '').lower()
+        
+        if 'text/html' in content_type:
+            raw = await self._read_capped(response, MAX_HTML_BYTES)
+            html = raw.decode(response.charset or 'utf-8', errors='replace')
+            return self.parse_html_content(html, url)
             
-            # Get title
-            title = soup.find('title')
-            title_text = title.get_text().strip() if title else urlparse(url).netloc
+        elif 'application/pdf' in content_type:
+            pdf_content = await self._read_capped(response, MAX_PDF_BYTES)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), self.parse_pdf_content, pdf_content, url)
             
-            # Get main content
-            # Try to find main content areas
-            main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
+        elif 'text/plain' in content_type:
+            text = await response.text()
+            return {
+                "url": url,
+                "title": urlparse(url).netloc,
+                "content": text,
+                "type": "text"
+            }
             
-            if main_content:
-                content = main_content.get_text()
+        else:
+            return {
+                "url": url,
+                "title": urlparse(url).netloc,
+                "content": "Unsupported content type",
+                "type": "unknown"
+            }
+
+    @staticmethod
+    async def _read_capped(response: aiohttp.ClientResponse, limit: int) -> bytes:
+        """Read at most limit bytes of the body, abandoning the rest of the transfer"""
+        chunks = []
+        total = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            total += len(chunk)
+            if total >= limit:
+                break
+        return b"".join(chunks)[:limit]
+
+    def parse_html_content(self, html: str, url: str) -> Dict:
+        """Parse HTML content and extract text"""
+        try:
+            if HTMLParser is not None:
+                # selectolax parses in C; BeautifulSoup stays as the fallback
+                tree = HTMLParser(html)
+                
+                # Remove script and style elements
+                for node in tree.css("script, style"):
+                    node.decompose()
+                
+                # Get title
+                title = tree.css_first('title')
+                title_text = title.text().strip() if title else urlparse(url).netloc
+                
+                # Try to find main content areas
+                main_content = tree.css_first('main') or tree.css_first('article') or tree.css_first('div.content')
+                content = (main_content or tree.body or tree.root).text()
             else:
-                content = soup.get_text()
+                soup = BeautifulSoup(html, 'html.parser')
+                
+                # Remove script and style elements
+                for script in soup(["script", "style"]):
+                    script.decompose()
+                
+                # Get title
+                title = soup.find('title')
+                title_text = title.get_text().strip() if title else urlparse(url).netloc
+                
+                # Get main content
+                # Try to find main content areas
+                main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
+                
+                if main_content:
+                    content = main_content.get_text()
+                else:
+                    content = soup.get_text()
             
-            # Clean up text
-            lines = (line.strip() for line in content.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            content = ' '.join(chunk for chunk in chunks if chunk)
+            # Clean up text: collapse whitespace runs in one C-level pass
+            content = _WHITESPACE_RE.sub(' ', content).strip()
             
             return {
                 "url": url,
@@ -232,13 +511,8 @@ class WebTools:
     def parse_pdf_content(self, pdf_content: bytes, url: str) -> Dict:
         """Parse PDF content and extract text"""
         try:
-            import io
-            pdf_file = io.BytesIO(pdf_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+            pages, _ = extract_pdf_pages(pdf_content, max_chars=5000)
+            text = "\n".join(pages)
             
             return {
                 "url": url,
@@ -256,44 +530,84 @@ class WebTools:
                 "type": "error"
             }
 
-    async def summarize_content(self, content: str, max_length: int = 500) -> str:
-        """Summarize content using extractive summarization"""
-        try:
+    @classmethod
+    def _get_summarizer(cls):
+        """Summarization pipeline shared by all WebTools instances, loaded on first use"""
+        if cls._summarizer is not None:
+            return cls._summarizer
+        # Concurrent first calls (from worker threads) wait for one load instead of each starting one
+        with cls._summarizer_lock:
+            if cls._summarizer is not None:
+                return cls._summarizer
+            import torch
             from transformers import pipeline
             
-            # Use a lightweight summarization model
-            summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+            # fp16 on GPU; on CPU prefer the int8 ONNX model, falling back to fp32 transformers
+            use_cuda = torch.cuda.is_available()
+            if not use_cuda:
+                try:
+                    cls._summarizer = load_int8_summarizer()
+                    return cls._summarizer
+                except Exception as e:
+                    logging.getLogger("WebTools").warning(f"int8 summarizer unavailable, using fp32: {e}")
             
+            cls._summarizer = pipeline(
+                "summarization",
+                model=SUMMARIZER_MODEL,
+                device=0 if use_cuda else -1,
+                torch_dtype=torch.float16 if use_cuda else torch.float32
+            )
+        return cls._summarizer
+
+    async def summarize_content(self, content: str, max_length: int = 500) -> str:
+        """Summarize content using extractive summarization"""
+        try:
             # Split content into chunks if too long
             max_chunk_length = 1024
             chunks = [content[i:i+max_chunk_length] for i in range(0, len(content), max_chunk_length)]
             
-            summaries = []
-            for chunk in chunks[:3]:  # Limit to first 3 chunks
-                if len(chunk.strip()) > 50:  # Only summarize substantial chunks
-                    summary = summarizer(chunk, max_length=max_length//len(chunks), min_length=30, do_sample=False)
-                    summaries.append(summary[0]['summary_text'])
+            # Limit to first 3 chunks and only summarize substantial ones
+            selected = [chunk for chunk in chunks[:3] if len(chunk.strip()) > 50]
+            if not selected:
+                return ""
+            
+            def summarize():
+                # One batched forward pass over all selected chunks
+                return self._get_summarizer()(
+                    selected,
+                    max_length=max_length//len(chunks),
+                    min_length=30,
+                    do_sample=False,
+                    batch_size=len(selected)
+                )
             
-            return " ".join(summaries)
+            outputs = await asyncio.to_thread(summarize)
+            return " ".join(output['summary_text'] for output in outputs)
             
         except Exception as e:
             self.logger.error(f"Summarization error: {e}")
             # Fallback to simple truncation
             return content[:max_length] + "..." if len(content) > max_length else content
 
-    async def process_file_upload(self, file_path: str) -> Dict:
-        """Process uploaded file and extract content"""
+    async def process_file_upload(self, source: Union[str, BinaryIO]) -> Dict:
+        """Process uploaded file (a path, or a binary file object with a .name) and extract content"""
+        # Disk reads and parsing are blocking, so keep them off the event loop
+        return await asyncio.to_thread(self.parse_file, source)
+
+    def parse_file(self, source: Union[str, BinaryIO]) -> Dict:
+        """Extract content from a file based on its extension"""
+        file_path = _source_name(source)
         try:
             file_extension = os.path.splitext(file_path)[1].lower()
             
             if file_extension == '.pdf':
-                return self.process_pdf_file(file_path)
+                return self.process_pdf_file(source)
             elif file_extension in ['.docx', '.doc']:
-                return self.process_word_file(file_path)
+                return self.process_word_file(source)
             elif file_extension == '.txt':
-                return self.process_text_file(file_path)
+                return self.process_text_file(source)
             elif file_extension in ['.json']:
-                return self.process_json_file(file_path)
+                return self.process_json_file(source)
             else:
                 return {
                     "filename": os.path.basename(file_path),
@@ -309,76 +623,68 @@ class WebTools:
                 "type": "error"
             }
 
-    def process_pdf_file(self, file_path: str) -> Dict:
+    def process_pdf_file(self, source: Union[str, BinaryIO]) -> Dict:
         """Process PDF file"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                
-                return {
-                    "filename": os.path.basename(file_path),
-                    "content": text,
-                    "type": "pdf",
-                    "pages": len(pdf_reader.pages)
-                }
+            pages, page_count = extract_pdf_pages(source, max_chars=MAX_DOCUMENT_CHARS)
+            text = "\n".join(pages)
+            
+            return {
+                "filename": os.path.basename(_source_name(source)),
+                "content": text[:MAX_DOCUMENT_CHARS],
+                "type": "pdf",
+                "pages": page_count
+            }
                 
         except Exception as e:
             raise Exception(f"PDF processing error: {str(e)}")
 
-    def process_word_file(self, file_path: str) -> Dict:
+    def process_word_file(self, source: Union[str, BinaryIO]) -> Dict:
         """Process Word document"""
         try:
-            doc = docx.Document(file_path)
-            text = ""
-            
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+            doc = docx.Document(source)
+            paragraphs = doc.paragraphs
+            text = "\n".join(_take_until((paragraph.text for paragraph in paragraphs), MAX_DOCUMENT_CHARS))
             
             return {
-                "filename": os.path.basename(file_path),
-                "content": text,
+                "filename": os.path.basename(_source_name(source)),
+                "content": text[:MAX_DOCUMENT_CHARS],
                 "type": "docx",
-                "paragraphs": len(doc.paragraphs)
+                "paragraphs": len(paragraphs)
             }
             
         except Exception as e:
             raise Exception(f"Word document processing error: {str(e)}")
 
-    def process_text_file(self, file_path: str) -> Dict:
+    def process_text_file(self, source: Union[str, BinaryIO]) -> Dict:
         """Process text file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                
-                return {
-                    "filename": os.path.basename(file_path),
-                    "content": content,
-                    "type": "text",
-                    "size": len(content)
-                }
+            content = _read_source(source).decode('utf-8')
+            
+            return {
+                "filename": os.path.basename(_source_name(source)),
+                "content": content,
+                "type": "text",
+                "size": len(content)
+            }
                 
         except Exception as e:
             raise Exception(f"Text file processing error: {str(e)}")
 
-    def process_json_file(self, file_path: str) -> Dict:
+    def process_json_file(self, source: Union[str, BinaryIO]) -> Dict:
         """Process JSON file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                
-                # Convert JSON to readable text
-                content = json.dumps(data, indent=2)
-                
-                return {
-                    "filename": os.path.basename(file_path),
-                    "content": content,
-                    "type": "json",
-                    "structure": type(data).__name__
-                }
+            data = _json_loads(_read_source(source))
+            
+            # Convert JSON to readable text
+            content = _json_dumps(data, indent=True)
+            
+            return {
+                "filename": os.path.basename(_source_name(source)),
+                "content": content,
+                "type": "json",
+                "structure": type(data).__name__
+            }
                 
         except Exception as e:
             raise Exception(f"JSON file processing error: {str(e)}")
@@ -387,10 +693,16 @@ class WebTools:
         """Get latest updates on specified topics"""
         all_results = []
         
-        for topic in topics:
-            query = f"{topic} latest news updates"
-            results = await self.web_search(query, num_results=5)
-            
+        # Topics are independent searches, so run them concurrently
+        topic_results = await asyncio.gather(
+            *(self.web_search(f"{topic} latest news updates", num_results=5) for topic in topics),
+            return_exceptions=True
+        )
+        
+        for topic, results in zip(topics, topic_results):
+            if isinstance(results, Exception):
+                self.logger.error(f"Update search for {topic} failed: {results}")
+                continue
             for result in results:
                 result["topic"] = topic
                 all_results.append(result)
@@ -403,18 +715,18 @@ class WebTools:
         # Basic search
         search_results = await self.web_search(f"{topic} comprehensive guide", num_results=10)
         
-        # Fetch content from top results
-        content_results = []
-        for result in search_results[:5]:  # Limit to top 5 for performance
-            content = await self.fetch_url_content(result["url"])
-            content_results.append(content)
+        # Fetch content from top results concurrently
+        content_results = await asyncio.gather(
+            *(self.fetch_url_content(result["url"]) for result in search_results[:5]),  # Limit to top 5 for performance
+            return_exceptions=True
+        )
         
         # Combine all content
         combined_content = ""
         sources = []
         
         for content in content_results:
-            if content["type"] != "error":
+            if not isinstance(content, Exception) and content["type"] != "error":
                 combined_content += f"\n\n--- {content['title']} ---\n{content['content']}"
                 sources.append({
                     "title": content["title"],
@@ -435,6 +747,10 @@ class WebTools:
             "search_results": search_results
         }
 
+def parse_file(source: Union[str, BinaryIO]) -> Dict:
+    """Module-level file parser, picklable for use in process pools"""
+    return WebTools().parse_file(source)
+
 # Example usage
 async def main():
     async with WebTools() as web_tools:
@@ -2,40 +2,136 @@
 import os
 import asyncio
 import json
-from typing import Dict, Any, List, Optional
+import time
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+import httpx
 import openai
 import anthropic
 import google.generativeai as genai
-from datetime import datetime
+
+# Connection pool shared by every HTTP-based provider client
+API_TIMEOUT = 30
+API_MAX_KEEPALIVE = 20
+API_MAX_CONNECTIONS = 100
+
+_TASK_TYPES = (None, "coding", "creative", "analysis", "vision", "multilingual")
+_COMPLEXITIES = ("simple", "medium", "complex")
+# Position of each (task_type, complexity) pair in a model's score row
+_SCORE_SLOTS = {
+    (task_type, complexity): index
+    for index, (task_type, complexity) in enumerate(
+        (t, c) for t in _TASK_TYPES for c in _COMPLEXITIES
+    )
+}
+
+def _base_score(model_name: str, strengths: List[str], speed: str, task_type: Optional[str], complexity: str) -> int:
+    """Budget-independent part of a model's score for one task/complexity pair"""
+    score = 0
+    
+    # Task-specific scoring
+    if task_type == "coding":
+        if "coding" in strengths:
+            score += 30
+        if "reasoning" in strengths:
+            score += 20
+        if model_name in ["copilot", "gpt-4", "claude-3-sonnet"]:
+            score += 15
+    
+    elif task_type == "creative":
+        if "creative" in strengths:
+            score += 30
+        if model_name in ["claude-3-opus", "gpt-4"]:
+            score += 20
+    
+    elif task_type == "analysis":
+        if "analysis" in strengths:
+            score += 30
+        if "reasoning" in strengths:
+            score += 20
+    
+    elif task_type == "vision":
+        if "vision" in strengths or "multimodal" in strengths:
+            score += 40
+    
+    elif task_type == "multilingual":
+        if "multilingual" in strengths:
+            score += 30
+        if model_name in ["gemini-pro", "gpt-4"]:
+            score += 15
+    
+    # Complexity scoring
+    if complexity == "simple":
+        if "cost-effective" in strengths:
+            score += 15
+        if speed == "fast":
+            score += 10
+    elif complexity == "complex":
+        if model_name in ["gpt-4", "claude-3-opus"]:
+            score += 20
+    
+    return score
+
+@lru_cache(maxsize=128)
+def _score_models(models_key: Tuple, task_type: str, complexity: str, budget: float) -> Optional[str]:
+    """Pick the best model for a task; models_key holds (name, score row, cost) per model"""
+    task_key = task_type if task_type in _TASK_TYPES else None
+    complexity_key = complexity if complexity in _COMPLEXITIES else "medium"
+    slot = _SCORE_SLOTS[(task_key, complexity_key)]
+    
+    # First model wins ties, matching registration order
+    best_model = max(
+        models_key,
+        key=lambda entry: entry[1][slot] + (10 if entry[2] <= budget else -20)
+    )
+    return best_model[0]
 
 class EnhancedMultiModelRouter:
     def __init__(self):
         # Initialize all available models
         self.models = {}
+        self._score_table = {}
+        self._models_key = ()
+        self._dispatch = {
+            "openai": self._call_openai,
+            "anthropic": self._call_anthropic,
+            "gemini": self._call_gemini
+        }
         self.initialize_models()
         
     def initialize_models(self):
         """Initialize all available AI models"""
         
+        # One pool for all providers so TLS sessions and DNS lookups are reused
+        self._http = httpx.AsyncClient(
+            http2=True,
+            timeout=API_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=API_MAX_KEEPALIVE, max_connections=API_MAX_CONNECTIONS)
+        )
+        
         # OpenAI Models
         if os.getenv("OPENAI_API_KEY"):
+            openai_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=self._http)
             self.models.update({
                 "gpt-4": {
-                    "client": openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY")),
+                    "client": openai_client,
+                    "provider": "openai",
                     "model_name": "gpt-4",
                     "strengths": ["reasoning", "coding", "analysis"],
                     "cost": 0.03,
                     "speed": "medium"
                 },
                 "gpt-4-turbo": {
-                    "client": openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY")),
+                    "client": openai_client,
+                    "provider": "openai",
                     "model_name": "gpt-4-turbo-preview",
                     "strengths": ["reasoning", "coding", "analysis", "speed"],
                     "cost": 0.01,
                     "speed": "fast"
                 },
                 "gpt-3.5-turbo": {
-                    "client": openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY")),
+                    "client": openai_client,
+                    "provider": "openai",
                     "model_name": "gpt-3.5-turbo",
                     "strengths": ["speed", "cost-effective", "general"],
                     "cost": 0.002,
@@ -45,23 +141,27 @@ class EnhancedMultiModelRouter:
         
         # Claude Models
         if os.getenv("ANTHROPIC_API_KEY"):
+            anthropic_client = anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=self._http)
             self.models.update({
                 "claude-3-opus": {
-                    "client": anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY")),
+                    "client": anthropic_client,
+                    "provider": "anthropic",
                     "model_name": "claude-3-opus-20240229",
                     "strengths": ["creative", "analysis", "safety", "reasoning"],
                     "cost": 0.075,
                     "speed": "slow"
                 },
                 "claude-3-sonnet": {
-                    "client": anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY")),
+                    "client": anthropic_client,
+                    "provider": "anthropic",
                     "model_name": "claude-3-sonnet-20240229",
                     "strengths": ["balanced", "coding", "analysis"],
                     "cost": 0.015,
                     "speed": "medium"
                 },
                 "claude-3-haiku": {
-                    "client": anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY")),
+                    "client": anthropic_client,
+                    "provider": "anthropic",
                     "model_name": "claude-3-haiku-20240307",
                     "strengths": ["speed", "cost-effective"],
                     "cost": 0.0025,
@@ -75,6 +175,7 @@ class EnhancedMultiModelRouter:
             self.models.update({
                 "gemini-pro": {
                     "client": genai,
+                    "provider": "gemini",
                     "model_name": "gemini-pro",
                     "strengths": ["multimodal", "reasoning", "multilingual"],
                     "cost": 0.0005,
@@ -82,6 +183,7 @@ class EnhancedMultiModelRouter:
                 },
                 "gemini-pro-vision": {
                     "client": genai,
+                    "provider": "gemini",
                     "model_name": "gemini-pro-vision",
                     "strengths": ["vision", "multimodal", "analysis"],
                     "cost": 0.0025,
@@ -93,10 +195,12 @@ class EnhancedMultiModelRouter:
         if os.getenv("COPILOT_API_KEY"):
             self.models.update({
                 "copilot": {
-                    "client": openai.OpenAI(
+                    "client": openai.AsyncOpenAI(
                         api_key=os.getenv("COPILOT_API_KEY"),
-                        base_url="https://api.githubcopilot.com/chat/completions"
+                        base_url="https://api.githubcopilot.com/chat/completions",
+                        http_client=self._http
                     ),
+                    "provider": "openai",
                     "model_name": "gpt-4",
                     "strengths": ["coding", "development", "github"],
                     "cost": 0.02,
@@ -108,16 +212,35 @@ class EnhancedMultiModelRouter:
         if os.getenv("ZENCODER_API_KEY"):
             self.models.update({
                 "zencoder": {
-                    "client": openai.OpenAI(
+                    "client": openai.AsyncOpenAI(
                         api_key=os.getenv("ZENCODER_API_KEY"),
-                        base_url=os.getenv("ZENCODER_BASE_URL", "https://api.zencoder.ai/v1")
+                        base_url=os.getenv("ZENCODER_BASE_URL", "https://api.zencoder.ai/v1"),
+                        http_client=self._http
                     ),
+                    "provider": "openai",
                     "model_name": "zencoder-v1",
                     "strengths": ["specialized", "custom"],
                     "cost": 0.01,
                     "speed": "medium"
                 }
             })
+        
+        self._build_score_table()
+
+    def _build_score_table(self):
+        """Precompute every model's score row so selection is one lookup per model"""
+        self._score_table = {
+            name: tuple(
+                _base_score(name, info["strengths"], info["speed"], task_type, complexity)
+                for task_type, complexity in _SCORE_SLOTS
+            )
+            for name, info in self.models.items()
+        }
+        # Hashable snapshot of what model selection depends on
+        self._models_key = tuple(
+            (name, self._score_table[name], info["cost"])
+            for name, info in self.models.items()
+        )
 
     def select_best_model(self, task_type: str, complexity: str = "medium", budget: float = 1.0) -> str:
         """Select the best model based on task requirements"""
@@ -125,63 +248,8 @@ class EnhancedMultiModelRouter:
         if not self.models:
             return None
         
-        scores = {}
-        
-        for model_name, model_info in self.models.items():
-            score = 0
-            
-            # Task-specific scoring
-            if task_type == "coding":
-                if "coding" in model_info["strengths"]:
-                    score += 30
-                if "reasoning" in model_info["strengths"]:
-                    score += 20
-                if model_name in ["copilot", "gpt-4", "claude-3-sonnet"]:
-                    score += 15
-            
-            elif task_type == "creative":
-                if "creative" in model_info["strengths"]:
-                    score += 30
-                if model_name in ["claude-3-opus", "gpt-4"]:
-                    score += 20
-            
-            elif task_type == "analysis":
-                if "analysis" in model_info["strengths"]:
-                    score += 30
-                if "reasoning" in model_info["strengths"]:
-                    score += 20
-            
-            elif task_type == "vision":
-                if "vision" in model_info["strengths"] or "multimodal" in model_info["strengths"]:
-                    score += 40
-            
-            elif task_type == "multilingual":
-                if "multilingual" in model_info["strengths"]:
-                    score += 30
-                if model_name in ["gemini-pro", "gpt-4"]:
-                    score += 15
-            
-            # Complexity scoring
-            if complexity == "simple":
-                if "cost-effective" in model_info["strengths"]:
-                    score += 15
-                if model_info["speed"] == "fast":
-                    score += 10
-            elif complexity == "complex":
-                if model_name in ["gpt-4", "claude-3-opus"]:
-                    score += 20
-            
-            # Budget consideration
-            if model_info["cost"] <= budget:
-                score += 10
-            else:
-                score -= 20
-            
-            scores[model_name] = score
-        
-        # Return best model
-        best_model = max(scores.items(), key=lambda x: x[1])
-        return best_model[0]
+        # The answer only depends on the model set and the arguments, so it is memoized
+        return _score_models(self._models_key, task_type, complexity, budget)
 
     async def generate_response(self, prompt: str, model_name: str = None, task_type: str = "general") -> Dict[str, Any]:
         """Generate response using specified or best model"""
@@ -193,41 +261,16 @@ class EnhancedMultiModelRouter:
             return {"error": "No suitable model available"}
         
         model_info = self.models[model_name]
-        start_time = datetime.now()
+        start_time = time.perf_counter()
+        
+        handler = self._dispatch.get(model_info.get("provider"))
+        if handler is None:
+            return {"error": f"Unsupported model type: {model_name}"}
         
         try:
-            if "openai" in str(type(model_info["client"])) or model_name in ["copilot", "zencoder"]:
-                # OpenAI-compatible models
-                response = model_info["client"].chat.completions.create(
-                    model=model_info["model_name"],
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.7,
-                    max_tokens=2000
-                )
-                content = response.choices[0].message.content
-                tokens_used = response.usage.total_tokens if hasattr(response, 'usage') else 0
-            
-            elif "anthropic" in str(type(model_info["client"])):
-                # Claude models
-                response = model_info["client"].messages.create(
-                    model=model_info["model_name"],
-                    max_tokens=2000,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                content = response.content[0].text
-                tokens_used = response.usage.input_tokens + response.usage.output_tokens
+            content, tokens_used = await handler(prompt, model_info)
             
-            elif "google" in str(model_info["client"].__name__):
-                # Gemini models
-                model = model_info["client"].GenerativeModel(model_info["model_name"])
-                response = model.generate_content(prompt)
-                content = response.text
-                tokens_used = 0  # Gemini doesn't provide token count
-            
-            else:
-                return {"error": f"Unsupported model type: {model_name}"}
-            
-            execution_time = (datetime.now() - start_time).total_seconds()
+            execution_time = time.perf_counter() - start_time
             cost = tokens_used * model_info["cost"] / 1000
             
             return {
@@ -246,6 +289,32 @@ class EnhancedMultiModelRouter:
                 "success": False
             }
 
+    async def _call_openai(self, prompt: str, model_info: Dict[str, Any]) -> Tuple[str, int]:
+        """OpenAI-compatible models (OpenAI, Copilot, Zencoder)"""
+        response = await model_info["client"].chat.completions.create(
+            model=model_info["model_name"],
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=2000
+        )
+        tokens_used = response.usage.total_tokens if hasattr(response, 'usage') else 0
+        return response.choices[0].message.content, tokens_used
+
+    async def _call_anthropic(self, prompt: str, model_info: Dict[str, Any]) -> Tuple[str, int]:
+        """Claude models"""
+        response = await model_info["client"].messages.create(
+            model=model_info["model_name"],
+            max_tokens=2000,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.content[0].text, response.usage.input_tokens + response.usage.output_tokens
+
+    async def _call_gemini(self, prompt: str, model_info: Dict[str, Any]) -> Tuple[str, int]:
+        """Gemini models"""
+        model = model_info["client"].GenerativeModel(model_info["model_name"])
+        response = await model.generate_content_async(prompt)
+        return response.text, 0  # Gemini doesn't provide token count
+
     def get_available_models(self) -> List[str]:
         """Get list of available models"""
         return list(self.models.keys())
@@ -254,6 +323,10 @@ class EnhancedMultiModelRouter:
         """Get information about a specific model"""
         return self.models.get(model_name, {})
 
+    async def aclose(self):
+        """Close the connection pool shared by the provider clients"""
+        await self._http.aclose()
+
 # Usage example
 async def main():
     router = EnhancedMultiModelRouter()
@@ -269,12 +342,16 @@ async def main():
         ("Translate 'Hello world' to Spanish", "multilingual")
     ]
     
-    for prompt, task_type in test_prompts:
+    # Fire all prompts concurrently, then print in order
+    results = await asyncio.gather(*[
+        router.generate_response(prompt, task_type=task_type)
+        for prompt, task_type in test_prompts
+    ])
+    
+    for (prompt, task_type), result in zip(test_prompts, results):
         print(f"\n📝 Task: {prompt}")
         print(f"🎯 Type: {task_type}")
         
-        result = await router.generate_response(prompt, task_type=task_type)
-        
         if result.get("success"):
             print(f"🤖 Model: {result['model_used']}")
             print(f"⏱️ Time: {result['execution_time']:.2f}s")
@@ -282,6 +359,8 @@ async def main():
             print(f"📄 Response: {result['response'][:200]}...")
         else:
             print(f"❌ Error: {result.get('error')}")
+    
+    await router.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
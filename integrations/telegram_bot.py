@@ -1,7 +1,9 @@
 # integrations/telegram_bot.py
 import asyncio
+import hmac
 import logging
 import os
+import sqlite3
 from typing import Dict, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -9,14 +11,123 @@ from telegram.ext import (
     CallbackQueryHandler, ContextTypes, filters
 )
 import json
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Recent turns kept per user; older ones are folded into a short text summary
+HISTORY_LIMIT = 50
+CONTEXT_SUMMARY_CHARS = 2000
+
+# Sessions kept in memory: least recently active users go first, idle ones expire
+SESSION_CACHE_SIZE = 10_000
+SESSION_TTL = 3600
+# Evicted session dicts kept around for reuse by new users
+SESSION_POOL_SIZE = 512
+
+# Conversation turns persisted across restarts; /start reloads the most recent ones
+SESSION_DB_PATH = os.getenv("TELEGRAM_SESSION_DB", "telegram_sessions.db")
+HISTORY_HYDRATE = 20
+
+# Streamed replies are shown by editing one message, at most this often (Telegram rate-limits edits)
+STREAM_EDIT_INTERVAL = 0.8
+
+# /start reply, built once rather than per command
+_WELCOME_TMPL = """🤖 **Welcome {username}!**
+
+I'm your advanced multimodal AI assistant. I can:
+• 💬 Chat and answer questions
+• 🔍 Search the web
+• 💻 Help with coding
+• 🌐 Translate languages
+• 📄 Analyze documents
+• 🎵 Process voice messages
+
+Send me a message to get started! 🚀"""
+
+_HELP_TEXT = """🤖 **Commands**
+
+/start - Start a conversation
+/help - Show this help
+/settings - Show and change your preferences
+/stats - Show your session statistics
+/clear - Forget this conversation
+
+You can also send voice messages, photos (add a caption to ask about them) and documents."""
+
+_MODE_REPLIES = {
+    "mode_search": "🔍 Send me what to search for, e.g. \"search latest AI news\".",
+    "mode_code": "💻 Describe the code you need, or paste code to debug."
+}
+
+_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔍 Web Search", callback_data="mode_search")],
+    [InlineKeyboardButton("💻 Code Help", callback_data="mode_code")],
+    [InlineKeyboardButton("⚙️ Settings", callback_data="settings")]
+])
+
+class SessionCache:
+    """LRU of user sessions whose entries also expire after SESSION_TTL seconds idle"""
+    
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE, ttl: float = SESSION_TTL, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+    
+    def _live(self, user_id: int) -> Optional[Dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[user_id]
+            if self.on_evict:
+                self.on_evict(entry[1])
+            return None
+        return entry[1]
+    
+    def __contains__(self, user_id: int) -> bool:
+        return self._live(user_id) is not None
+    
+    def __getitem__(self, user_id: int) -> Dict:
+        session = self._live(user_id)
+        if session is None:
+            raise KeyError(user_id)
+        # Any access counts as activity
+        self._entries[user_id] = (time.monotonic() + self.ttl, session)
+        self._entries.move_to_end(user_id)
+        return session
+    
+    def __setitem__(self, user_id: int, session: Dict):
+        self._entries[user_id] = (time.monotonic() + self.ttl, session)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            if self.on_evict:
+                self.on_evict(evicted)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
 class TelegramBot:
-    def __init__(self, token: str, agent_callback):
+    def __init__(self, token: str, agent_callback, stream_callback=None):
         self.token = token
         self.agent_callback = agent_callback
+        # Optional: takes the same input as agent_callback and yields the reply in pieces
+        self.stream_callback = stream_callback
         self.application = Application.builder().token(token).build()
-        self.user_sessions = {}
+        self._webhook_secret: Optional[str] = None
+        # sqlite3 connections are single-threaded, so every DB call goes through one worker
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="telegram-db")
+        self._db: Optional[sqlite3.Connection] = None
+        self._session_pool = deque(maxlen=SESSION_POOL_SIZE)
+        self.user_sessions = SessionCache(on_evict=self._recycle_session)
         self.logger = logging.getLogger("TelegramBot")
         
         # Setup handlers
@@ -43,37 +154,145 @@ class TelegramBot:
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
-        user_id = update.effective_user.id
         username = update.effective_user.username or update.effective_user.first_name
+        await self._open_session(update.effective_user.id, username)
         
-        # Initialize user session
-        self.user_sessions[user_id] = {
-            "username": username,
-            "conversation_history": [],
-            "preferences": {"language": "en", "voice_enabled": True},
-            "created_at": datetime.now().isoformat()
-        }
+        await update.message.reply_text(_WELCOME_TMPL.format(username=username), reply_markup=_KEYBOARD, parse_mode='Markdown')
+
+    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /help command"""
+        await update.message.reply_text(_HELP_TEXT, parse_mode='Markdown')
+
+    async def settings_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /settings command"""
+        session = await self._session_for(update)
+        text, keyboard = self._settings_view(session)
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /stats command"""
+        session = await self._session_for(update)
+        await update.message.reply_text(
+            f"📊 **Your session**\n"
+            f"Messages: {len(session['conversation_history'])}\n"
+            f"Started: {session['created_at']}\n"
+            f"Language: {session['preferences']['language']}",
+            parse_mode='Markdown'
+        )
+
+    async def clear_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /clear command: forget the conversation in memory and on disk"""
+        user_id = update.effective_user.id
+        session = await self._session_for(update)
+        session["conversation_history"].clear()
+        session["context_summary"] = ""
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._db_executor, self._delete_turns, user_id)
+        except Exception as e:
+            self.logger.error(f"Error clearing conversation history: {e}")
+        await update.message.reply_text("🧹 Conversation cleared.")
+
+    async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle voice messages: the agent transcribes them and answers the text"""
+        audio = await self._download(update.message.voice)
+        await self._reply_media(update, context, audio, "speech")
+
+    async def handle_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle photos: the caption, if any, is the question about the image"""
+        # Telegram sends several sizes; the last is the largest
+        image = await self._download(update.message.photo[-1])
+        await self._reply_media(update, context, image, "image", text=update.message.caption or "")
+
+    async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle documents: parsed by the agent's web tools, then analyzed"""
+        document = update.message.document
+        data = await self._download(document)
+        await self._reply_media(update, context, data, "document", filename=document.file_name or "document")
+
+    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle inline keyboard buttons"""
+        query = update.callback_query
+        await query.answer()
+        session = await self._session_for(update)
         
-        welcome_message = f"""🤖 **Welcome {username}!**
+        if query.data == "settings":
+            text, keyboard = self._settings_view(session)
+            await query.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        elif query.data == "toggle_voice":
+            # Redraw the settings message in place with the new value
+            session["preferences"]["voice_enabled"] = not session["preferences"]["voice_enabled"]
+            text, keyboard = self._settings_view(session)
+            await query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        elif query.data in _MODE_REPLIES:
+            await query.message.reply_text(_MODE_REPLIES[query.data])
 
-I'm your advanced multimodal AI assistant. I can:
-• 💬 Chat and answer questions
-• 🔍 Search the web
-• 💻 Help with coding
-• 🌐 Translate languages
-• 📄 Analyze documents
-• 🎵 Process voice messages
+    @staticmethod
+    def _settings_view(session: Dict):
+        preferences = session["preferences"]
+        voice = "on" if preferences["voice_enabled"] else "off"
+        text = f"⚙️ **Settings**\nLanguage: {preferences['language']}\nVoice replies: {voice}"
+        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton(f"🎵 Voice replies: {voice}", callback_data="toggle_voice")]])
+        return text, keyboard
 
-Send me a message to get started! 🚀"""
+    @staticmethod
+    async def _download(attachment) -> bytes:
+        telegram_file = await attachment.get_file()
+        return bytes(await telegram_file.download_as_bytearray())
+
+    async def _reply_media(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data: bytes, input_type: str, **fields):
+        """Run a voice/photo/document message through the agent and reply with the answer"""
+        user_id = update.effective_user.id
+        await self._session_for(update)
+        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
+        response = await self.process_with_agent(user_id, data, input_type, **fields)
+        try:
+            await update.message.reply_text(response, parse_mode='Markdown')
+        except Exception:
+            # Model output isn't always valid Markdown
+            await update.message.reply_text(response)
+
+    async def _session_for(self, update: Update) -> Dict:
+        """The user's session, rebuilt silently if it expired"""
+        user_id = update.effective_user.id
+        if user_id in self.user_sessions:
+            return self.user_sessions[user_id]
+        username = update.effective_user.username or update.effective_user.first_name
+        return await self._open_session(user_id, username)
+
+    async def _open_session(self, user_id: int, username: str) -> Dict:
+        """Create the user's session and hydrate it with their persisted turns"""
+        # Initialize user session, reusing an evicted one when available
+        if self._session_pool:
+            session = self._session_pool.pop()
+            session["preferences"]["language"] = "en"
+            session["preferences"]["voice_enabled"] = True
+        else:
+            session = {
+                "conversation_history": deque(maxlen=HISTORY_LIMIT),
+                "preferences": {"language": "en", "voice_enabled": True}
+            }
+        session["username"] = username
+        session["context_summary"] = ""
+        session["created_at"] = datetime.now().isoformat()
         
-        keyboard = [
-            [InlineKeyboardButton("🔍 Web Search", callback_data="mode_search")],
-            [InlineKeyboardButton("💻 Code Help", callback_data="mode_code")],
-            [InlineKeyboardButton("⚙️ Settings", callback_data="settings")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # Pick up where the user left off before an eviction or restart
+        try:
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(self._db_executor, self._load_turns, user_id, HISTORY_HYDRATE)
+            session["conversation_history"].extend(
+                {"input": input_text, "response": response, "type": input_type, "timestamp_ns": ts_ns}
+                for ts_ns, input_type, input_text, response in reversed(rows)
+            )
+        except Exception as e:
+            self.logger.error(f"Error loading conversation history: {e}")
         
-        await update.message.reply_text(welcome_message, reply_markup=reply_markup, parse_mode='Markdown')
+        self.user_sessions[user_id] = session
+        return session
+
+    def _recycle_session(self, session: Dict):
+        """Clear an evicted session and keep it for the next new user"""
+        session["conversation_history"].clear()
+        self._session_pool.append(session)
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle text messages"""
@@ -81,38 +300,138 @@ Send me a message to get started! 🚀"""
         message_text = update.message.text
         
         if user_id not in self.user_sessions:
-            await self.start_command(update, context)
-            return
+            # An expired session is rebuilt silently; only a user with no history gets the welcome
+            username = update.effective_user.username or update.effective_user.first_name
+            session = await self._open_session(user_id, username)
+            if not session["conversation_history"]:
+                await update.message.reply_text(_WELCOME_TMPL.format(username=username), reply_markup=_KEYBOARD, parse_mode='Markdown')
+                return
         
         await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
         
         try:
-            response = await self.process_with_agent(user_id, message_text, "text")
-            await update.message.reply_text(response, parse_mode='Markdown')
+            if self.stream_callback:
+                await self.stream_with_agent(update, user_id, message_text)
+            else:
+                response = await self.process_with_agent(user_id, message_text, "text")
+                await update.message.reply_text(response, parse_mode='Markdown')
         except Exception as e:
             self.logger.error(f"Error processing message: {e}")
             await update.message.reply_text("Sorry, I encountered an error. Please try again.")
 
-    async def process_with_agent(self, user_id: int, input_data, input_type: str) -> str:
+    async def process_with_agent(self, user_id: int, input_data, input_type: str, **fields) -> str:
         """Process input through the AI agent"""
         try:
-            agent_input = {"text": input_data, "type": input_type}
-            response = await self.agent_callback(agent_input)
-            
-            # Update conversation history
-            user_session = self.user_sessions[user_id]
-            user_session["conversation_history"].append({
-                "input": str(input_data)[:100],
-                "response": response[:100],
-                "type": input_type,
-                "timestamp": datetime.now().isoformat()
-            })
-            
+            response = await self.agent_callback(self._agent_input(user_id, input_data, input_type, **fields))
+            self._record_turn(user_id, input_data, input_type, response)
             return response
         except Exception as e:
             self.logger.error(f"Agent processing error: {e}")
             return "I encountered an error processing your request."
 
+    async def stream_with_agent(self, update: Update, user_id: int, message_text: str):
+        """Reply with one message that is edited as the agent's response streams in"""
+        message = await update.message.reply_text("…")
+        parts = []
+        shown = "…"
+        last_edit = time.monotonic()
+        
+        async for piece in self.stream_callback(self._agent_input(user_id, message_text, "text")):
+            parts.append(piece)
+            # Coalesce pieces so edits stay under Telegram's rate limit
+            if time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL:
+                text = "".join(parts)
+                if text.strip() and text != shown:
+                    await message.edit_text(text)
+                    shown = text
+                last_edit = time.monotonic()
+        
+        response = "".join(parts) or "I encountered an error processing your request."
+        try:
+            await message.edit_text(response, parse_mode='Markdown')
+        except Exception:
+            # Model output isn't always valid Markdown; keep the plain text if it's already shown
+            if response != shown:
+                await message.edit_text(response)
+        
+        self._record_turn(user_id, message_text, "text", response)
+
+    def _agent_input(self, user_id: int, input_data, input_type: str, **fields) -> Dict:
+        # Voice/photo/document payloads are bytes, which the agent reads from "data"
+        key = "data" if isinstance(input_data, (bytes, bytearray)) else "text"
+        agent_input = {key: input_data, "type": input_type, **fields}
+        if user_id in self.user_sessions and self.user_sessions[user_id]["context_summary"]:
+            agent_input["context"] = self.user_sessions[user_id]["context_summary"]
+        return agent_input
+
+    def _record_turn(self, user_id: int, input_data, input_type: str, response: str):
+        """Append a turn to the user's history, summarizing the turn that falls out"""
+        # The session may have been evicted (and recycled) while the agent ran
+        if user_id not in self.user_sessions:
+            return
+        user_session = self.user_sessions[user_id]
+        
+        history = user_session["conversation_history"]
+        if len(history) == history.maxlen:
+            old = history.popleft()
+            summary = user_session["context_summary"] + f"{old['input']}→{old['response'][:40]}\n"
+            user_session["context_summary"] = summary[-CONTEXT_SUMMARY_CHARS:]
+        turn = {
+            # Voice/photo payloads are bytes; record their size rather than repr-ing the whole buffer
+            "input": f"<{input_type}: {len(input_data)} bytes>" if isinstance(input_data, (bytes, bytearray)) else str(input_data)[:100],
+            "response": response[:100],
+            "type": input_type,
+            "timestamp_ns": time.time_ns()
+        }
+        history.append(turn)
+        
+        # Persist in the background; the reply doesn't wait on the disk
+        future = asyncio.get_running_loop().run_in_executor(self._db_executor, self._save_turn, user_id, turn)
+        future.add_done_callback(self._log_db_error)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the session database on the DB thread, creating the schema on first use"""
+        if self._db is None:
+            self._db = sqlite3.connect(SESSION_DB_PATH, check_same_thread=False)
+            # WAL makes each turn a sequential append; NORMAL skips the fsync per commit
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages "
+                "(user_id INTEGER, ts_ns INTEGER, type TEXT, input TEXT, response TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS messages_user_ts ON messages (user_id, ts_ns DESC)")
+        return self._db
+
+    def _save_turn(self, user_id: int, turn: Dict):
+        db = self._connect()
+        with db:
+            db.execute(
+                "INSERT INTO messages VALUES (?, ?, ?, ?, ?)",
+                (user_id, turn["timestamp_ns"], turn["type"], turn["input"], turn["response"])
+            )
+            # Same retention as the in-memory deque: only the newest HISTORY_LIMIT turns per user
+            db.execute(
+                "DELETE FROM messages WHERE user_id = ? AND rowid NOT IN "
+                "(SELECT rowid FROM messages WHERE user_id = ? ORDER BY ts_ns DESC LIMIT ?)",
+                (user_id, user_id, HISTORY_LIMIT)
+            )
+
+    def _load_turns(self, user_id: int, limit: int) -> list:
+        return self._connect().execute(
+            "SELECT ts_ns, type, input, response FROM messages WHERE user_id = ? ORDER BY ts_ns DESC LIMIT ?",
+            (user_id, limit)
+        ).fetchall()
+
+    def _delete_turns(self, user_id: int):
+        db = self._connect()
+        with db:
+            db.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+
+    def _log_db_error(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.logger.error(f"Error saving conversation turn: {future.exception()}")
+
     async def start_bot(self):
         """Start the Telegram bot"""
         self.logger.info("Starting Telegram bot...")
@@ -121,8 +440,41 @@ Send me a message to get started! 🚀"""
         await self.application.updater.start_polling()
         self.logger.info("Telegram bot started successfully!")
 
+    async def start_bot_webhook(self, url: str, secret_token: str):
+        """Start the bot with Telegram pushing updates to url instead of long polling"""
+        self.logger.info("Starting Telegram bot (webhook)...")
+        await self.application.initialize()
+        await self.application.start()
+        await self.application.bot.set_webhook(
+            url=url,
+            secret_token=secret_token,
+            allowed_updates=["message", "callback_query"]
+        )
+        self._webhook_secret = secret_token
+        self.logger.info("Telegram bot webhook set to %s", url)
+
+    async def handle_webhook(self, body: bytes, secret_token: str) -> bool:
+        """Queue a pushed update; returns False if the request didn't come from Telegram"""
+        if not self._webhook_secret or not hmac.compare_digest(secret_token, self._webhook_secret):
+            return False
+        data = orjson.loads(body) if orjson is not None else json.loads(body)
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+        return True
+
     async def stop_bot(self):
         """Stop the Telegram bot"""
-        await self.application.updater.stop()
-        await self.application.stop()
-        await self.application.shutdown()
\ No newline at end of file
+        # The bot is built whenever a token is set, but only started in telegram/all modes
+        if self.application.updater and self.application.updater.running:
+            await self.application.updater.stop()
+        if self.application.running:
+            await self.application.stop()
+        await self.application.shutdown()
+        
+        # Let queued turn writes finish, then close the database on its own thread
+        await asyncio.get_running_loop().run_in_executor(self._db_executor, self._close_db)
+        self._db_executor.shutdown(wait=True)
+
+    def _close_db(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -1,23 +1,72 @@
 # main.py - Main entry point for the Multimodal AI Agent
 import asyncio
+import hashlib
+import importlib.util
+import io
 import logging
 import os
+import secrets
+import signal
 import sys
+import time
 from pathlib import Path
 import argparse
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Any, Optional
 
 # Add project root to path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+from core import log_listener
 from core.multimodal_agent import MultimodalAIAgent
-from core.web_tools import WebTools
+from core.web_tools import WebTools, parse_file
 from core.voice_assistant import VoiceAssistant, VoiceCommandProcessor
 from integrations.telegram_bot import TelegramBot
 from api.fastapi_server import create_app
+from fastapi import Request, Response
 import uvicorn
 
+# Exact-match cache of text replies; set RESPONSE_CACHE_SIZE=0 to always ask the model
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+# Used when the agent config has no performance.caching.ttl
+RESPONSE_CACHE_TTL = 3600
+
+# Per-component limit so one stuck dependency can't stall the health check
+HEALTH_PROBE_TIMEOUT = 2.0
+
+# Open connections past this get a 503 instead of queueing behind the GPU semaphore
+API_LIMIT_CONCURRENCY = int(os.getenv("API_LIMIT_CONCURRENCY", "256"))
+
+_HELP_TEXT = """
+🤖 **AI Agent Commands:**
+
+**Basic Commands:**
+- Just type your message to chat with the AI
+- 'help' - Show this help
+- 'quit' or 'exit' - Exit the program
+- 'stats' - Show session statistics
+
+**Special Commands:**
+- 'search <query>' - Web search
+- 'voice' - Test voice system (if available)
+
+**Examples:**
+- "Write a Python function to sort a list"
+- "search latest AI news"
+- "translate hello to Spanish"
+- "explain quantum computing"
+
+**Features Available:**
+✅ Multi-LLM routing (GPT-4, Claude, Gemini, etc.)
+✅ Web search and content analysis
+✅ Code generation and debugging
+✅ Language translation
+✅ Document processing
+✅ Voice interaction (if configured)
+✅ Telegram bot (if token provided)
+        """
+
 class AIAgentOrchestrator:
     """Main orchestrator for the AI Agent system"""
     
@@ -28,6 +77,17 @@ class AIAgentOrchestrator:
         self.voice_assistant = None
         self.telegram_bot = None
         self.api_server = None
+        self._stop = asyncio.Event()
+        # Prompt key -> (expiry on the monotonic clock, reply)
+        self._resp_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._resp_ttl = RESPONSE_CACHE_TTL
+        # Input type -> handler; unknown types fall back to _handle_default
+        self._dispatch = {
+            "text": self._handle_text,
+            "speech": self._handle_multimodal,
+            "image": self._handle_multimodal,
+            "document": self._handle_document
+        }
         
         # Setup logging
         self.setup_logging()
@@ -38,22 +98,26 @@ class AIAgentOrchestrator:
         # Create logs directory
         os.makedirs("logs", exist_ok=True)
         
-        # Configure logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('logs/main.log'),
-                logging.StreamHandler(sys.stdout)
-            ]
-        )
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handlers = [
+            logging.FileHandler('logs/main.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        
+        # Log calls only enqueue; the shared listener thread does the file and console writes
+        logging.basicConfig(level=logging.INFO, handlers=[log_listener.queue_handler(*handlers)])
 
     async def initialize_agent(self):
         """Initialize the main AI agent"""
         self.logger.info("Initializing Multimodal AI Agent...")
         
         try:
-            self.agent = MultimodalAIAgent(self.config_path)
+            self.agent = await MultimodalAIAgent.create(self.config_path)
+            self._resp_ttl = self.agent.config.get("performance", {}).get("caching", {}).get(
+                "ttl", RESPONSE_CACHE_TTL
+            )
             self.logger.info("✅ AI Agent initialized successfully")
             return True
         except Exception as e:
@@ -65,7 +129,9 @@ class AIAgentOrchestrator:
         self.logger.info("Initializing Web Tools...")
         
         try:
+            # One pooled session for the orchestrator's lifetime, closed in shutdown()
             self.web_tools = WebTools()
+            await self.web_tools.__aenter__()
             self.logger.info("✅ Web Tools initialized successfully")
             return True
         except Exception as e:
@@ -77,13 +143,17 @@ class AIAgentOrchestrator:
         self.logger.info("Initializing Voice Assistant...")
         
         try:
-            self.voice_assistant = VoiceAssistant(
+            # Loading the speech models blocks, so do it off the event loop
+            self.voice_assistant = await asyncio.to_thread(
+                VoiceAssistant,
                 wake_word="hey assistant",
                 language="en"
             )
             
             # Set up command processor
-            command_processor = VoiceCommandProcessor(self.process_agent_request)
+            command_processor = VoiceCommandProcessor(
+                lambda text: self.process_agent_request({"text": text, "type": "text"})
+            )
             self.voice_assistant.set_response_callback(command_processor.process_command)
             
             self.logger.info("✅ Voice Assistant initialized successfully")
@@ -103,7 +173,7 @@ class AIAgentOrchestrator:
         self.logger.info("Initializing Telegram Bot...")
         
         try:
-            self.telegram_bot = TelegramBot(telegram_token, self.process_agent_request)
+            self.telegram_bot = TelegramBot(telegram_token, self.process_agent_request, self.stream_agent_request)
             self.logger.info("✅ Telegram Bot initialized successfully")
             return True
         except Exception as e:
@@ -116,58 +186,145 @@ class AIAgentOrchestrator:
             if not self.agent:
                 return "AI Agent not initialized"
             
-            input_type = input_data.get("type", "text")
-            
-            if input_type == "text":
-                response = await self.agent.process_text_input(input_data["text"])
-            elif input_type == "speech":
-                response = await self.agent.process_multimodal_input(input_data)
-            elif input_type == "image":
-                response = await self.agent.process_multimodal_input(input_data)
-            elif input_type == "document":
-                # Process document through web tools first
-                if self.web_tools:
-                    # Save document temporarily and process
-                    temp_path = f"temp_{input_data.get('filename', 'document')}"
-                    with open(temp_path, 'wb') as f:
-                        f.write(input_data["data"])
-                    
-                    doc_content = await self.web_tools.process_file_upload(temp_path)
-                    os.unlink(temp_path)  # Clean up
-                    
-                    # Process through agent
-                    response = await self.agent.process_text_input(
-                        f"Analyze this document: {doc_content['content'][:2000]}"
-                    )
-                else:
-                    response = "Document processing not available"
-            else:
-                response = await self.agent.process_text_input(str(input_data))
-            
-            return response
+            handler = self._dispatch.get(input_data.get("type", "text"), self._handle_default)
+            return await handler(input_data)
             
         except Exception as e:
             self.logger.error(f"Error processing agent request: {e}")
             return f"Sorry, I encountered an error: {str(e)}"
 
+    async def _handle_text(self, input_data: Dict[str, Any]) -> str:
+        # A reply that depends on earlier turns can't be reused for the bare prompt
+        if input_data.get("context"):
+            return await self.agent.process_text_input(input_data["text"], history=input_data["context"])
+        return await self._cached_text_response(input_data["text"])
+
+    async def _handle_multimodal(self, input_data: Dict[str, Any]) -> str:
+        return await self.agent.process_multimodal_input(input_data)
+
+    async def _handle_document(self, input_data: Dict[str, Any]) -> str:
+        # Process document through web tools first
+        if not self.web_tools:
+            return "Document processing not available"
+        
+        if "document" in input_data:
+            # Already parsed by the API server's worker pool
+            doc_content = input_data["document"]
+        elif "path" in input_data:
+            # Already spooled to disk by the caller
+            doc_content = await self.web_tools.process_file_upload(input_data["path"])
+        else:
+            # Parse straight from memory; the name carries the extension
+            buffer = io.BytesIO(input_data["data"])
+            buffer.name = input_data.get("filename", "document")
+            doc_content = await self.web_tools.process_file_upload(buffer)
+        
+        # Process through agent
+        return await self.agent.process_text_input(
+            f"Analyze this document: {doc_content['content'][:2000]}"
+        )
+
+    async def _handle_default(self, input_data: Dict[str, Any]) -> str:
+        return await self.agent.process_text_input(str(input_data))
+
+    @staticmethod
+    def _response_key(text: str) -> bytes:
+        normalized = " ".join(text.casefold().split())
+        return hashlib.blake2b(f"text|{normalized}".encode(), digest_size=16).digest()
+
+    def _store_response(self, key: bytes, response: str):
+        if response and not response.startswith("Error"):
+            self._resp_cache[key] = (time.monotonic() + self._resp_ttl, response)
+            if len(self._resp_cache) > RESPONSE_CACHE_SIZE:
+                self._resp_cache.popitem(last=False)
+
+    def _lookup_response(self, key: bytes) -> Optional[str]:
+        entry = self._resp_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._resp_cache[key]
+            return None
+        self._resp_cache.move_to_end(key)
+        return entry[1]
+
+    async def _cached_text_response(self, text: str) -> str:
+        """Answer a text prompt, reusing the reply to an identical earlier prompt"""
+        if RESPONSE_CACHE_SIZE <= 0:
+            return await self.agent.process_text_input(text)
+        
+        key = self._response_key(text)
+        cached = self._lookup_response(key)
+        if cached is not None:
+            return cached
+        
+        response = await self.agent.process_text_input(text)
+        self._store_response(key, response)
+        return response
+
+    async def stream_agent_request(self, input_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """Like process_agent_request, but yield text replies as the model produces them"""
+        if not self.agent or input_data.get("type", "text") != "text":
+            yield await self.process_agent_request(input_data)
+            return
+        
+        text = input_data["text"]
+        key = self._response_key(text) if RESPONSE_CACHE_SIZE > 0 and not input_data.get("context") else None
+        cached = self._lookup_response(key) if key else None
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
+        async for piece in self.agent.stream_text_input(text, history=input_data.get("context")):
+            parts.append(piece)
+            yield piece
+        if key:
+            self._store_response(key, "".join(parts))
+
     async def start_voice_assistant(self):
         """Start voice assistant"""
         if self.voice_assistant:
             self.logger.info("🎤 Starting Voice Assistant...")
             await self.voice_assistant.start_listening()
 
-    async def start_telegram_bot(self):
-        """Start Telegram bot"""
+    async def start_telegram_bot(self, webhook_url: Optional[str] = None):
+        """Start Telegram bot, via webhook on the API server when webhook_url is given"""
         if self.telegram_bot:
             self.logger.info("📱 Starting Telegram Bot...")
-            await self.telegram_bot.start_bot()
+            if webhook_url:
+                secret = os.getenv("TELEGRAM_WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+                await self.telegram_bot.start_bot_webhook(webhook_url, secret)
+            else:
+                await self.telegram_bot.start_bot()
 
     async def start_api_server(self, host: str = "0.0.0.0", port: int = 8000):
         """Start FastAPI server"""
         self.logger.info(f"🌐 Starting API Server on {host}:{port}...")
         
-        app = create_app(self.process_agent_request)
-        config = uvicorn.Config(app, host=host, port=port, log_level="info")
+        app = create_app(self.process_agent_request, document_parser=parse_file)
+        
+        if self.telegram_bot:
+            telegram_bot = self.telegram_bot
+            
+            @app.post("/telegram")
+            async def telegram_webhook(request: Request):
+                secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+                accepted = await telegram_bot.handle_webhook(await request.body(), secret)
+                return Response(status_code=200 if accepted else 403)
+        # uvloop is already the loop policy (set when api.fastapi_server is imported);
+        # httptools replaces the pure-Python h11 parser
+        config = uvicorn.Config(
+            app,
+            host=host,
+            port=port,
+            log_level="info",
+            loop="uvloop" if importlib.util.find_spec("uvloop") else "auto",
+            http="httptools" if importlib.util.find_spec("httptools") else "auto",
+            access_log=False,
+            limit_concurrency=API_LIMIT_CONCURRENCY,
+            backlog=2048
+        )
         server = uvicorn.Server(config)
         
         await server.serve()
@@ -179,7 +336,8 @@ class AIAgentOrchestrator:
         
         while True:
             try:
-                user_input = input("\n🤖 You: ").strip()
+                # Read stdin in a thread so other services keep running while we wait
+                user_input = (await asyncio.to_thread(input, "\n🤖 You: ")).strip()
                 
                 if user_input.lower() in ['quit', 'exit', 'q']:
                     break
@@ -193,10 +351,9 @@ class AIAgentOrchestrator:
                 elif user_input.lower().startswith('search '):
                     query = user_input[7:]
                     if self.web_tools:
-                        async with self.web_tools as wt:
-                            results = await wt.web_search(query, num_results=3)
-                            for i, result in enumerate(results, 1):
-                                print(f"{i}. {result['title']}: {result['snippet'][:100]}...")
+                        results = await self.web_tools.web_search(query, num_results=3)
+                        for i, result in enumerate(results, 1):
+                            print(f"{i}. {result['title']}: {result['snippet'][:100]}...")
                     continue
                 
                 if not user_input:
@@ -206,7 +363,7 @@ class AIAgentOrchestrator:
                 response = await self.process_agent_request({"text": user_input, "type": "text"})
                 print(f"🤖 Assistant: {response}")
                 
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError):
                 break
             except Exception as e:
                 print(f"❌ Error: {e}")
@@ -215,91 +372,100 @@ class AIAgentOrchestrator:
 
     def show_help(self):
         """Show help information"""
-        help_text = """
-🤖 **AI Agent Commands:**
+        print(_HELP_TEXT)
 
-**Basic Commands:**
-- Just type your message to chat with the AI
-- 'help' - Show this help
-- 'quit' or 'exit' - Exit the program
-- 'stats' - Show session statistics
+    async def _probe_agent(self) -> Dict[str, Any]:
+        # Bypass the semantic cache so the probe actually reaches the model
+        test_response = await self.agent.process_text_input("Hello", use_cache=False)
+        return {
+            "status": "healthy" if test_response else "unhealthy",
+            "last_response_length": len(test_response) if test_response else 0
+        }
 
-**Special Commands:**
-- 'search <query>' - Web search
-- 'voice' - Test voice system (if available)
+    async def _probe_web(self) -> Dict[str, Any]:
+        test_search = await self.web_tools.web_search("test", num_results=1)
+        return {
+            "status": "healthy" if test_search else "degraded",
+            "search_results": len(test_search) if test_search else 0
+        }
 
-**Examples:**
-- "Write a Python function to sort a list"
-- "search latest AI news"
-- "translate hello to Spanish"
-- "explain quantum computing"
+    async def _probe_voice(self) -> Dict[str, Any]:
+        voice_stats = self.voice_assistant.get_voice_stats()
+        return {
+            "status": "healthy" if voice_stats["is_active"] else "inactive",
+            "stats": voice_stats
+        }
 
-**Features Available:**
-✅ Multi-LLM routing (GPT-4, Claude, Gemini, etc.)
-✅ Web search and content analysis
-✅ Code generation and debugging
-✅ Language translation
-✅ Document processing
-✅ Voice interaction (if configured)
-✅ Telegram bot (if token provided)
-        """
-        print(help_text)
+    async def _probe_telegram(self) -> Dict[str, Any]:
+        return {
+            "status": "healthy",
+            "active_users": len(self.telegram_bot.user_sessions)
+        }
 
     async def health_check(self) -> Dict[str, Any]:
         """Perform system health check"""
         health_status = {
-            "timestamp": asyncio.get_event_loop().time(),
+            "timestamp": time.monotonic(),
             "status": "healthy",
             "components": {}
         }
         
-        # Check AI Agent
-        if self.agent:
-            try:
-                test_response = await self.agent.process_text_input("Hello")
-                health_status["components"]["ai_agent"] = {
-                    "status": "healthy" if test_response else "unhealthy",
-                    "last_response_length": len(test_response) if test_response else 0
-                }
-            except Exception as e:
-                health_status["components"]["ai_agent"] = {
-                    "status": "unhealthy",
-                    "error": str(e)
-                }
-        
-        # Check Web Tools
-        if self.web_tools:
-            try:
-                async with self.web_tools as wt:
-                    test_search = await wt.web_search("test", num_results=1)
-                health_status["components"]["web_tools"] = {
-                    "status": "healthy" if test_search else "degraded",
-                    "search_results": len(test_search) if test_search else 0
-                }
-            except Exception as e:
-                health_status["components"]["web_tools"] = {
-                    "status": "unhealthy",
-                    "error": str(e)
-                }
+        probes = {
+            "ai_agent": self._probe_agent if self.agent else None,
+            "web_tools": self._probe_web if self.web_tools else None,
+            "voice_assistant": self._probe_voice if self.voice_assistant else None,
+            "telegram_bot": self._probe_telegram if self.telegram_bot else None
+        }
+        probes = {name: probe for name, probe in probes.items() if probe}
         
-        # Check Voice Assistant
-        if self.voice_assistant:
-            voice_stats = self.voice_assistant.get_voice_stats()
-            health_status["components"]["voice_assistant"] = {
-                "status": "healthy" if voice_stats["is_active"] else "inactive",
-                "stats": voice_stats
-            }
+        # Probe every component at once; a slow one only costs its own timeout
+        results = await asyncio.gather(
+            *(asyncio.wait_for(probe(), HEALTH_PROBE_TIMEOUT) for probe in probes.values()),
+            return_exceptions=True
+        )
         
-        # Check Telegram Bot
-        if self.telegram_bot:
-            user_sessions = self.telegram_bot.get_user_sessions()
-            health_status["components"]["telegram_bot"] = {
-                "status": "healthy",
-                "active_users": user_sessions["total_users"]
-            }
+        for name, result in zip(probes, results):
+            if isinstance(result, asyncio.TimeoutError):
+                result = {"status": "timeout"}
+            elif isinstance(result, Exception):
+                result = {"status": "unhealthy", "error": str(result)}
+            health_status["components"][name] = result
         
         return health_status
 
+    async def wait_until_stopped(self):
+        """Sleep until SIGINT/SIGTERM arrives or _stop is set, without polling"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stop.set)
+            except (NotImplementedError, RuntimeError):
+                # No loop signal handlers on Windows; Ctrl+C still raises KeyboardInterrupt
+                pass
+        await self._stop.wait()
+        print("\n🛑 Shutting down...")
+
+    async def shutdown(self):
+        """Stop running services and close shared connection pools"""
+        steps = (
+            ("Telegram bot", self.telegram_bot and self.telegram_bot.stop_bot),
+            ("voice assistant", self.voice_assistant and self.voice_assistant.stop_listening),
+            ("AI agent", self.agent and self.agent.aclose),
+            ("web tools", self.web_tools and self.web_tools.aclose)
+        )
+        # A failing step is logged and the rest still run
+        for name, close in steps:
+            if not close:
+                continue
+            try:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                self.logger.error(f"❌ Failed to stop {name}: {e}")
+        # Flush whatever is still queued for the log files
+        log_listener.stop()
+
 async def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description="Multimodal AI Agent")
@@ -321,9 +487,15 @@ async def main():
         print("❌ Failed to initialize AI Agent. Exiting.")
         return
     
-    web_tools_ok = await orchestrator.initialize_web_tools()
-    voice_ok = await orchestrator.initialize_voice_assistant()
-    telegram_ok = await orchestrator.initialize_telegram_bot()
+    # The remaining components are independent, so set them up concurrently
+    web_tools_ok, voice_ok, telegram_ok = [
+        result is True for result in await asyncio.gather(
+            orchestrator.initialize_web_tools(),
+            orchestrator.initialize_voice_assistant(),
+            orchestrator.initialize_telegram_bot(),
+            return_exceptions=True
+        )
+    ]
     
     print(f"""
 🚀 **Multimodal AI Agent System Started**
@@ -353,18 +525,16 @@ Mode: {args.mode.upper()}
         elif args.mode == "telegram":
             if telegram_ok:
                 await orchestrator.start_telegram_bot()
-                # Keep running
-                while True:
-                    await asyncio.sleep(1)
+                # Keep running until a shutdown signal
+                await orchestrator.wait_until_stopped()
             else:
                 print("❌ Telegram bot not available")
                 
         elif args.mode == "voice":
             if voice_ok:
                 await orchestrator.start_voice_assistant()
-                # Keep running
-                while True:
-                    await asyncio.sleep(1)
+                # Keep running until a shutdown signal
+                await orchestrator.wait_until_stopped()
             else:
                 print("❌ Voice assistant not available")
                 
@@ -373,7 +543,8 @@ Mode: {args.mode.upper()}
             tasks = []
             
             if telegram_ok:
-                tasks.append(orchestrator.start_telegram_bot())
+                # With a public URL, Telegram pushes updates to the API server's /telegram route
+                tasks.append(orchestrator.start_telegram_bot(os.getenv("TELEGRAM_WEBHOOK_URL")))
             
             if voice_ok:
                 tasks.append(orchestrator.start_voice_assistant())
@@ -384,15 +555,12 @@ Mode: {args.mode.upper()}
             await asyncio.gather(*tasks)
             
     except KeyboardInterrupt:
+        orchestrator._stop.set()
         print("\n🛑 Shutting down...")
     except Exception as e:
         print(f"❌ Error: {e}")
     finally:
-        # Cleanup
-        if orchestrator.telegram_bot:
-            await orchestrator.telegram_bot.stop_bot()
-        if orchestrator.voice_assistant:
-            orchestrator.voice_assistant.stop_listening()
+        await orchestrator.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -9,18 +9,28 @@ def install_requirements():
     requirements = [
         "openai>=1.3.0",
         "anthropic>=0.8.0", 
+        "httpx[http2]>=0.25.0",
         "google-generativeai>=0.3.0",
         "requests>=2.31.0",
         "beautifulsoup4>=4.12.0"
     ]
     
+    pip_install = [sys.executable, "-m", "pip", "install", "--disable-pip-version-check", "--no-input", "--prefer-binary"]
+    
     print("📦 Installing requirements...")
-    for req in requirements:
-        try:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", req])
+    try:
+        # One pip run resolves everything together
+        subprocess.check_call(pip_install + requirements)
+        for req in requirements:
             print(f"✅ {req}")
-        except:
-            print(f"❌ Failed: {req}")
+    except subprocess.CalledProcessError:
+        # Retry one by one to report which package is the problem
+        for req in requirements:
+            try:
+                subprocess.check_call(pip_install + [req])
+                print(f"✅ {req}")
+            except subprocess.CalledProcessError:
+                print(f"❌ Failed: {req}")
 
 def setup_env():
     """Setup environment variables"""
@@ -2,49 +2,173 @@
 import subprocess
 import webbrowser
 import os
+import re
+import shlex
+import shutil
+import signal
+import threading
 import time
 import pyautogui
-import psutil
-from typing import Dict, Any
+from urllib.parse import quote_plus
+from typing import Dict, Any, List, Optional
+from command_classifier import Classification, CommandClassifier
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+# PNG zlib level for screenshots; speed matters more than file size here
+SCREENSHOT_COMPRESSION = 1
+
+COMMAND_TIMEOUT = 10
+# run_system_command keeps at most this much output and stops the command past it
+COMMAND_OUTPUT_LIMIT = 64 * 1024
+
+# run_system_command refuses anything containing these; one case-insensitive pass, any spacing
+_DANGEROUS_RE = re.compile(r"rm\s+-rf|del\s+/f|format|shutdown|reboot|sudo\s+rm", re.I)
+
+# Anything with these needs /bin/sh: pipes, redirects, expansion, globbing, comments
+_SHELL_CHARS = frozenset("|&;<>()$`*?[]{}~#\n")
+
+_GOOGLE_SEARCH_URL = "https://www.google.com/search?q={}".format
+
+def _find_program(*names: str) -> Optional[str]:
+    """Absolute path of the first of names found on PATH, or None"""
+    for name in names:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+def _resolve_argv(argv: list) -> list:
+    """Swap the program name for its absolute path when it is on PATH"""
+    path = shutil.which(argv[0])
+    return [path] + argv[1:] if path else argv
+
+def _command_argv(command: str) -> Optional[list]:
+    """argv to exec a command directly, or None when it needs the shell"""
+    if os.name == 'nt' or not _SHELL_CHARS.isdisjoint(command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    # Builtins and VAR=value prefixes aren't on PATH, so they go to the shell too
+    path = shutil.which(argv[0]) if argv else None
+    return [path] + argv[1:] if path else None
+
+def _read_capped(stream, limit: int, chunks: list):
+    """Collect stream into chunks until EOF or just past limit bytes; runs on a helper thread"""
+    total = 0
+    while total <= limit:
+        chunk = stream.read1(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        total += len(chunk)
+
+def _kill_tree(proc: subprocess.Popen):
+    """Kill a command started in its own session together with everything it spawned"""
+    if os.name == 'nt':
+        subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)], capture_output=True)
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def _spawn_detached(argv: list) -> subprocess.Popen:
+    """Launch without waiting. An absolute argv[0] and close_fds=False let CPython use
+    posix_spawn instead of fork+exec, so launch cost doesn't grow with our RSS"""
+    return subprocess.Popen(argv, close_fds=False)
 
 class RealExecutor:
-    def __init__(self):
+    def __init__(self, classifier: Optional[CommandClassifier] = None):
+        self._classifier = classifier or CommandClassifier()
+        
         # Enable pyautogui failsafe
         pyautogui.FAILSAFE = True
         
-    def execute_command(self, user_input: str) -> str:
-        """Actually execute the command"""
-        input_lower = user_input.lower()
+        # Probe for programs once; None means not installed, so we never try to exec it
+        is_nt = os.name == 'nt'
+        self._chrome_path = _find_program('chrome', 'google-chrome', 'chromium', 'chromium-browser')
+        self._firefox_path = _find_program('firefox')
+        self._calc_path = _find_program('calc' if is_nt else 'gnome-calculator')
+        self._notepad_path = _find_program('notepad' if is_nt else 'gedit')
+        self._kill_argv = _resolve_argv(['taskkill', '/F', '/IM'] if is_nt else ['pkill'])
+        if is_nt:
+            self._open_path = os.startfile
+        else:
+            open_argv = _resolve_argv(['open'])
+            self._open_path = lambda path: subprocess.call(open_argv + [path], close_fds=False)
+        
+        # Commands keyed by their first one or two words, so common phrasings route
+        # with two dict lookups; anything else falls through to the keyword checks
+        self._dispatch = {
+            "open": {
+                "chrome": lambda text, words: self.open_chrome(),
+                "firefox": lambda text, words: self.open_firefox(),
+                "browser": lambda text, words: self.open_browser(),
+                "calculator": lambda text, words: self.open_calculator(),
+                "notepad": lambda text, words: self.open_notepad(),
+                "file": self.open_file
+            },
+            "create": {"file": self.create_file},
+            "close": {
+                "chrome": lambda text, words: self.close_application(text),
+                "firefox": lambda text, words: self.close_application(text)
+            },
+            "take": {"screenshot": lambda text, words: self.take_screenshot()},
+            "search": lambda text, words: self.search_web(text)
+            # "run" is deliberately absent: only a literal lowercase "run " prefix reaches the
+            # shell (checked below), so "Run the analysis" is never executed as a command
+        }
+        
+    def execute_command(self, user_input: str, classification: Optional[Classification] = None) -> str:
+        """Actually execute the command; pass the caller's classification to skip rescanning"""
+        # Split once; handlers that pick a filename reuse these words
+        words = user_input.split()
         
         try:
+            if len(words) > 1:
+                route = self._dispatch.get(words[0].lower())
+                handler = route.get(words[1].lower()) if isinstance(route, dict) else route
+                if handler:
+                    return handler(user_input, words)
+            
+            if classification is None:
+                classification = self._classifier.classify(user_input)
+            found = classification.command_keywords
+            
             # Browser operations
-            if "open chrome" in input_lower:
+            if "open chrome" in found:
                 return self.open_chrome()
-            elif "open firefox" in input_lower:
+            elif "open firefox" in found:
                 return self.open_firefox()
-            elif "open browser" in input_lower:
+            elif "open browser" in found:
                 return self.open_browser()
             
             # Search operations
-            elif "search" in input_lower and ("linkedin" in input_lower or "google" in input_lower or "youtube" in input_lower):
+            elif "search" in found and ("linkedin" in found or "google" in found or "youtube" in found):
                 return self.search_web(user_input)
             
             # File operations
-            elif "create file" in input_lower:
-                return self.create_file(user_input)
-            elif "open file" in input_lower:
-                return self.open_file(user_input)
+            elif "create file" in found:
+                return self.create_file(user_input, words)
+            elif "open file" in found:
+                return self.open_file(user_input, words)
             
             # System operations
-            elif "open calculator" in input_lower:
+            elif "open calculator" in found:
                 return self.open_calculator()
-            elif "open notepad" in input_lower:
+            elif "open notepad" in found:
                 return self.open_notepad()
-            elif "take screenshot" in input_lower:
+            elif "take screenshot" in found:
                 return self.take_screenshot()
             
             # Process operations
-            elif "close" in input_lower and ("chrome" in input_lower or "firefox" in input_lower):
+            elif "close" in found and ("chrome" in found or "firefox" in found):
                 return self.close_application(user_input)
             
             # System commands
@@ -60,32 +184,24 @@ class RealExecutor:
     
     def open_chrome(self) -> str:
         """Actually open Chrome browser"""
-        try:
-            if os.name == 'nt':  # Windows
-                subprocess.Popen(['chrome'])
-            elif os.name == 'posix':  # macOS/Linux
-                subprocess.Popen(['google-chrome'])
-            
-            time.sleep(2)  # Wait for Chrome to open
-            return "✅ Chrome browser opened successfully"
-        except:
-            # Fallback to webbrowser
-            webbrowser.open('https://www.google.com')
-            return "✅ Browser opened (fallback method)"
+        return self._open_browser_program(self._chrome_path, "Chrome")
     
     def open_firefox(self) -> str:
         """Actually open Firefox browser"""
-        try:
-            if os.name == 'nt':  # Windows
-                subprocess.Popen(['firefox'])
-            else:  # macOS/Linux
-                subprocess.Popen(['firefox'])
-            
-            time.sleep(2)
-            return "✅ Firefox browser opened successfully"
-        except:
-            webbrowser.open('https://www.google.com')
-            return "✅ Browser opened (fallback method)"
+        return self._open_browser_program(self._firefox_path, "Firefox")
+    
+    def _open_browser_program(self, path: Optional[str], label: str) -> str:
+        """Launch the browser at path, or fall back to the default one"""
+        if path:
+            try:
+                _spawn_detached([path])
+                return f"✅ {label} browser opened successfully"
+            except OSError:
+                pass
+        
+        # Fallback to webbrowser
+        webbrowser.open('https://www.google.com')
+        return "✅ Browser opened (fallback method)"
     
     def open_browser(self) -> str:
         """Open default browser"""
@@ -104,8 +220,7 @@ class RealExecutor:
             if "search" in input_lower:
                 query = user_input.split("search")[-1].strip()
                 if query:
-                    search_url = f"https://www.google.com/search?q={query.replace(' ', '+')}"
-                    webbrowser.open(search_url)
+                    webbrowser.open(_GOOGLE_SEARCH_URL(quote_plus(query)))
                     return f"✅ Google search opened for: {query}"
             webbrowser.open('https://www.google.com')
             return "✅ Google opened in browser"
@@ -115,15 +230,15 @@ class RealExecutor:
         else:
             # Generic search
             query = user_input.replace("search", "").strip()
-            search_url = f"https://www.google.com/search?q={query.replace(' ', '+')}"
-            webbrowser.open(search_url)
+            webbrowser.open(_GOOGLE_SEARCH_URL(quote_plus(query)))
             return f"✅ Web search opened for: {query}"
     
-    def create_file(self, user_input: str) -> str:
+    def create_file(self, user_input: str, words: Optional[List[str]] = None) -> str:
         """Actually create a file"""
         try:
             # Extract filename
-            words = user_input.split()
+            if words is None:
+                words = user_input.split()
             filename = "new_file.txt"
             
             for i, word in enumerate(words):
@@ -144,25 +259,18 @@ class RealExecutor:
         except Exception as e:
             return f"❌ File creation failed: {str(e)}"
     
-    def open_file(self, user_input: str) -> str:
+    def open_file(self, user_input: str, words: Optional[List[str]] = None) -> str:
         """Actually open a file"""
         try:
             # Extract filename
-            words = user_input.split()
-            filename = None
-            
-            for word in words:
-                if "." in word:
-                    filename = word
-                    break
+            if words is None:
+                words = user_input.split()
+            filename = next((word for word in words if "." in word), None)
             
             if not filename:
                 return "❌ No filename specified"
             
-            if os.name == 'nt':  # Windows
-                os.startfile(filename)
-            else:  # macOS/Linux
-                subprocess.call(['open', filename])
+            self._open_path(filename)
             
             return f"✅ File opened: {filename}"
         except Exception as e:
@@ -170,11 +278,10 @@ class RealExecutor:
     
     def open_calculator(self) -> str:
         """Actually open calculator"""
+        if not self._calc_path:
+            return "❌ Calculator open failed: no calculator program found"
         try:
-            if os.name == 'nt':  # Windows
-                subprocess.Popen(['calc'])
-            else:  # macOS/Linux
-                subprocess.Popen(['gnome-calculator'])
+            _spawn_detached([self._calc_path])
             
             return "✅ Calculator opened"
         except Exception as e:
@@ -182,11 +289,10 @@ class RealExecutor:
     
     def open_notepad(self) -> str:
         """Actually open notepad"""
+        if not self._notepad_path:
+            return "❌ Notepad open failed: no notepad program found"
         try:
-            if os.name == 'nt':  # Windows
-                subprocess.Popen(['notepad'])
-            else:  # macOS/Linux
-                subprocess.Popen(['gedit'])
+            _spawn_detached([self._notepad_path])
             
             return "✅ Notepad opened"
         except Exception as e:
@@ -195,9 +301,18 @@ class RealExecutor:
     def take_screenshot(self) -> str:
         """Actually take a screenshot"""
         try:
-            screenshot = pyautogui.screenshot()
-            filename = f"screenshot_{int(time.time())}.png"
-            screenshot.save(filename)
+            # Nanosecond names don't collide on quick repeats; the rename means nobody sees a half-written PNG
+            filename = f"screenshot_{time.time_ns()}.png"
+            tmp_path = f"{filename}.tmp"
+            if mss is not None:
+                # Native grab written straight to PNG, no PIL image in between. mss handles
+                # are per-thread, so open one per call rather than keeping it on self
+                with mss.mss() as sct:
+                    sct.compression_level = SCREENSHOT_COMPRESSION
+                    sct.shot(output=tmp_path)
+            else:
+                pyautogui.screenshot().save(tmp_path, format="PNG")
+            os.replace(tmp_path, filename)
             return f"✅ Screenshot saved: {filename}"
         except Exception as e:
             return f"❌ Screenshot failed: {str(e)}"
@@ -214,12 +329,9 @@ class RealExecutor:
             else:
                 return "❌ Application not specified"
             
-            # Find and kill the process
-            killed = False
-            for proc in psutil.process_iter(['pid', 'name']):
-                if app_name.lower() in proc.info['name'].lower():
-                    proc.kill()
-                    killed = True
+            # Let the OS find and kill it by name instead of walking every process
+            result = subprocess.run(self._kill_argv + [app_name], capture_output=True, close_fds=False)
+            killed = result.returncode == 0
             
             if killed:
                 return f"✅ {app_name} closed successfully"
@@ -233,17 +345,45 @@ class RealExecutor:
         """Actually run system command"""
         try:
             # Safety check
-            dangerous = ['rm -rf', 'del /f', 'format', 'shutdown', 'reboot', 'sudo rm']
-            if any(danger in command.lower() for danger in dangerous):
+            if _DANGEROUS_RE.search(command):
                 return "❌ Dangerous command blocked for safety"
             
-            result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=10)
+            # Plain commands skip the intermediate /bin/sh process
+            argv = _command_argv(command)
+            # A session of its own lets a timeout kill everything the command started
+            proc = subprocess.Popen(argv or command, shell=argv is None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    close_fds=False, start_new_session=True)
+            deadline = time.monotonic() + COMMAND_TIMEOUT
+            chunks = []
+            reader = threading.Thread(target=_read_capped, args=(proc.stdout, COMMAND_OUTPUT_LIMIT, chunks), daemon=True)
+            reader.start()
+            
+            # The deadline also covers background children that keep the pipe open
+            reader.join(COMMAND_TIMEOUT)
+            if reader.is_alive():
+                _kill_tree(proc)
+                proc.wait()
+                raise subprocess.TimeoutExpired(command, COMMAND_TIMEOUT)
+            
+            data = b"".join(chunks)
+            truncated = len(data) > COMMAND_OUTPUT_LIMIT
+            if truncated:
+                _kill_tree(proc)
+            proc.stdout.close()
+            try:
+                returncode = proc.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                _kill_tree(proc)
+                proc.wait()
+                raise
             
-            if result.returncode == 0:
-                output = result.stdout if result.stdout else "Command executed successfully"
-                return f"✅ Command executed:\n{output}"
+            output = data[:COMMAND_OUTPUT_LIMIT].decode(errors="replace")
+            if truncated:
+                return f"✅ Command executed:\n{output}\n... [output truncated at {COMMAND_OUTPUT_LIMIT // 1024} KiB]"
+            if returncode == 0:
+                return f"✅ Command executed:\n{output or 'Command executed successfully'}"
             else:
-                return f"❌ Command failed:\n{result.stderr}"
+                return f"❌ Command failed:\n{output}"
                 
         except subprocess.TimeoutExpired:
             return "❌ Command timed out"
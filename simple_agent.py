@@ -1,18 +1,44 @@
 # simple_agent.py - Simple, focused AI agent that actually does tasks
 import os
 import asyncio
+import atexit
 import json
 import subprocess
 import requests
+from collections import Counter, deque
 from datetime import datetime
+from typing import Optional
 from enhanced_multimodel_router import EnhancedMultiModelRouter
+from command_classifier import CommandClassifier
 from core.action_agent import ActionAgent
 
+AGENT_LOG_PATH = "agent_logs.json"
+# Log lines collect in this write buffer and reach disk in large chunks
+AGENT_LOG_BUFFER = 1 << 16
+# Logged replies are cut to this many characters
+LOG_OUTPUT_CHARS = 200
+# Interactions kept in memory; stats are running totals and cover everything
+HISTORY_LIMIT = 10_000
+
+# Built once; json.dumps with non-default options makes a new encoder every call
+_encode_log_entry = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
 class SimpleAIAgent:
-    def __init__(self):
+    def __init__(self, classifier: Optional[CommandClassifier] = None):
         self.router = EnhancedMultiModelRouter()
+        self.classifier = classifier or CommandClassifier()
         self.action_agent = ActionAgent()
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=HISTORY_LIMIT)
+        self._interaction_count = 0
+        self._action_count = 0
+        self._model_counts = Counter()
+        
+        # One long-lived handle instead of an open/write/close per interaction
+        try:
+            self._log_fp = open(AGENT_LOG_PATH, "a", buffering=AGENT_LOG_BUFFER, encoding="utf-8")
+            atexit.register(self._log_fp.close)
+        except OSError:
+            self._log_fp = None
         
         print("🤖 Simple AI Agent Initialized")
         print(f"📡 Available models: {self.router.get_available_models()}")
@@ -20,28 +46,17 @@ class SimpleAIAgent:
     async def process(self, user_input: str) -> str:
         """Main processing function - determines if action needed or just conversation"""
         
-        # Check if this requires an action
-        action_keywords = [
-            "search", "find", "look up", "google",
-            "create", "write", "generate", "make",
-            "run", "execute", "command",
-            "calculate", "compute", "solve",
-            "translate", "convert",
-            "file", "save", "read", "open",
-            "analyze", "check", "review"
-        ]
-        
-        needs_action = any(keyword in user_input.lower() for keyword in action_keywords)
+        # One classification answers both the action and the task-type question
+        classification = self.classifier.classify(user_input)
         
-        if needs_action:
+        if classification.needs_action:
             # Use action agent for tasks
             result = await self.action_agent.process_request(user_input)
             self.log_interaction(user_input, result, "action")
             return result
         else:
             # Use best model for conversation
-            task_type = self.determine_task_type(user_input)
-            result = await self.router.generate_response(user_input, task_type=task_type)
+            result = await self.router.generate_response(user_input, task_type=classification.task_type)
             
             if result.get("success"):
                 response = result["response"]
@@ -52,54 +67,40 @@ class SimpleAIAgent:
 
     def determine_task_type(self, user_input: str) -> str:
         """Determine the type of task based on user input"""
-        input_lower = user_input.lower()
-        
-        if any(word in input_lower for word in ["code", "program", "function", "script", "debug"]):
-            return "coding"
-        elif any(word in input_lower for word in ["story", "creative", "poem", "imagine"]):
-            return "creative"
-        elif any(word in input_lower for word in ["analyze", "compare", "evaluate", "pros", "cons"]):
-            return "analysis"
-        elif any(word in input_lower for word in ["translate", "language", "spanish", "french"]):
-            return "multilingual"
-        else:
-            return "general"
+        return self.classifier.classify(user_input).task_type
 
     def log_interaction(self, input_text: str, output_text: str, interaction_type: str, model_used: str = "action_agent"):
         """Log interactions for learning"""
+        if len(output_text) > LOG_OUTPUT_CHARS:
+            output_text = output_text[:LOG_OUTPUT_CHARS] + "..."
         log_entry = {
             "timestamp": datetime.now().isoformat(),
             "input": input_text,
-            "output": output_text[:200] + "..." if len(output_text) > 200 else output_text,
+            "output": output_text,
             "type": interaction_type,
             "model": model_used
         }
         
         self.conversation_history.append(log_entry)
+        self._interaction_count += 1
+        if interaction_type == "action":
+            self._action_count += 1
+        self._model_counts[model_used] += 1
         
         # Save to file
-        try:
-            with open("agent_logs.json", "a") as f:
-                f.write(json.dumps(log_entry) + "\n")
-        except:
-            pass
+        if self._log_fp is not None:
+            try:
+                self._log_fp.write(_encode_log_entry(log_entry) + "\n")
+            except (OSError, ValueError):
+                pass
 
     def get_stats(self) -> str:
         """Get agent statistics"""
-        total_interactions = len(self.conversation_history)
-        action_count = sum(1 for h in self.conversation_history if h["type"] == "action")
-        conversation_count = total_interactions - action_count
-        
-        models_used = {}
-        for h in self.conversation_history:
-            model = h.get("model", "unknown")
-            models_used[model] = models_used.get(model, 0) + 1
-        
         return f"""📊 Agent Statistics:
-• Total interactions: {total_interactions}
-• Actions performed: {action_count}
-• Conversations: {conversation_count}
-• Models used: {models_used}
+• Total interactions: {self._interaction_count}
+• Actions performed: {self._action_count}
+• Conversations: {self._interaction_count - self._action_count}
+• Models used: {dict(self._model_counts)}
 • Available models: {self.router.get_available_models()}"""
 
 async def main():
@@ -143,6 +144,8 @@ async def main():
             break
         except Exception as e:
             print(f"❌ Error: {e}")
+    
+    await agent.action_agent.aclose()
 
 if __name__ == "__main__":
     # Set up environment
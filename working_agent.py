@@ -1,12 +1,15 @@
 # working_agent.py - AI Agent that actually executes commands
 import asyncio
 import os
+from command_classifier import CommandClassifier
 from real_executor import RealExecutor
 from enhanced_multimodel_router import EnhancedMultiModelRouter
 
 class WorkingAgent:
     def __init__(self):
-        self.executor = RealExecutor()
+        # Shared with the executor so each input is scanned once
+        self.classifier = CommandClassifier()
+        self.executor = RealExecutor(self.classifier)
         self.router = EnhancedMultiModelRouter()
         print("🤖 Working Agent Ready - I actually execute commands!")
     
@@ -14,20 +17,11 @@ class WorkingAgent:
         """Process user input and execute or respond"""
         
         # Check if this is an executable command
-        executable_keywords = [
-            "open", "launch", "start", "run",
-            "close", "kill", "stop",
-            "create file", "make file", "new file",
-            "search", "find", "look up",
-            "screenshot", "capture",
-            "calculator", "notepad", "browser"
-        ]
+        classification = self.classifier.classify(user_input)
         
-        is_executable = any(keyword in user_input.lower() for keyword in executable_keywords)
-        
-        if is_executable:
-            # Execute the command
-            result = self.executor.execute_command(user_input)
+        if classification.is_executable:
+            # Execute the command off the event loop; it spawns processes and touches the screen
+            result = await asyncio.to_thread(self.executor.execute_command, user_input, classification)
             return f"🔧 EXECUTED: {result}"
         else:
             # Use AI for conversation
@@ -74,12 +68,11 @@ if __name__ == "__main__":
     # Install required packages
     try:
         import pyautogui
-        import psutil
     except ImportError:
         print("📦 Installing required packages...")
         import subprocess
         import sys
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "pyautogui", "psutil"])
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "pyautogui"])
         print("✅ Packages installed!")
     
     # Check API key